@@ -1,19 +1,106 @@
 from pydantic import BaseSettings
-from typing import Optional
+from typing import Dict, List, Optional
 
 class Settings(BaseSettings):
     mongodb_url: str
     database_name: str = "secure_file_share"
+    mongodb_max_pool_size: int = 100
+    mongodb_min_pool_size: int = 0
+    mongodb_max_idle_time_ms: Optional[int] = None
+    mongodb_connect_timeout_ms: int = 5000
+    mongodb_socket_timeout_ms: Optional[int] = None
+    mongodb_server_selection_timeout_ms: int = 5000
+    mongodb_wait_queue_timeout_ms: Optional[int] = None
+    mongodb_read_preference: str = "primary"
+    mongodb_ensure_indexes: bool = True
+    base_url: str = "http://localhost:8000"
     secret_key: str
     algorithm: str = "HS256"
     access_token_expire_minutes: int = 30
+    bcrypt_rounds: int = 12
+    password_hash_executor: str = "thread"  # "thread" or "process"
+    password_hash_workers: int = 4
+    password_hash_max_queue: int = 100
+    user_cache_enabled: bool = True
+    user_cache_max_size: int = 10000
+    user_cache_ttl_seconds: int = 60
+    user_cache_coherence: str = "none"  # "none" or "change_stream"
     smtp_server: Optional[str] = None
     smtp_port: Optional[int] = None
     smtp_username: Optional[str] = None
     smtp_password: Optional[str] = None
     from_email: Optional[str] = None
+    smtp_starttls: bool = True
+    smtp_timeout_seconds: int = 30
+    smtp_idle_timeout_seconds: int = 60
+    email_outbox_enabled: bool = True
+    email_batch_size: int = 50
+    email_poll_interval_seconds: float = 2.0
+    email_lease_seconds: int = 300
+    email_max_attempts: int = 8
+    email_retry_base_seconds: int = 30
+    email_retry_max_seconds: int = 3600
+    download_link_expire_minutes: int = 60
+    download_token_revocation: bool = False
+    upload_dir: str = "uploads"
+    download_delivery: str = "stream"  # "stream", "sendfile", "x-accel-redirect" or "x-sendfile"
+    download_accel_prefix: str = "/protected-files/"
+    storage_backend: str = "local"  # "local" or "s3"
+    storage_redirect_downloads: bool = False
+    storage_presigned_url_expire_seconds: int = 300
+    s3_bucket: Optional[str] = None
+    s3_endpoint_url: Optional[str] = None
+    s3_region: Optional[str] = None
+    s3_access_key_id: Optional[str] = None
+    s3_secret_access_key: Optional[str] = None
+    s3_max_pool_connections: int = 50
+    s3_multipart_part_size: int = 8 * 1024 * 1024
+    blob_gc_interval_seconds: int = 3600
+    blob_gc_grace_seconds: int = 3600
+    # Skip response_model validation for documents read from our own database
+    trust_db_responses: bool = False
+    files_page_size: int = 50
+    files_page_size_max: int = 500
+    batch_upload_max_files: int = 100
+    batch_upload_concurrency: int = 4
+    max_upload_size: int = 250 * 1024 * 1024
+    upload_chunk_size: int = 1024 * 1024
+    # Admission control for request bodies on upload_admission_paths; 0 disables a limit
+    upload_admission_paths: List[str] = ["/files/upload"]
+    upload_max_concurrent: int = 32
+    upload_max_concurrent_per_user: int = 4
+    upload_max_in_flight_bytes: int = 2 * 1024 * 1024 * 1024
+    upload_min_free_disk_bytes: int = 1024 * 1024 * 1024
+    upload_retry_after_seconds: int = 5
+    hot_file_cache_enabled: bool = True
+    hot_file_cache_backend: str = "memory"  # "memory" or "mmap"
+    hot_file_cache_max_bytes: int = 256 * 1024 * 1024
+    hot_file_cache_max_file_size: int = 32 * 1024 * 1024
+    hot_file_cache_min_hits: int = 2
+    resumable_upload_expire_seconds: int = 24 * 3600
+    resumable_max_chunk_size: int = 64 * 1024 * 1024
+    resumable_write_lease_seconds: int = 300
+    resumable_sweep_interval_seconds: int = 600
+    # Token buckets keyed "METHOD /route/template" -> "<count>/<second|minute|hour|day>"
+    rate_limit_enabled: bool = True
+    rate_limit_backend: str = "memory"  # "memory", "mongodb" or "redis"
+    rate_limit_redis_url: Optional[str] = None
+    # Addresses or CIDRs of reverse proxies whose X-Forwarded-For / X-Real-IP are trusted
+    rate_limit_trusted_proxies: List[str] = []
+    rate_limits_per_ip: Dict[str, str] = {
+        "POST /auth/login": "30/minute",
+        "GET /files/download/{file_id}": "120/minute",
+    }
+    rate_limits_per_account: Dict[str, str] = {
+        "POST /auth/login": "10/minute",
+        "GET /files/download/{file_id}": "60/minute",
+    }
+    loop_lag_monitor_enabled: bool = True
+    loop_lag_check_interval_ms: int = 100
+    loop_lag_threshold_ms: int = 250
+    profiler_max_seconds: int = 60
     
     class Config:
         env_file = ".env"
 
-settings = Settings()
\ No newline at end of file
+settings = Settings()
@@ -0,0 +1,182 @@
+import threading
+from collections import defaultdict
+from typing import Optional
+
+import motor.motor_asyncio
+from pymongo import monitoring
+
+from app.config import settings
+from app.models.blob import Blob
+from app.models.email_outbox import EmailOutbox
+from app.models.file import File
+from app.models.indexes import ensure_indexes
+from app.models.rate_limit import RateLimitBucket
+from app.models.revoked_token import RevokedToken
+from app.models.upload_session import UploadSession
+from app.models.user import User
+
+
+class PoolStatsListener(monitoring.ConnectionPoolListener):
+    # Keeps running counters per server so the pool can be sized from real usage
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._servers = defaultdict(lambda: {
+            "open": 0,
+            "checked_out": 0,
+            "waiting": 0,
+            "max_checked_out": 0,
+            "total_created": 0,
+            "total_checkouts": 0,
+            "checkout_failures": 0,
+            "pool_cleared": 0,
+        })
+
+    def _update(self, address, **deltas):
+        with self._lock:
+            server = self._servers[f"{address[0]}:{address[1]}"]
+            for key, delta in deltas.items():
+                server[key] += delta
+            server["max_checked_out"] = max(server["max_checked_out"], server["checked_out"])
+
+    def pool_created(self, event):
+        self._update(event.address)
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        self._update(event.address, pool_cleared=1)
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        self._update(event.address, open=1, total_created=1)
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self._update(event.address, open=-1)
+
+    def connection_check_out_started(self, event):
+        self._update(event.address, waiting=1)
+
+    def connection_check_out_failed(self, event):
+        self._update(event.address, waiting=-1, checkout_failures=1)
+
+    def connection_checked_out(self, event):
+        self._update(event.address, waiting=-1, checked_out=1, total_checkouts=1)
+
+    def connection_checked_in(self, event):
+        self._update(event.address, checked_out=-1)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {address: dict(stats) for address, stats in self._servers.items()}
+
+
+pool_stats = PoolStatsListener()
+
+_client: Optional[motor.motor_asyncio.AsyncIOMotorClient] = None
+_models = {}
+
+
+def _client_options() -> dict:
+    options = {
+        "maxPoolSize": settings.mongodb_max_pool_size,
+        "minPoolSize": settings.mongodb_min_pool_size,
+        "connectTimeoutMS": settings.mongodb_connect_timeout_ms,
+        "serverSelectionTimeoutMS": settings.mongodb_server_selection_timeout_ms,
+        "readPreference": settings.mongodb_read_preference,
+        "event_listeners": [pool_stats],
+    }
+    if settings.mongodb_max_idle_time_ms is not None:
+        options["maxIdleTimeMS"] = settings.mongodb_max_idle_time_ms
+    if settings.mongodb_socket_timeout_ms is not None:
+        options["socketTimeoutMS"] = settings.mongodb_socket_timeout_ms
+    if settings.mongodb_wait_queue_timeout_ms is not None:
+        options["waitQueueTimeoutMS"] = settings.mongodb_wait_queue_timeout_ms
+    return options
+
+
+def get_client() -> motor.motor_asyncio.AsyncIOMotorClient:
+    # Created lazily so code running outside the app lifespan (tests, scripts) still works
+    global _client
+    if _client is None:
+        _client = motor.motor_asyncio.AsyncIOMotorClient(settings.mongodb_url, **_client_options())
+    return _client
+
+
+def get_database():
+    return get_client()[settings.database_name]
+
+
+async def connect_to_mongo(client=None):
+    global _client
+    if client is not None:
+        # Injected by tests and benchmarks (e.g. an in-memory mock); the caller owns its setup
+        _client = client
+        _models.clear()
+        return
+    client = get_client()
+    # Fail fast on startup instead of on the first request
+    await client.admin.command("ping")
+    if settings.mongodb_ensure_indexes:
+        await ensure_indexes(get_database())
+
+
+async def close_mongo_connection():
+    global _client
+    if _client is not None:
+        _client.close()
+        _client = None
+    _models.clear()
+
+
+def _get_model(model_cls):
+    # Models do no I/O on construction, so one instance per client is shared by all requests
+    model = _models.get(model_cls)
+    if model is None:
+        model = _models[model_cls] = model_cls(get_database())
+    return model
+
+
+async def get_db():
+    return get_database()
+
+
+async def get_user_model() -> User:
+    return _get_model(User)
+
+
+async def get_file_model() -> File:
+    return _get_model(File)
+
+
+async def get_blob_model() -> Blob:
+    return _get_model(Blob)
+
+
+async def get_email_outbox_model() -> EmailOutbox:
+    return _get_model(EmailOutbox)
+
+
+async def get_revoked_token_model() -> RevokedToken:
+    return _get_model(RevokedToken)
+
+
+async def get_upload_session_model() -> UploadSession:
+    return _get_model(UploadSession)
+
+
+async def get_rate_limit_model() -> RateLimitBucket:
+    return _get_model(RateLimitBucket)
+
+
+def get_pool_stats() -> dict:
+    return {
+        "max_pool_size": settings.mongodb_max_pool_size,
+        "min_pool_size": settings.mongodb_min_pool_size,
+        "servers": pool_stats.snapshot(),
+    }
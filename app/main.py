@@ -1,10 +1,63 @@
-from fastapi import FastAPI, Depends
+import asyncio
+from contextlib import asynccontextmanager, suppress
+from fastapi import FastAPI, Depends, Response
 from fastapi.middleware.cors import CORSMiddleware
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+from app.routes.admin import router as admin_router
 from app.routes.auth import router as auth_router
 from app.routes.files import router as files_router
+from app.routes.uploads import router as uploads_router
 from app.config import settings
+from app.db import connect_to_mongo, close_mongo_connection, get_database
+from app.models.blob import Blob
+from app.models.email_outbox import EmailOutbox
+from app.models.upload_session import UploadSession
+from app.storage import close_storage
+from app.utils.blobstore import run_blob_gc
+from app.utils.auth import shutdown_password_hasher
+from app.utils.cache import watch_user_changes
+from app.utils.email import run_email_outbox
+from app.utils.admission import UploadAdmissionMiddleware
+from app.utils.metrics import MetricsMiddleware
+from app.utils.profiling import monitor_event_loop
+from app.utils.ratelimit import RateLimitMiddleware, close_rate_limit_store
+from app.utils.resumable import run_upload_sweeper
+from app.utils.serialization import MongoJSONResponse
 
-app = FastAPI(title="Secure File Sharing System")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await connect_to_mongo()
+    background_tasks = []
+    if settings.loop_lag_monitor_enabled:
+        background_tasks.append(asyncio.create_task(monitor_event_loop()))
+    if settings.user_cache_coherence == "change_stream":
+        background_tasks.append(asyncio.create_task(watch_user_changes(get_database()["users"])))
+    if settings.blob_gc_interval_seconds > 0:
+        background_tasks.append(asyncio.create_task(run_blob_gc(Blob(get_database()))))
+    if settings.resumable_sweep_interval_seconds > 0:
+        background_tasks.append(asyncio.create_task(run_upload_sweeper(UploadSession(get_database()))))
+    if settings.email_outbox_enabled:
+        background_tasks.append(asyncio.create_task(run_email_outbox(EmailOutbox(get_database()))))
+    yield
+    for task in background_tasks:
+        task.cancel()
+        with suppress(asyncio.CancelledError):
+            await task
+    shutdown_password_hasher()
+    await close_rate_limit_store()
+    await close_storage()
+    await close_mongo_connection()
+
+app = FastAPI(
+    title="Secure File Sharing System",
+    lifespan=lifespan,
+    default_response_class=MongoJSONResponse,
+)
+
+# Innermost, so rejected requests still get CORS headers and are counted in the metrics.
+# Rate limiting runs first: a throttled request is answered before any auth, body or DB work.
+app.add_middleware(UploadAdmissionMiddleware)
+app.add_middleware(RateLimitMiddleware)
 
 # CORS middleware
 app.add_middleware(
@@ -14,11 +67,18 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(MetricsMiddleware)
 
 # Include routers
 app.include_router(auth_router)
 app.include_router(files_router)
+app.include_router(uploads_router)
+app.include_router(admin_router)
 
 @app.get("/")
 async def root():
-    return {"message": "Secure File Sharing System"}
\ No newline at end of file
+    return {"message": "Secure File Sharing System"}
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
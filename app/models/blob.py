@@ -0,0 +1,53 @@
+from datetime import datetime
+from pymongo import ReturnDocument
+
+class Blob:
+    def __init__(self, db):
+        self.collection = db["blobs"]
+    
+    async def acquire(self, content_hash: str, size: int, storage_key: str):
+        # Returns the document as it was before, so None means this call created the blob.
+        # A blob claimed by the collector does not match, and the upsert then fails with a
+        # DuplicateKeyError until collection has finished.
+        now = datetime.utcnow()
+        return await self.collection.find_one_and_update(
+            {"_id": content_hash, "state": {"$ne": "collecting"}},
+            {
+                "$inc": {"refcount": 1},
+                "$set": {"updated_at": now},
+                "$setOnInsert": {
+                    "size": size,
+                    "storage_key": storage_key,
+                    "state": "pending",
+                    "created_at": now,
+                },
+            },
+            upsert=True,
+            return_document=ReturnDocument.BEFORE,
+        )
+    
+    async def mark_ready(self, content_hash: str):
+        await self.collection.update_one({"_id": content_hash}, {"$set": {"state": "ready"}})
+    
+    async def release(self, content_hash: str):
+        return await self.collection.find_one_and_update(
+            {"_id": content_hash},
+            {"$inc": {"refcount": -1}, "$set": {"updated_at": datetime.utcnow()}},
+            return_document=ReturnDocument.AFTER,
+        )
+    
+    async def get_unreferenced(self, released_before: datetime, limit: int = 1000):
+        return await self.collection.find(
+            {"refcount": {"$lte": 0}, "updated_at": {"$lt": released_before}},
+            {"_id": 1},
+        ).limit(limit).to_list(None)
+    
+    async def claim_for_collection(self, content_hash: str, released_before: datetime):
+        # Re-checks the refcount atomically, so a concurrent acquire always wins over the collector
+        return await self.collection.find_one_and_update(
+            {"_id": content_hash, "refcount": {"$lte": 0}, "updated_at": {"$lt": released_before}},
+            {"$set": {"state": "collecting"}},
+        )
+    
+    async def delete_collected(self, content_hash: str):
+        await self.collection.delete_one({"_id": content_hash, "state": "collecting"})
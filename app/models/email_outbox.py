@@ -0,0 +1,70 @@
+from datetime import datetime, timedelta
+from typing import List, Optional
+from pymongo import ReturnDocument
+
+class EmailOutbox:
+    def __init__(self, db):
+        self.collection = db["email_outbox"]
+    
+    async def enqueue(self, email_to: str, subject: str, text: str, html: Optional[str] = None):
+        now = datetime.utcnow()
+        await self.collection.insert_one({
+            "to": email_to,
+            "subject": subject,
+            "text": text,
+            "html": html,
+            "status": "pending",
+            "attempts": 0,
+            "next_attempt_at": now,
+            "created_at": now,
+        })
+    
+    async def claim_batch(self, limit: int, lease_seconds: int) -> List[dict]:
+        # Each claim is atomic, so several workers can drain the queue without sending twice.
+        # Messages whose worker died mid-send become claimable again once the lease runs out.
+        now = datetime.utcnow()
+        batch = []
+        for _ in range(limit):
+            message = await self.collection.find_one_and_update(
+                {"$or": [
+                    {"status": "pending", "next_attempt_at": {"$lte": now}},
+                    {"status": "sending", "lease_expires_at": {"$lte": now}},
+                ]},
+                {
+                    "$set": {"status": "sending", "lease_expires_at": now + timedelta(seconds=lease_seconds)},
+                    "$inc": {"attempts": 1},
+                },
+                sort=[("next_attempt_at", 1)],
+                return_document=ReturnDocument.AFTER,
+            )
+            if message is None:
+                break
+            batch.append(message)
+        return batch
+    
+    async def mark_sent(self, message_ids: list):
+        if message_ids:
+            await self.collection.update_many(
+                {"_id": {"$in": message_ids}},
+                {"$set": {"status": "sent", "sent_at": datetime.utcnow()}, "$unset": {"lease_expires_at": ""}},
+            )
+    
+    async def mark_failed(self, message_id, error: str, retry_at: Optional[datetime]):
+        update = {"last_error": error}
+        if retry_at is None:
+            update.update(status="failed", failed_at=datetime.utcnow())
+        else:
+            update.update(status="pending", next_attempt_at=retry_at)
+        await self.collection.update_one(
+            {"_id": message_id},
+            {"$set": update, "$unset": {"lease_expires_at": ""}},
+        )
+    
+    async def count_by_status(self) -> dict:
+        counts = {"pending": 0, "sending": 0, "failed": 0}
+        async for row in self.collection.aggregate([
+            {"$match": {"status": {"$in": list(counts)}}},
+            {"$group": {"_id": "$status", "count": {"$sum": 1}}},
+        ]):
+            counts[row["_id"]] = row["count"]
+        return counts
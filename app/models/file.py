@@ -1,48 +1,175 @@
-from pymongo import IndexModel, ASCENDING, DESCENDING
 from datetime import datetime
 import os
-from typing import Optional
+import re
+from typing import List, Optional, Tuple
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING, ReturnDocument
+from pymongo.errors import BulkWriteError
+from bson.errors import InvalidId
+from app.models.blob import Blob
+from app.utils.hot_files import hot_file_cache
+
+def to_object_id(file_id) -> Optional[ObjectId]:
+    if isinstance(file_id, ObjectId):
+        return file_id
+    try:
+        return ObjectId(file_id)
+    except (InvalidId, TypeError):
+        return None
+
+# Fields needed to render a file listing; internal fields like storage_key stay in the database
+LIST_PROJECTION = {
+    "filename": 1,
+    "content_type": 1,
+    "file_size": 1,
+    "content_hash": 1,
+    "uploaded_by": 1,
+    "created_at": 1,
+    "updated_at": 1,
+}
+
+# Serves type-filtered listings and covers every field the stats aggregation reads
+STATS_INDEX = [
+    ("uploaded_by", ASCENDING),
+    ("content_type", ASCENDING),
+    ("created_at", DESCENDING),
+    ("_id", DESCENDING),
+    ("file_size", ASCENDING),
+]
 
 class File:
     def __init__(self, db):
         self.collection = db["files"]
-        self.setup_indexes()
-    
-    def setup_indexes(self):
-        indexes = [
-            IndexModel([("uploaded_by", ASCENDING)]),
-            IndexModel([("created_at", DESCENDING)]),
-            IndexModel([("access_token", ASCENDING)], unique=True, sparse=True),
-        ]
-        self.collection.create_indexes(indexes)
+        self.blobs = Blob(db)
     
     async def create_file(self, file_data: dict):
-        file_data["created_at"] = datetime.utcnow()
-        file_data["updated_at"] = datetime.utcnow()
-        result = await self.collection.insert_one(file_data)
-        return await self.get_file_by_id(result.inserted_id)
+        now = datetime.utcnow()
+        file_data["created_at"] = now
+        file_data["updated_at"] = now
+        # insert_one sets _id on the dict, so it already is the stored document
+        await self.collection.insert_one(file_data)
+        return file_data
+    
+    async def create_files(self, files_data: List[dict]) -> List[Optional[dict]]:
+        # Returns one entry per input, None where that document could not be inserted
+        now = datetime.utcnow()
+        for file_data in files_data:
+            file_data["created_at"] = now
+            file_data["updated_at"] = now
+        failed = set()
+        try:
+            # insert_many assigns _id to each dict in place, so no read-back is needed
+            await self.collection.insert_many(files_data, ordered=False)
+        except BulkWriteError as exc:
+            failed = {error["index"] for error in exc.details.get("writeErrors", [])}
+        return [None if index in failed else file_data for index, file_data in enumerate(files_data)]
     
     async def get_file_by_id(self, file_id: str):
-        return await self.collection.find_one({"_id": file_id})
+        return await self.collection.find_one({"_id": to_object_id(file_id)})
+    
+    async def get_files_by_ids(self, file_ids: List[str]) -> List[dict]:
+        object_ids = [object_id for object_id in map(to_object_id, file_ids) if object_id is not None]
+        return await self.collection.find({"_id": {"$in": object_ids}}).to_list(None)
     
-    async def get_file_by_access_token(self, access_token: str):
-        return await self.collection.find_one({"access_token": access_token})
+    def build_query(
+        self,
+        user_id: str,
+        filename_prefix: Optional[str] = None,
+        text: Optional[str] = None,
+        content_type: Optional[str] = None,
+        created_after: Optional[datetime] = None,
+        created_before: Optional[datetime] = None,
+        min_size: Optional[int] = None,
+        max_size: Optional[int] = None,
+    ) -> dict:
+        query = {"uploaded_by": user_id}
+        if filename_prefix:
+            # Anchored, case-sensitive regexes can use the (uploaded_by, filename) index
+            query["filename"] = {"$regex": f"^{re.escape(filename_prefix)}"}
+        if text:
+            query["$text"] = {"$search": text}
+        if content_type:
+            query["content_type"] = content_type
+        if created_after or created_before:
+            query["created_at"] = {}
+            if created_after:
+                query["created_at"]["$gte"] = created_after
+            if created_before:
+                query["created_at"]["$lt"] = created_before
+        if min_size is not None or max_size is not None:
+            query["file_size"] = {}
+            if min_size is not None:
+                query["file_size"]["$gte"] = min_size
+            if max_size is not None:
+                query["file_size"]["$lte"] = max_size
+        return query
     
-    async def get_files_by_uploader(self, user_id: str):
-        return await self.collection.find({"uploaded_by": user_id}).sort("created_at", -1).to_list(None)
+    async def get_files_page(self, query: dict, limit: int, after: Optional[Tuple[datetime, ObjectId]] = None):
+        # Keyset pagination over the (uploaded_by, [content_type,] created_at, _id) indexes: every
+        # page is an index seek, however deep. One extra document tells whether another page exists.
+        if after is not None:
+            created_at, last_id = after
+            query = dict(query, **{"$or": [
+                {"created_at": {"$lt": created_at}},
+                {"created_at": created_at, "_id": {"$lt": last_id}},
+            ]})
+        cursor = self.collection.find(query, LIST_PROJECTION)
+        return await cursor.sort([("created_at", -1), ("_id", -1)]).limit(limit + 1).to_list(None)
+    
+    async def get_stats(self, query: dict) -> dict:
+        pipeline = [
+            {"$match": query},
+            # Only indexed fields from here on, so the stats index covers the whole pipeline
+            {"$project": {"_id": 0, "content_type": 1, "file_size": 1, "created_at": 1}},
+            {"$facet": {
+                "totals": [
+                    {"$group": {"_id": None, "count": {"$sum": 1}, "total_bytes": {"$sum": "$file_size"}}},
+                ],
+                "by_type": [
+                    {"$group": {"_id": "$content_type", "count": {"$sum": 1}, "total_bytes": {"$sum": "$file_size"}}},
+                    {"$sort": {"_id": 1}},
+                ],
+                "by_month": [
+                    {"$group": {
+                        "_id": {"$dateToString": {"format": "%Y-%m", "date": "$created_at"}},
+                        "count": {"$sum": 1},
+                        "total_bytes": {"$sum": "$file_size"},
+                    }},
+                    {"$sort": {"_id": 1}},
+                ],
+            }},
+        ]
+        options = {} if "$text" in query else {"hint": STATS_INDEX}
+        result = (await self.collection.aggregate(pipeline, **options).to_list(1))[0]
+        totals = result["totals"][0] if result["totals"] else {"count": 0, "total_bytes": 0}
+        return {
+            "total_count": totals["count"],
+            "total_bytes": totals["total_bytes"],
+            "by_type": [
+                {"content_type": row["_id"], "count": row["count"], "total_bytes": row["total_bytes"]}
+                for row in result["by_type"]
+            ],
+            "by_month": [
+                {"month": row["_id"], "count": row["count"], "total_bytes": row["total_bytes"]}
+                for row in result["by_month"]
+            ],
+        }
     
     async def update_file(self, file_id: str, update_data: dict):
         update_data["updated_at"] = datetime.utcnow()
-        await self.collection.update_one(
-            {"_id": file_id},
-            {"$set": update_data}
+        return await self.collection.find_one_and_update(
+            {"_id": to_object_id(file_id)},
+            {"$set": update_data},
+            return_document=ReturnDocument.AFTER,
         )
-        return await self.get_file_by_id(file_id)
     
     async def delete_file(self, file_id: str):
-        file = await self.get_file_by_id(file_id)
+        file = await self.collection.find_one_and_delete({"_id": to_object_id(file_id)})
         if file:
-            if os.path.exists(file["file_path"]):
+            hot_file_cache.invalidate_file(file["_id"])
+            if file.get("content_hash"):
+                # Blob bytes are shared between files; the garbage collector removes them once unreferenced
+                await self.blobs.release(file["content_hash"])
+            elif os.path.exists(file["file_path"]):
                 os.remove(file["file_path"])
-            await self.collection.delete_one({"_id": file_id})
-        return file
\ No newline at end of file
+        return file
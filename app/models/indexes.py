@@ -0,0 +1,118 @@
+import argparse
+import asyncio
+from datetime import datetime
+
+from pymongo import IndexModel, ASCENDING, DESCENDING, TEXT
+
+from app.models.file import STATS_INDEX
+
+# Bump INDEX_VERSION whenever INDEXES changes so running deployments migrate on next startup
+INDEX_VERSION = 8
+
+INDEXES = {
+    "users": [
+        IndexModel([("email", ASCENDING)], unique=True),
+        IndexModel([("verification_token", ASCENDING)]),
+    ],
+    "files": [
+        IndexModel([("uploaded_by", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)]),
+        IndexModel(STATS_INDEX),
+        IndexModel([("uploaded_by", ASCENDING), ("filename", ASCENDING)]),
+        IndexModel([("uploaded_by", ASCENDING), ("filename", TEXT)]),
+    ],
+    "blobs": [
+        IndexModel([("refcount", ASCENDING), ("updated_at", ASCENDING)]),
+    ],
+    "revoked_tokens": [
+        IndexModel([("expires_at", ASCENDING)], expireAfterSeconds=0),
+    ],
+    "upload_sessions": [
+        IndexModel([("expires_at", ASCENDING)]),
+    ],
+    "rate_limits": [
+        IndexModel([("expires_at", ASCENDING)], expireAfterSeconds=0),
+    ],
+    "email_outbox": [
+        IndexModel([("status", ASCENDING), ("next_attempt_at", ASCENDING)]),
+        IndexModel([("status", ASCENDING), ("lease_expires_at", ASCENDING)]),
+        # Delivered messages are only kept around for a week of troubleshooting
+        IndexModel([("sent_at", ASCENDING)], expireAfterSeconds=7 * 24 * 3600),
+    ],
+}
+
+MIGRATIONS_COLLECTION = "schema_migrations"
+MIGRATION_ID = "indexes"
+
+
+async def get_index_version(db) -> int:
+    doc = await db[MIGRATIONS_COLLECTION].find_one({"_id": MIGRATION_ID})
+    return doc["version"] if doc else 0
+
+
+async def check_indexes(db) -> dict:
+    report = {}
+    for collection_name, indexes in INDEXES.items():
+        expected = {index.document["name"]: dict(index.document["key"]) for index in indexes}
+        existing = {}
+        async for index in db[collection_name].list_indexes():
+            if index["name"] != "_id_":
+                existing[index["name"]] = dict(index["key"])
+
+        # Text indexes are stored with internal _fts/_ftsx keys, so only their presence is compared
+        missing = [
+            name for name, key in expected.items()
+            if name not in existing or (TEXT not in key.values() and existing[name] != key)
+        ]
+        extra = [name for name in existing if name not in expected]
+        if missing or extra:
+            report[collection_name] = {"missing": missing, "extra": extra}
+    return report
+
+
+async def ensure_indexes(db, drop_extra: bool = False, force: bool = False) -> dict:
+    if not force and await get_index_version(db) >= INDEX_VERSION:
+        return {}
+
+    report = await check_indexes(db)
+    for collection_name, problems in report.items():
+        if problems["missing"]:
+            await db[collection_name].create_indexes(INDEXES[collection_name])
+        if drop_extra:
+            for name in problems["extra"]:
+                await db[collection_name].drop_index(name)
+
+    await db[MIGRATIONS_COLLECTION].update_one(
+        {"_id": MIGRATION_ID},
+        {"$set": {"version": INDEX_VERSION, "applied_at": datetime.utcnow()}},
+        upsert=True,
+    )
+    return report
+
+
+async def _main(args):
+    from app.db import get_database, close_mongo_connection
+
+    db = get_database()
+    try:
+        if args.check:
+            report = await check_indexes(db)
+            print(f"Index version: {await get_index_version(db)} (expected {INDEX_VERSION})")
+            for collection_name, problems in report.items():
+                print(f"{collection_name}: missing={problems['missing']} extra={problems['extra']}")
+            return 1 if report else 0
+
+        report = await ensure_indexes(db, drop_extra=args.drop_extra, force=True)
+        print(f"Indexes migrated to version {INDEX_VERSION}")
+        for collection_name, problems in report.items():
+            print(f"{collection_name}: created={problems['missing']} "
+                  f"{'dropped' if args.drop_extra else 'left in place'}={problems['extra']}")
+        return 0
+    finally:
+        await close_mongo_connection()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Create or check MongoDB indexes")
+    parser.add_argument("--check", action="store_true", help="only report missing or extra indexes")
+    parser.add_argument("--drop-extra", action="store_true", help="drop indexes that are no longer defined")
+    raise SystemExit(asyncio.run(_main(parser.parse_args())))
@@ -0,0 +1,49 @@
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+class RateLimitBucket:
+    def __init__(self, db):
+        self.collection = db["rate_limits"]
+
+    async def take(self, key: str, capacity: int, period: float) -> float:
+        # One token bucket per document, refilled and drawn from in a single pipeline update.
+        # $$NOW is the server clock, so workers with skewed clocks still agree on the refill.
+        rate_per_ms = capacity / (period * 1000)
+        refilled = {
+            "$min": [
+                capacity,
+                {
+                    "$add": [
+                        {"$ifNull": ["$tokens", capacity]},
+                        {"$multiply": [{"$subtract": ["$$NOW", {"$ifNull": ["$updated_at", "$$NOW"]}]}, rate_per_ms]},
+                    ]
+                },
+            ]
+        }
+        pipeline = [
+            {"$set": {"tokens": refilled, "updated_at": "$$NOW"}},
+            {
+                "$set": {
+                    "allowed": {"$gte": ["$tokens", 1]},
+                    "tokens": {"$cond": [{"$gte": ["$tokens", 1]}, {"$subtract": ["$tokens", 1]}, "$tokens"]},
+                    # A bucket left alone for a full period is full again and can be dropped
+                    "expires_at": {"$add": ["$$NOW", int(period * 1000)]},
+                }
+            },
+        ]
+        for attempt in range(2):
+            try:
+                bucket = await self.collection.find_one_and_update(
+                    {"_id": key},
+                    pipeline,
+                    upsert=True,
+                    return_document=ReturnDocument.AFTER,
+                )
+                break
+            except DuplicateKeyError:
+                # Two workers created the bucket at once; the retry updates the winner's document
+                if attempt:
+                    raise
+        if bucket["allowed"]:
+            return 0.0
+        return (1 - bucket["tokens"]) / rate_per_ms / 1000
@@ -0,0 +1,16 @@
+from datetime import datetime
+
+class RevokedToken:
+    def __init__(self, db):
+        self.collection = db["revoked_tokens"]
+    
+    async def revoke(self, jti: str, expires_at: datetime):
+        # Entries only need to outlive the token itself; a TTL index removes them afterwards
+        await self.collection.update_one(
+            {"_id": jti},
+            {"$setOnInsert": {"expires_at": expires_at, "created_at": datetime.utcnow()}},
+            upsert=True,
+        )
+    
+    async def is_revoked(self, jti: str) -> bool:
+        return await self.collection.find_one({"_id": jti}, {"_id": 1}) is not None
@@ -0,0 +1,89 @@
+from datetime import datetime, timedelta
+from typing import List, Optional
+from bson import ObjectId
+from pymongo import ReturnDocument
+from app.models.file import to_object_id
+
+class UploadSession:
+    def __init__(self, db):
+        self.collection = db["upload_sessions"]
+    
+    async def create_session(self, session_data: dict, expires_in: int):
+        now = datetime.utcnow()
+        session_data.update(
+            chunks=[],
+            writes=[],
+            status="open",
+            created_at=now,
+            updated_at=now,
+            expires_at=now + timedelta(seconds=expires_in),
+        )
+        await self.collection.insert_one(session_data)
+        return session_data
+    
+    async def get_session(self, session_id: str, user_id: str):
+        return await self.collection.find_one({"_id": to_object_id(session_id), "uploaded_by": user_id})
+    
+    async def begin_write(self, session_id, lease_seconds: int) -> Optional[ObjectId]:
+        # Registers a verified chunk about to be copied into the staging file. Completion waits
+        # until no write holds a live lease; the lease only matters if a worker dies mid-copy.
+        write_id = ObjectId()
+        now = datetime.utcnow()
+        session = await self.collection.find_one_and_update(
+            {"_id": session_id, "status": "open"},
+            {"$push": {"writes": {"id": write_id, "expires_at": now + timedelta(seconds=lease_seconds)}}},
+            projection={"_id": 1},
+        )
+        return write_id if session else None
+    
+    async def end_write(self, session_id, write_id):
+        await self.collection.update_one({"_id": session_id}, {"$pull": {"writes": {"id": write_id}}})
+    
+    async def add_chunk(self, session_id, write_id, offset: int, length: int, expires_in: int):
+        # $push is atomic, so chunks arriving in parallel on different connections never lose
+        # each other's records. Every chunk also pushes the expiry out.
+        now = datetime.utcnow()
+        return await self.collection.find_one_and_update(
+            {"_id": session_id, "status": "open"},
+            {
+                "$push": {"chunks": {"offset": offset, "length": length}},
+                "$pull": {"writes": {"id": write_id}},
+                "$set": {"updated_at": now, "expires_at": now + timedelta(seconds=expires_in)},
+            },
+            return_document=ReturnDocument.AFTER,
+        )
+    
+    async def begin_completion(self, session_id, expires_in: int):
+        # Only one completion request can move the session out of "open", and only while no
+        # chunk is being copied into the staging file that is about to be moved into storage
+        now = datetime.utcnow()
+        return await self.collection.find_one_and_update(
+            {
+                "_id": session_id,
+                "status": "open",
+                "writes": {"$not": {"$elemMatch": {"expires_at": {"$gt": now}}}},
+            },
+            {"$set": {"status": "completing", "updated_at": now, "expires_at": now + timedelta(seconds=expires_in)}},
+            return_document=ReturnDocument.AFTER,
+        )
+    
+    async def reopen(self, session_id):
+        await self.collection.update_one(
+            {"_id": session_id, "status": "completing"},
+            {"$set": {"status": "open", "updated_at": datetime.utcnow()}},
+        )
+    
+    async def delete_session(self, session_id, user_id: Optional[str] = None):
+        query = {"_id": to_object_id(session_id)}
+        if user_id is not None:
+            query["uploaded_by"] = user_id
+        return await self.collection.find_one_and_delete(query)
+    
+    async def claim_expired(self, limit: int = 100) -> List[dict]:
+        expired = []
+        for _ in range(limit):
+            session = await self.collection.find_one_and_delete({"expires_at": {"$lt": datetime.utcnow()}})
+            if session is None:
+                break
+            expired.append(session)
+        return expired
@@ -1,26 +1,22 @@
-from pymongo import IndexModel, ASCENDING
 from datetime import datetime
 from typing import Optional
+from pymongo import ReturnDocument
+from app.utils.cache import invalidate_user
 
 class User:
     def __init__(self, db):
         self.collection = db["users"]
-        self.setup_indexes()
-    
-    def setup_indexes(self):
-        indexes = [
-            IndexModel([("email", ASCENDING)], unique=True),
-            IndexModel([("verification_token", ASCENDING)]),
-        ]
-        self.collection.create_indexes(indexes)
     
     async def create_user(self, user_data: dict):
-        user_data["created_at"] = datetime.utcnow()
-        user_data["updated_at"] = datetime.utcnow()
+        now = datetime.utcnow()
+        user_data["created_at"] = now
+        user_data["updated_at"] = now
         user_data["is_verified"] = False
         user_data["is_ops_user"] = False
-        result = await self.collection.insert_one(user_data)
-        return await self.get_user_by_id(result.inserted_id)
+        # insert_one sets _id on the dict, so it already is the stored document.
+        # A duplicate email raises DuplicateKeyError from the unique index.
+        await self.collection.insert_one(user_data)
+        return user_data
     
     async def get_user_by_email(self, email: str):
         return await self.collection.find_one({"email": email})
@@ -29,32 +25,38 @@ class User:
         return await self.collection.find_one({"_id": user_id})
     
     async def verify_user(self, verification_token: str):
-        user = await self.collection.find_one({"verification_token": verification_token})
-        if user:
-            await self.collection.update_one(
-                {"_id": user["_id"]},
-                {
-                    "$set": {
-                        "is_verified": True,
-                        "verification_token": None,
-                        "updated_at": datetime.utcnow()
-                    }
+        user = await self.collection.find_one_and_update(
+            {"verification_token": verification_token},
+            {
+                "$set": {
+                    "is_verified": True,
+                    "verification_token": None,
+                    "updated_at": datetime.utcnow()
                 }
-            )
+            },
+            projection={"email": 1},
+        )
+        if user:
+            invalidate_user(email=user["email"])
             return True
         return False
     
     async def update_user(self, user_id: str, update_data: dict):
         update_data["updated_at"] = datetime.utcnow()
-        await self.collection.update_one(
+        user = await self.collection.find_one_and_update(
             {"_id": user_id},
-            {"$set": update_data}
+            {"$set": update_data},
+            return_document=ReturnDocument.AFTER,
         )
-        return await self.get_user_by_id(user_id)
+        # By id, since the update may change the email the cache entry is keyed on
+        invalidate_user(user_id=user_id)
+        return user
     
     async def make_ops_user(self, email: str):
-        await self.collection.update_one(
+        user = await self.collection.find_one_and_update(
             {"email": email},
-            {"$set": {"is_ops_user": True, "updated_at": datetime.utcnow()}}
+            {"$set": {"is_ops_user": True, "updated_at": datetime.utcnow()}},
+            return_document=ReturnDocument.AFTER,
         )
-        return await self.get_user_by_email(email)
\ No newline at end of file
+        invalidate_user(email=email)
+        return user
\ No newline at end of file
@@ -0,0 +1,63 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import PlainTextResponse
+from starlette.concurrency import run_in_threadpool
+
+from app.config import settings
+from app.db import get_email_outbox_model, get_pool_stats
+from app.models.email_outbox import EmailOutbox
+from app.utils.admission import upload_admission
+from app.utils.auth import get_current_ops_user, get_password_hash_stats
+from app.utils.cache import user_cache
+from app.utils.email import get_email_delivery_stats
+from app.utils.hot_files import hot_file_cache
+from app.utils.profiling import ProfilerBusyError, sample_stacks
+
+router = APIRouter(prefix="/admin", tags=["admin"])
+
+@router.get("/db-pool")
+async def db_pool_stats(current_user: dict = Depends(get_current_ops_user)):
+    return get_pool_stats()
+
+@router.get("/password-hashing")
+async def password_hashing_stats(current_user: dict = Depends(get_current_ops_user)):
+    return get_password_hash_stats()
+
+@router.get("/user-cache")
+async def user_cache_stats(current_user: dict = Depends(get_current_ops_user)):
+    return user_cache.stats()
+
+@router.get("/hot-files")
+async def hot_file_cache_stats(current_user: dict = Depends(get_current_ops_user)):
+    return hot_file_cache.stats()
+
+@router.get("/uploads")
+async def upload_admission_stats(current_user: dict = Depends(get_current_ops_user)):
+    return upload_admission.stats()
+
+@router.get("/email-outbox")
+async def email_outbox_stats(
+    current_user: dict = Depends(get_current_ops_user),
+    outbox: EmailOutbox = Depends(get_email_outbox_model),
+):
+    return {**get_email_delivery_stats(), "queue": await outbox.count_by_status()}
+
+@router.post("/profile", response_class=PlainTextResponse)
+async def profile_worker(
+    seconds: float = Query(10, gt=0),
+    interval_ms: float = Query(10, ge=1, le=1000),
+    current_user: dict = Depends(get_current_ops_user),
+):
+    # Profiles only the worker process that happens to serve this request
+    if seconds > settings.profiler_max_seconds:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"seconds must be at most {settings.profiler_max_seconds}",
+        )
+    try:
+        # The sampler runs off the event loop, so it sees the loop thread as it really is
+        return await run_in_threadpool(sample_stacks, seconds, interval_ms / 1000)
+    except ProfilerBusyError:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="A profile is already running in this worker",
+        )
@@ -1,34 +1,36 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
+from pymongo.errors import DuplicateKeyError
 from datetime import timedelta
 import secrets
 from typing import Optional
 
+from app.models.email_outbox import EmailOutbox
 from app.models.user import User
 from app.schemas.user import UserCreate, UserInDB, Token, UserLogin
 from app.utils.auth import (
-    get_password_hash,
+    get_password_hash_async,
     create_access_token,
-    verify_password,
+    password_needs_update,
+    verify_password_async,
     get_current_user,
     get_current_active_user,
 )
 from app.utils.email import send_verification_email
 from app.utils.security import generate_secure_token
+from app.utils.serialization import db_response
 from app.config import settings
+from app.db import get_email_outbox_model, get_user_model
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
 @router.post("/signup", response_model=UserInDB)
-async def signup(user_data: UserCreate, db=Depends(get_db)):
-    existing_user = await db["users"].find_one({"email": user_data.email})
-    if existing_user:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Email already registered",
-        )
-    
-    hashed_password = get_password_hash(user_data.password)
+async def signup(
+    user_data: UserCreate,
+    user_model: User = Depends(get_user_model),
+    outbox: EmailOutbox = Depends(get_email_outbox_model),
+):
+    hashed_password = await get_password_hash_async(user_data.password)
     verification_token = generate_secure_token()
     
     user_dict = {
@@ -40,17 +42,24 @@ async def signup(user_data: UserCreate, db=Depends(get_db)):
         "is_ops_user": False,
     }
     
-    user = await User(db).create_user(user_dict)
+    # The unique index on email rejects duplicates, so there is no separate lookup first
+    try:
+        user = await user_model.create_user(user_dict)
+    except DuplicateKeyError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Email already registered",
+        )
     
-    # Send verification email
+    # Queue verification email
     verification_url = f"{settings.base_url}/auth/verify-email?token={verification_token}"
-    await send_verification_email(user_data.email, verification_url)
+    await send_verification_email(outbox, user_data.email, verification_url)
     
-    return user
+    return db_response(user, UserInDB)
 
 @router.get("/verify-email")
-async def verify_email(token: str, db=Depends(get_db)):
-    success = await User(db).verify_user(token)
+async def verify_email(token: str, user_model: User = Depends(get_user_model)):
+    success = await user_model.verify_user(token)
     if not success:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -59,9 +68,12 @@ async def verify_email(token: str, db=Depends(get_db)):
     return {"message": "Email verified successfully"}
 
 @router.post("/login", response_model=Token)
-async def login(form_data: OAuth2PasswordRequestForm = Depends(), db=Depends(get_db)):
-    user = await User(db).get_user_by_email(form_data.username)
-    if not user or not verify_password(form_data.password, user["hashed_password"]):
+async def login(
+    form_data: OAuth2PasswordRequestForm = Depends(),
+    user_model: User = Depends(get_user_model),
+):
+    user = await user_model.get_user_by_email(form_data.username)
+    if not user or not await verify_password_async(form_data.password, user["hashed_password"]):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
@@ -74,6 +86,11 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends(), db=Depends(get
             detail="Email not verified",
         )
     
+    # Transparently upgrade hashes created with an older cost factor
+    if password_needs_update(user["hashed_password"]):
+        hashed_password = await get_password_hash_async(form_data.password)
+        await user_model.update_user(user["_id"], {"hashed_password": hashed_password})
+    
     access_token_expires = timedelta(minutes=settings.access_token_expire_minutes)
     access_token = create_access_token(
         data={"sub": user["email"]}, expires_delta=access_token_expires
@@ -84,7 +101,7 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends(), db=Depends(get
 async def make_ops_user(
     email: str,
     current_user: dict = Depends(get_current_active_user),
-    db=Depends(get_db)
+    user_model: User = Depends(get_user_model),
 ):
     # In a real app, this would be protected by admin privileges
     if not current_user.get("is_ops_user"):
@@ -93,20 +110,10 @@ async def make_ops_user(
             detail="Not authorized to perform this action",
         )
     
-    user = await User(db).make_ops_user(email)
+    user = await user_model.make_ops_user(email)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="User not found",
         )
     return {"message": f"User {email} is now an ops user"}
-
-async def get_db():
-    from app.config import settings
-    import motor.motor_asyncio
-    client = motor.motor_asyncio.AsyncIOMotorClient(settings.mongodb_url)
-    db = client[settings.database_name]
-    try:
-        yield db
-    finally:
-        client.close()
\ No newline at end of file
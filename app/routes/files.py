@@ -1,30 +1,57 @@
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File
-from fastapi.responses import FileResponse
-from datetime import timedelta
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status, UploadFile, File
+from fastapi.responses import RedirectResponse, StreamingResponse
+from datetime import datetime, timedelta
+import asyncio
+import logging
 import os
-import magic
-from typing import List
+from typing import List, Optional
+from urllib.parse import quote
 
+from app.models.blob import Blob
 from app.models.file import File as FileModel
-from app.schemas.file import FileInDB, FileDownloadLink
+from app.models.revoked_token import RevokedToken
+from app.schemas.file import BatchUploadResult, BundleRequest, FileInDB, FileDownloadLink, FileStats
 from app.utils.auth import get_current_active_user, get_current_ops_user
-from app.utils.security import generate_access_token, is_valid_file_type
+from app.utils.security import (
+    InvalidTokenError,
+    create_download_token,
+    create_signed_token,
+    is_valid_file_type,
+    verify_download_token,
+    verify_signed_token,
+)
+from app.storage import get_storage
+from app.storage.local import LocalStorageBackend
+from app.utils.bundles import BundleEntry, stream_zip
+from app.utils.downloads import (
+    RangeReader,
+    build_download_response,
+    build_offload_response,
+    content_disposition,
+    content_etag,
+    file_range_reader,
+    storage_range_reader,
+)
+from app.utils.pagination import decode_cursor, encode_cursor
+from app.utils.serialization import db_response, to_response_dict
+from app.utils.file_types import OOXML_MIME_TYPES, check_zip_signature, validate_file_type
+from app.utils.hot_files import hot_file_cache
+from app.utils.metrics import UPLOADS_IN_FLIGHT, counted_reader, time_stage
+from app.utils.blobstore import store_blob
+from app.utils.uploads import save_upload_to_temp, discard_upload
 from app.config import settings
+from app.db import get_blob_model, get_file_model, get_revoked_token_model
 
 router = APIRouter(prefix="/files", tags=["files"])
+logger = logging.getLogger(__name__)
 
-UPLOAD_DIR = "uploads"
+UPLOAD_DIR = settings.upload_dir
 ALLOWED_FILE_TYPES = [".pptx", ".docx", ".xlsx"]
 
 if not os.path.exists(UPLOAD_DIR):
     os.makedirs(UPLOAD_DIR)
 
-@router.post("/upload", response_model=FileInDB)
-async def upload_file(
-    file: UploadFile = File(...),
-    current_user: dict = Depends(get_current_ops_user),
-    db=Depends(get_db)
-):
+async def _store_upload(file: UploadFile, current_user: dict, blob_model: Blob) -> dict:
     # Check file type
     if not is_valid_file_type(file.filename, ALLOWED_FILE_TYPES):
         raise HTTPException(
@@ -32,100 +59,363 @@ async def upload_file(
             detail=f"Only {', '.join(ALLOWED_FILE_TYPES)} files are allowed",
         )
     
-    # Verify file content type using python-magic
-    file_content = await file.read()
-    mime = magic.Magic()
-    detected_type = mime.from_buffer(file_content)
+    with UPLOADS_IN_FLIGHT.track_inprogress():
+        # Reject non-ZIP data on the first chunk, then confirm the OOXML type from the central directory
+        with time_stage("upload_write"):
+            stored = await save_upload_to_temp(file, UPLOAD_DIR, sniff=check_zip_signature)
+        try:
+            with time_stage("upload_sniff"):
+                content_type = await validate_file_type(stored.temp_path, file.filename)
+        except HTTPException:
+            await discard_upload(stored)
+            raise
+
+        # Content-addressed: identical uploads share one stored blob
+        with time_stage("upload_store"):
+            storage_key = await store_blob(blob_model, stored)
     
-    valid_mime_types = [
-        "application/vnd.openxmlformats-officedocument.presentationml.presentation",  # pptx
-        "application/vnd.openxmlformats-officedocument.wordprocessingml.document",    # docx
-        "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",         # xlsx
-    ]
+    return {
+        "filename": file.filename,
+        "content_type": content_type,
+        "file_size": stored.size,
+        "content_hash": stored.sha256,
+        "storage_key": storage_key,
+        "uploaded_by": str(current_user["_id"]),
+    }
+
+@router.post("/upload", response_model=FileInDB)
+async def upload_file(
+    file: UploadFile = File(...),
+    current_user: dict = Depends(get_current_ops_user),
+    file_model: FileModel = Depends(get_file_model),
+    blob_model: Blob = Depends(get_blob_model),
+):
+    file_data = await _store_upload(file, current_user, blob_model)
     
-    if detected_type not in valid_mime_types:
+    # Create file record in DB
+    try:
+        with time_stage("upload_db_insert"):
+            file_record = await file_model.create_file(file_data)
+    except BaseException:
+        await blob_model.release(file_data["content_hash"])
+        raise
+    return db_response(file_record, FileInDB)
+
+@router.post("/upload/batch", response_model=BatchUploadResult)
+async def upload_files(
+    files: List[UploadFile] = File(...),
+    current_user: dict = Depends(get_current_ops_user),
+    file_model: FileModel = Depends(get_file_model),
+    blob_model: Blob = Depends(get_blob_model),
+):
+    if len(files) > settings.batch_upload_max_files:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Invalid file content type",
+            detail=f"At most {settings.batch_upload_max_files} files can be uploaded at once",
         )
     
-    # Save file
-    file_path = os.path.join(UPLOAD_DIR, f"{secrets.token_hex(8)}_{file.filename}")
-    with open(file_path, "wb") as f:
-        f.write(file_content)
+    semaphore = asyncio.Semaphore(settings.batch_upload_concurrency)
     
-    # Create file record in DB
-    file_data = {
-        "filename": file.filename,
-        "content_type": file.content_type,
-        "file_size": len(file_content),
-        "file_path": file_path,
-        "uploaded_by": str(current_user["_id"]),
-    }
+    async def store(file: UploadFile):
+        async with semaphore:
+            try:
+                return await _store_upload(file, current_user, blob_model), None
+            except HTTPException as exc:
+                return None, exc.detail
+            except Exception:
+                logger.exception("Batch upload of %s failed", file.filename)
+                return None, "Upload failed"
+    
+    outcomes = await asyncio.gather(*(store(file) for file in files))
+    
+    # One insert_many for every file that made it into storage
+    stored = [file_data for file_data, _ in outcomes if file_data is not None]
+    try:
+        records = iter(await file_model.create_files(stored) if stored else [])
+    except BaseException:
+        for file_data in stored:
+            await blob_model.release(file_data["content_hash"])
+        raise
+    
+    results = []
+    for file, (file_data, error) in zip(files, outcomes):
+        record = next(records) if file_data is not None else None
+        if file_data is not None and record is None:
+            await blob_model.release(file_data["content_hash"])
+            error = "Could not save file record"
+        results.append({
+            "filename": file.filename,
+            "success": record is not None,
+            "file": to_response_dict(record, FileInDB) if record is not None else None,
+            "error": error,
+        })
     
-    file_record = await FileModel(db).create_file(file_data)
-    return file_record
+    uploaded = sum(1 for result in results if result["success"])
+    return {"uploaded": uploaded, "failed": len(results) - uploaded, "results": results}
 
 @router.get("/download/{file_id}", response_model=FileDownloadLink)
 async def generate_download_link(
     file_id: str,
     current_user: dict = Depends(get_current_active_user),
-    db=Depends(get_db)
+    file_model: FileModel = Depends(get_file_model),
 ):
-    file = await FileModel(db).get_file_by_id(file_id)
+    file = await file_model.get_file_by_id(file_id)
     if not file:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="File not found",
         )
     
-    # Generate secure access token
-    access_token = generate_access_token()
-    await FileModel(db).update_file(file_id, {"access_token": access_token})
+    # Signed, self-contained token bound to this file and user; nothing is written
+    access_token = create_download_token(str(file["_id"]), str(current_user["_id"]))
     
     download_link = f"{settings.base_url}/files/download?token={access_token}"
     return {"download_link": download_link, "message": "success"}
 
+def _range_reader(file: dict) -> RangeReader:
+    if file.get("storage_key"):
+        return storage_range_reader(get_storage(), file["storage_key"])
+    # Files uploaded before the storage layer still point at a local path
+    if not os.path.exists(file["file_path"]):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="File not found on server",
+        )
+    return file_range_reader(file["file_path"])
+
+def _local_path(file: dict) -> Optional[str]:
+    if file.get("storage_key"):
+        storage = get_storage()
+        return storage.path(file["storage_key"]) if isinstance(storage, LocalStorageBackend) else None
+    path = file.get("file_path")
+    return path if path and os.path.exists(path) else None
+
+def _offload_location(path: str) -> Optional[tuple]:
+    if settings.download_delivery == "x-sendfile":
+        return "X-Sendfile", os.path.abspath(path)
+    # nginx maps download_accel_prefix to an internal location rooted at upload_dir
+    relative = os.path.relpath(path, settings.upload_dir)
+    if relative.startswith(".."):
+        return None
+    prefix = settings.download_accel_prefix.rstrip("/")
+    return "X-Accel-Redirect", f"{prefix}/{quote(relative.replace(os.sep, '/'))}"
+
+async def _authorize_download_token(token: str, current_user: dict, revoked_tokens: RevokedToken) -> dict:
+    access_denied = HTTPException(
+        status_code=status.HTTP_404_NOT_FOUND,
+        detail="File not found or access denied",
+    )
+    try:
+        claims = verify_download_token(token)
+    except InvalidTokenError:
+        raise access_denied
+    if claims["uid"] != str(current_user["_id"]):
+        raise access_denied
+    if settings.download_token_revocation and await revoked_tokens.is_revoked(claims["jti"]):
+        raise access_denied
+    return claims
+
+@router.post("/download/revoke")
+async def revoke_download_link(
+    token: str,
+    current_user: dict = Depends(get_current_active_user),
+    revoked_tokens: RevokedToken = Depends(get_revoked_token_model),
+):
+    if not settings.download_token_revocation:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Download link revocation is disabled",
+        )
+    claims = await _authorize_download_token(token, current_user, revoked_tokens)
+    await revoked_tokens.revoke(claims["jti"], datetime.utcfromtimestamp(claims["exp"]))
+    return {"message": "Download link revoked"}
+
 @router.get("/download")
 async def download_file(
     token: str,
+    request: Request,
     current_user: dict = Depends(get_current_active_user),
-    db=Depends(get_db)
+    file_model: FileModel = Depends(get_file_model),
+    revoked_tokens: RevokedToken = Depends(get_revoked_token_model),
 ):
-    file = await FileModel(db).get_file_by_access_token(token)
+    with time_stage("download_token_lookup"):
+        claims = await _authorize_download_token(token, current_user, revoked_tokens)
+        file = await file_model.get_file_by_id(claims["fid"])
     if not file:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="File not found or access denied",
         )
     
-    # Verify the file exists on disk
-    if not os.path.exists(file["file_path"]):
+    if file.get("storage_key") and settings.storage_redirect_downloads:
+        # Let the client fetch the bytes straight from object storage
+        url = await get_storage().presigned_url(
+            file["storage_key"],
+            file["filename"],
+            file["content_type"],
+            settings.storage_presigned_url_expire_seconds,
+        )
+        if url:
+            return RedirectResponse(url, status_code=status.HTTP_307_TEMPORARY_REDIRECT)
+    
+    # Only files on local disk can be handed to the kernel or the front proxy; the rest stream
+    delivery = settings.download_delivery
+    local_path = _local_path(file) if delivery != "stream" else None
+    if local_path is not None and delivery in ("x-accel-redirect", "x-sendfile"):
+        location = _offload_location(local_path)
+        if location is not None:
+            return build_offload_response(
+                request,
+                header=location[0],
+                location=location[1],
+                media_type=file["content_type"],
+                filename=file["filename"],
+                etag=content_etag(file.get("content_hash")),
+                last_modified=file["created_at"],
+            )
+    
+    sendfile_path = local_path if delivery == "sendfile" else None
+    return build_download_response(
+        request,
+        size=file["file_size"],
+        media_type=file["content_type"],
+        filename=file["filename"],
+        read_range=counted_reader(
+            (None if sendfile_path else hot_file_cache.get_reader(file)) or _range_reader(file)
+        ),
+        etag=content_etag(file.get("content_hash")),
+        last_modified=file["created_at"],
+        sendfile_path=sendfile_path,
+    )
+
+async def _bundle_response(file_ids: List[str], file_model: FileModel) -> StreamingResponse:
+    files = await file_model.get_files_by_ids(file_ids)
+    if len(files) != len(set(file_ids)):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
-            detail="File not found on server",
+            detail="File not found",
         )
+    # Keep the order the client asked for
+    position = {file_id: index for index, file_id in enumerate(file_ids)}
+    files.sort(key=lambda file: position[str(file["_id"])])
     
-    return FileResponse(
-        file["file_path"],
-        filename=file["filename"],
-        media_type=file["content_type"],
+    entries = []
+    for file in files:
+        read_range = _range_reader(file)
+        entries.append(BundleEntry(
+            filename=file["filename"],
+            size=file["file_size"],
+            modified=file["created_at"],
+            read=lambda read_range=read_range, size=file["file_size"]: read_range(0, size - 1),
+        ))
+    
+    # Bytes go out as soon as the first entry header is built; no temp file, constant memory
+    return StreamingResponse(
+        stream_zip(entries),
+        media_type="application/zip",
+        headers={"Content-Disposition": content_disposition(f"bundle-{datetime.utcnow():%Y%m%d-%H%M%S}.zip")},
     )
 
+@router.post("/bundle")
+async def download_bundle(
+    bundle: BundleRequest,
+    current_user: dict = Depends(get_current_active_user),
+    file_model: FileModel = Depends(get_file_model),
+):
+    return await _bundle_response(bundle.file_ids, file_model)
+
+@router.post("/bundle/link", response_model=FileDownloadLink)
+async def generate_bundle_link(
+    bundle: BundleRequest,
+    current_user: dict = Depends(get_current_active_user),
+    file_model: FileModel = Depends(get_file_model),
+):
+    files = await file_model.get_files_by_ids(bundle.file_ids)
+    if len(files) != len(set(bundle.file_ids)):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="File not found",
+        )
+    token = create_signed_token(
+        {"fids": bundle.file_ids, "uid": str(current_user["_id"])},
+        "bundle",
+        timedelta(minutes=settings.download_link_expire_minutes),
+    )
+    return {"download_link": f"{settings.base_url}/files/bundle?token={token}", "message": "success"}
+
+@router.get("/bundle")
+async def download_bundle_by_token(
+    token: str,
+    current_user: dict = Depends(get_current_active_user),
+    file_model: FileModel = Depends(get_file_model),
+):
+    try:
+        claims = verify_signed_token(token, "bundle")
+    except InvalidTokenError:
+        claims = None
+    if claims is None or claims["uid"] != str(current_user["_id"]):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="File not found or access denied",
+        )
+    return await _bundle_response(claims["fids"], file_model)
+
+def file_filters(
+    filename_prefix: Optional[str] = Query(None, max_length=255),
+    q: Optional[str] = Query(None, min_length=1, max_length=200),
+    file_type: Optional[str] = Query(None, description="pptx, docx or xlsx"),
+    created_after: Optional[datetime] = None,
+    created_before: Optional[datetime] = None,
+    min_size: Optional[int] = Query(None, ge=0),
+    max_size: Optional[int] = Query(None, ge=0),
+) -> dict:
+    content_type = None
+    if file_type:
+        content_type = OOXML_MIME_TYPES.get(f".{file_type.lower().lstrip('.')}")
+        if content_type is None:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"file_type must be one of {', '.join(ALLOWED_FILE_TYPES)}",
+            )
+    return {
+        "filename_prefix": filename_prefix,
+        "text": q,
+        "content_type": content_type,
+        "created_after": created_after,
+        "created_before": created_before,
+        "min_size": min_size,
+        "max_size": max_size,
+    }
+
 @router.get("/list", response_model=List[FileInDB])
 async def list_files(
+    request: Request,
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=settings.files_page_size_max),
+    filters: dict = Depends(file_filters),
     current_user: dict = Depends(get_current_active_user),
-    db=Depends(get_db)
+    file_model: FileModel = Depends(get_file_model),
 ):
-    files = await FileModel(db).get_files_by_uploader(str(current_user["_id"]))
-    return files
-
-async def get_db():
-    from app.config import settings
-    import motor.motor_asyncio
-    client = motor.motor_asyncio.AsyncIOMotorClient(settings.mongodb_url)
-    db = client[settings.database_name]
-    try:
-        yield db
-    finally:
-        client.close()
\ No newline at end of file
+    limit = limit or settings.files_page_size
+    after = decode_cursor(cursor) if cursor else None
+    query = file_model.build_query(str(current_user["_id"]), **filters)
+    files = await file_model.get_files_page(query, limit, after)
+    
+    # The continuation token travels in headers so the body stays a plain list
+    if len(files) > limit:
+        files = files[:limit]
+        next_cursor = encode_cursor(files[-1])
+        next_url = request.url.include_query_params(cursor=next_cursor, limit=limit)
+        response.headers["X-Next-Cursor"] = next_cursor
+        response.headers["Link"] = f'<{next_url}>; rel="next"'
+    return db_response(files, FileInDB, response)
+
+@router.get("/stats", response_model=FileStats)
+async def file_stats(
+    filters: dict = Depends(file_filters),
+    current_user: dict = Depends(get_current_active_user),
+    file_model: FileModel = Depends(get_file_model),
+):
+    query = file_model.build_query(str(current_user["_id"]), **filters)
+    return await file_model.get_stats(query)
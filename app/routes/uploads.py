@@ -0,0 +1,279 @@
+import hmac
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, Response, status
+
+from app.config import settings
+from app.db import get_blob_model, get_file_model, get_upload_session_model
+from app.models.blob import Blob
+from app.models.file import File as FileModel
+from app.models.upload_session import UploadSession
+from app.routes.files import ALLOWED_FILE_TYPES
+from app.schemas.file import FileInDB, UploadComplete, UploadSessionCreate, UploadSessionInfo
+from app.utils.auth import get_current_ops_user
+from app.utils.blobstore import store_blob
+from app.utils.file_types import validate_file_type
+from app.utils.metrics import UPLOADS_IN_FLIGHT, time_stage
+from app.utils.resumable import (
+    HTTP_460_CHECKSUM_MISMATCH,
+    contiguous_offset,
+    copy_chunk,
+    create_staging_file,
+    format_ranges,
+    hash_file,
+    merge_ranges,
+    missing_ranges,
+    parse_checksum_header,
+    receive_chunk,
+    remove_staging_file,
+    scratch_path,
+    staging_path,
+)
+from app.utils.security import is_valid_file_type
+from app.utils.serialization import db_response
+from app.utils.uploads import StoredUpload
+
+# tus-style resumable uploads: create a session, PATCH chunks at any offset (in parallel if
+# wanted), HEAD to find out what arrived, then complete to verify and store the file
+router = APIRouter(prefix="/files/uploads", tags=["files"])
+
+def _upload_url(session: dict) -> str:
+    return f"{settings.base_url}/files/uploads/{session['_id']}"
+
+def _session_headers(session: dict) -> dict:
+    ranges = merge_ranges(session["chunks"])
+    return {
+        "Upload-Offset": str(contiguous_offset(ranges)),
+        "Upload-Length": str(session["size"]),
+        "Upload-Ranges": format_ranges(ranges),
+        "Cache-Control": "no-store",
+    }
+
+def _session_info(session: dict) -> dict:
+    ranges = merge_ranges(session["chunks"])
+    return {
+        "id": str(session["_id"]),
+        "filename": session["filename"],
+        "size": session["size"],
+        "offset": contiguous_offset(ranges),
+        "missing_ranges": format_ranges(missing_ranges(ranges, session["size"])),
+        "expires_at": session["expires_at"],
+        "upload_url": _upload_url(session),
+        "max_chunk_size": settings.resumable_max_chunk_size,
+    }
+
+async def _get_session(session_id: str, current_user: dict, sessions: UploadSession) -> dict:
+    session = await sessions.get_session(session_id, str(current_user["_id"]))
+    if not session:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Upload session not found",
+        )
+    return session
+
+@router.post("", response_model=UploadSessionInfo, status_code=status.HTTP_201_CREATED)
+async def create_upload(
+    body: UploadSessionCreate,
+    response: Response,
+    current_user: dict = Depends(get_current_ops_user),
+    sessions: UploadSession = Depends(get_upload_session_model),
+):
+    if not is_valid_file_type(body.filename, ALLOWED_FILE_TYPES):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Only {', '.join(ALLOWED_FILE_TYPES)} files are allowed",
+        )
+    if body.size > settings.max_upload_size:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"File exceeds the maximum size of {settings.max_upload_size} bytes",
+        )
+
+    session = await sessions.create_session(
+        {
+            "filename": body.filename,
+            "size": body.size,
+            "sha256": body.sha256.lower() if body.sha256 else None,
+            "uploaded_by": str(current_user["_id"]),
+        },
+        settings.resumable_upload_expire_seconds,
+    )
+    try:
+        await create_staging_file(staging_path(session["_id"]), body.size)
+    except BaseException:
+        await sessions.delete_session(session["_id"])
+        raise
+
+    response.headers["Location"] = _upload_url(session)
+    response.headers.update(_session_headers(session))
+    return _session_info(session)
+
+@router.head("/{session_id}")
+async def upload_head(
+    session_id: str,
+    current_user: dict = Depends(get_current_ops_user),
+    sessions: UploadSession = Depends(get_upload_session_model),
+):
+    session = await _get_session(session_id, current_user, sessions)
+    return Response(headers=_session_headers(session))
+
+@router.get("/{session_id}", response_model=UploadSessionInfo)
+async def upload_status(
+    session_id: str,
+    current_user: dict = Depends(get_current_ops_user),
+    sessions: UploadSession = Depends(get_upload_session_model),
+):
+    return _session_info(await _get_session(session_id, current_user, sessions))
+
+@router.patch("/{session_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def upload_chunk(
+    session_id: str,
+    request: Request,
+    upload_offset: int = Header(..., ge=0),
+    upload_checksum: Optional[str] = Header(None),
+    content_length: Optional[int] = Header(None),
+    current_user: dict = Depends(get_current_ops_user),
+    sessions: UploadSession = Depends(get_upload_session_model),
+):
+    session = await _get_session(session_id, current_user, sessions)
+    if session["status"] != "open":
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Upload session is being completed",
+        )
+    if upload_offset >= session["size"]:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Upload-Offset is past the end of the upload",
+        )
+    expected_digest = parse_checksum_header(upload_checksum)
+
+    max_length = min(session["size"] - upload_offset, settings.resumable_max_chunk_size)
+    if content_length is not None and content_length > max_length:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail="Chunk extends past the declared upload length or chunk size limit",
+        )
+
+    scratch = scratch_path(session["_id"])
+    try:
+        with UPLOADS_IN_FLIGHT.track_inprogress(), time_stage("upload_chunk_write"):
+            length, digest = await receive_chunk(scratch, request.stream(), max_length)
+        if length == 0:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Empty chunk",
+            )
+        if expected_digest is not None and not hmac.compare_digest(digest, expected_digest):
+            # The staging file was never touched and nothing is recorded, so the range keeps
+            # whatever was there before and can simply be re-sent
+            raise HTTPException(
+                status_code=HTTP_460_CHECKSUM_MISMATCH,
+                detail="Chunk checksum mismatch",
+            )
+
+        write_id = await sessions.begin_write(session["_id"], settings.resumable_write_lease_seconds)
+        if write_id is None:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Upload session is no longer open",
+            )
+        try:
+            with time_stage("upload_chunk_copy"):
+                await copy_chunk(scratch, staging_path(session["_id"]), upload_offset)
+        except BaseException:
+            await sessions.end_write(session["_id"], write_id)
+            raise
+        session = await sessions.add_chunk(
+            session["_id"], write_id, upload_offset, length, settings.resumable_upload_expire_seconds
+        )
+    finally:
+        await remove_staging_file(scratch)
+    if session is None:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Upload session is no longer open",
+        )
+    return Response(status_code=status.HTTP_204_NO_CONTENT, headers=_session_headers(session))
+
+@router.post("/{session_id}/complete", response_model=FileInDB)
+async def complete_upload(
+    session_id: str,
+    body: Optional[UploadComplete] = None,
+    current_user: dict = Depends(get_current_ops_user),
+    sessions: UploadSession = Depends(get_upload_session_model),
+    file_model: FileModel = Depends(get_file_model),
+    blob_model: Blob = Depends(get_blob_model),
+):
+    session = await _get_session(session_id, current_user, sessions)
+    session = await sessions.begin_completion(session["_id"], settings.resumable_upload_expire_seconds)
+    if session is None:
+        # Chunks still being copied would otherwise write into the file after it is stored
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Upload is already being completed or chunks are still being written",
+            headers={"Retry-After": "1"},
+        )
+
+    missing = missing_ranges(merge_ranges(session["chunks"]), session["size"])
+    if missing:
+        await sessions.reopen(session["_id"])
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Missing byte ranges: {format_ranges(missing)}",
+        )
+
+    path = staging_path(session["_id"])
+    try:
+        # The chunks were written in place, so the staged file already is the document
+        with time_stage("upload_hash"):
+            sha256 = await hash_file(path)
+        declared = (body.sha256 if body and body.sha256 else session.get("sha256") or "").lower()
+        if declared and declared != sha256:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="File checksum mismatch",
+            )
+        content_type = await validate_file_type(path, session["filename"])
+
+        # store_blob moves the staged file into storage (or drops it if the content already exists)
+        with time_stage("upload_store"):
+            stored = StoredUpload(temp_path=path, size=session["size"], sha256=sha256)
+            storage_key = await store_blob(blob_model, stored)
+    except BaseException:
+        await sessions.delete_session(session["_id"])
+        await remove_staging_file(path)
+        raise
+
+    file_data = {
+        "filename": session["filename"],
+        "content_type": content_type,
+        "file_size": session["size"],
+        "content_hash": sha256,
+        "storage_key": storage_key,
+        "uploaded_by": session["uploaded_by"],
+    }
+    try:
+        with time_stage("upload_db_insert"):
+            file_record = await file_model.create_file(file_data)
+    except BaseException:
+        await blob_model.release(sha256)
+        raise
+    finally:
+        await sessions.delete_session(session["_id"])
+    return db_response(file_record, FileInDB)
+
+@router.delete("/{session_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def abort_upload(
+    session_id: str,
+    current_user: dict = Depends(get_current_ops_user),
+    sessions: UploadSession = Depends(get_upload_session_model),
+):
+    session = await sessions.delete_session(session_id, str(current_user["_id"]))
+    if not session:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Upload session not found",
+        )
+    await remove_staging_file(staging_path(session["_id"]))
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
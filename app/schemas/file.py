@@ -1,6 +1,6 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from datetime import datetime
-from typing import Optional
+from typing import List, Optional
 
 class FileBase(BaseModel):
     filename: str
@@ -13,14 +13,61 @@ class FileCreate(FileBase):
 class FileInDB(FileBase):
     id: str
     uploaded_by: str
-    file_path: str
-    access_token: Optional[str] = None
+    content_hash: Optional[str] = None
     created_at: datetime
     updated_at: datetime
 
     class Config:
         from_attributes = True
 
+class BatchUploadItem(BaseModel):
+    filename: str
+    success: bool
+    file: Optional[FileInDB] = None
+    error: Optional[str] = None
+
+class BatchUploadResult(BaseModel):
+    uploaded: int
+    failed: int
+    results: List[BatchUploadItem]
+
+class BundleRequest(BaseModel):
+    file_ids: List[str] = Field(..., min_items=1, max_items=500)
+
+class UploadSessionCreate(BaseModel):
+    filename: str
+    size: int = Field(..., gt=0)
+    sha256: Optional[str] = Field(None, regex="^[0-9a-fA-F]{64}$")
+
+class UploadSessionInfo(BaseModel):
+    id: str
+    filename: str
+    size: int
+    offset: int
+    missing_ranges: str
+    expires_at: datetime
+    upload_url: str
+    max_chunk_size: int
+
+class UploadComplete(BaseModel):
+    sha256: Optional[str] = Field(None, regex="^[0-9a-fA-F]{64}$")
+
 class FileDownloadLink(BaseModel):
     download_link: str
-    message: str = "success"
\ No newline at end of file
+    message: str = "success"
+
+class FileTypeStats(BaseModel):
+    content_type: str
+    count: int
+    total_bytes: int
+
+class FileMonthStats(BaseModel):
+    month: str
+    count: int
+    total_bytes: int
+
+class FileStats(BaseModel):
+    total_count: int
+    total_bytes: int
+    by_type: List[FileTypeStats]
+    by_month: List[FileMonthStats]
@@ -0,0 +1,43 @@
+from typing import Optional
+
+from app.config import settings
+from app.storage.base import ObjectStat, StorageBackend
+
+_storage: Optional[StorageBackend] = None
+
+
+def create_storage() -> StorageBackend:
+    if settings.storage_backend == "s3":
+        from app.storage.s3 import S3StorageBackend
+
+        return S3StorageBackend(
+            bucket=settings.s3_bucket,
+            endpoint_url=settings.s3_endpoint_url,
+            region_name=settings.s3_region,
+            access_key_id=settings.s3_access_key_id,
+            secret_access_key=settings.s3_secret_access_key,
+            max_pool_connections=settings.s3_max_pool_connections,
+            part_size=settings.s3_multipart_part_size,
+        )
+    if settings.storage_backend == "local":
+        from app.storage.local import LocalStorageBackend
+
+        return LocalStorageBackend(settings.upload_dir)
+    raise ValueError(f"Unknown storage backend: {settings.storage_backend}")
+
+
+def get_storage() -> StorageBackend:
+    global _storage
+    if _storage is None:
+        _storage = create_storage()
+    return _storage
+
+
+async def close_storage():
+    global _storage
+    if _storage is not None:
+        await _storage.close()
+        _storage = None
+
+
+__all__ = ["ObjectStat", "StorageBackend", "close_storage", "create_storage", "get_storage"]
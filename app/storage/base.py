@@ -0,0 +1,55 @@
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import AsyncIterator, Optional
+
+import anyio
+
+
+@dataclass
+class ObjectStat:
+    key: str
+    size: int
+
+
+class StorageBackend(ABC):
+    chunk_size = 1024 * 1024
+
+    @abstractmethod
+    async def put_stream(self, key: str, chunks: AsyncIterator[bytes]) -> ObjectStat:
+        ...
+
+    async def put_file(self, key: str, path: str) -> ObjectStat:
+        # Takes ownership of path: backends may move it into place instead of copying
+        async def read_chunks():
+            async with await anyio.open_file(path, "rb") as f:
+                while True:
+                    chunk = await f.read(self.chunk_size)
+                    if not chunk:
+                        break
+                    yield chunk
+
+        stat = await self.put_stream(key, read_chunks())
+        await anyio.Path(path).unlink(missing_ok=True)
+        return stat
+
+    @abstractmethod
+    def get_stream(self, key: str, start: int = 0, end: Optional[int] = None) -> AsyncIterator[bytes]:
+        # end is inclusive, matching HTTP byte ranges
+        ...
+
+    @abstractmethod
+    async def stat(self, key: str) -> Optional[ObjectStat]:
+        ...
+
+    @abstractmethod
+    async def delete(self, key: str):
+        ...
+
+    async def presigned_url(
+        self, key: str, filename: str, media_type: str, expires_in: int
+    ) -> Optional[str]:
+        # Backends that cannot hand out direct URLs return None and the API streams the bytes
+        return None
+
+    async def close(self):
+        pass
@@ -0,0 +1,64 @@
+import os
+import secrets
+from typing import AsyncIterator, Optional
+
+import anyio
+from starlette.concurrency import run_in_threadpool
+
+from app.storage.base import ObjectStat, StorageBackend
+
+
+class LocalStorageBackend(StorageBackend):
+    def __init__(self, root: str):
+        self.root = root
+        self.temp_dir = os.path.join(root, "tmp")
+        os.makedirs(self.temp_dir, exist_ok=True)
+
+    def path(self, key: str) -> str:
+        path = os.path.normpath(os.path.join(self.root, key))
+        if not path.startswith(os.path.normpath(self.root) + os.sep):
+            raise ValueError(f"Invalid storage key: {key}")
+        return path
+
+    def _move(self, source: str, key: str) -> ObjectStat:
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(source, path)
+        return ObjectStat(key=key, size=os.path.getsize(path))
+
+    async def put_file(self, key: str, path: str) -> ObjectStat:
+        # Same filesystem as the upload temp files, so this is a rename rather than a copy
+        return await run_in_threadpool(self._move, path, key)
+
+    async def put_stream(self, key: str, chunks: AsyncIterator[bytes]) -> ObjectStat:
+        temp_path = os.path.join(self.temp_dir, f".{secrets.token_hex(16)}.part")
+        try:
+            async with await anyio.open_file(temp_path, "wb") as f:
+                async for chunk in chunks:
+                    await f.write(chunk)
+            return await run_in_threadpool(self._move, temp_path, key)
+        except BaseException:
+            await anyio.Path(temp_path).unlink(missing_ok=True)
+            raise
+
+    async def get_stream(self, key: str, start: int = 0, end: Optional[int] = None):
+        async with await anyio.open_file(self.path(key), "rb") as f:
+            await f.seek(start)
+            remaining = None if end is None else end - start + 1
+            while remaining is None or remaining > 0:
+                chunk = await f.read(self.chunk_size if remaining is None else min(self.chunk_size, remaining))
+                if not chunk:
+                    break
+                if remaining is not None:
+                    remaining -= len(chunk)
+                yield chunk
+
+    async def stat(self, key: str) -> Optional[ObjectStat]:
+        try:
+            result = await anyio.Path(self.path(key)).stat()
+        except FileNotFoundError:
+            return None
+        return ObjectStat(key=key, size=result.st_size)
+
+    async def delete(self, key: str):
+        await anyio.Path(self.path(key)).unlink(missing_ok=True)
@@ -0,0 +1,141 @@
+import asyncio
+from contextlib import AsyncExitStack
+from typing import AsyncIterator, Optional
+from urllib.parse import quote
+
+from app.storage.base import ObjectStat, StorageBackend
+
+try:
+    from aiobotocore.config import AioConfig
+    from aiobotocore.session import get_session
+    from botocore.exceptions import ClientError
+except ImportError:  # pragma: no cover - optional dependency
+    get_session = None
+
+# S3 rejects multipart parts smaller than 5 MiB (except the last one)
+MIN_PART_SIZE = 5 * 1024 * 1024
+
+
+class S3StorageBackend(StorageBackend):
+    def __init__(
+        self,
+        bucket: str,
+        endpoint_url: Optional[str] = None,
+        region_name: Optional[str] = None,
+        access_key_id: Optional[str] = None,
+        secret_access_key: Optional[str] = None,
+        max_pool_connections: int = 50,
+        part_size: int = 8 * 1024 * 1024,
+    ):
+        if get_session is None:
+            raise RuntimeError("The S3 storage backend requires the 'aiobotocore' package")
+        self.bucket = bucket
+        self.part_size = max(part_size, MIN_PART_SIZE)
+        self._client_kwargs = {
+            "endpoint_url": endpoint_url,
+            "region_name": region_name,
+            "aws_access_key_id": access_key_id,
+            "aws_secret_access_key": secret_access_key,
+            "config": AioConfig(max_pool_connections=max_pool_connections),
+        }
+        self._client = None
+        self._exit_stack = AsyncExitStack()
+        self._client_lock = asyncio.Lock()
+
+    async def _get_client(self):
+        # One client (and connection pool) for the whole process, opened on first use
+        if self._client is None:
+            async with self._client_lock:
+                if self._client is None:
+                    self._client = await self._exit_stack.enter_async_context(
+                        get_session().create_client("s3", **self._client_kwargs)
+                    )
+        return self._client
+
+    async def put_stream(self, key: str, chunks: AsyncIterator[bytes]) -> ObjectStat:
+        client = await self._get_client()
+        buffer = bytearray()
+        size = 0
+        upload_id = None
+        parts = []
+        try:
+            async for chunk in chunks:
+                buffer += chunk
+                size += len(chunk)
+                while len(buffer) >= self.part_size:
+                    if upload_id is None:
+                        response = await client.create_multipart_upload(Bucket=self.bucket, Key=key)
+                        upload_id = response["UploadId"]
+                    part = bytes(buffer[:self.part_size])
+                    del buffer[:self.part_size]
+                    response = await client.upload_part(
+                        Bucket=self.bucket, Key=key, UploadId=upload_id,
+                        PartNumber=len(parts) + 1, Body=part,
+                    )
+                    parts.append({"PartNumber": len(parts) + 1, "ETag": response["ETag"]})
+
+            if upload_id is None:
+                # Small objects fit in a single request
+                await client.put_object(Bucket=self.bucket, Key=key, Body=bytes(buffer))
+            else:
+                if buffer:
+                    response = await client.upload_part(
+                        Bucket=self.bucket, Key=key, UploadId=upload_id,
+                        PartNumber=len(parts) + 1, Body=bytes(buffer),
+                    )
+                    parts.append({"PartNumber": len(parts) + 1, "ETag": response["ETag"]})
+                await client.complete_multipart_upload(
+                    Bucket=self.bucket, Key=key, UploadId=upload_id,
+                    MultipartUpload={"Parts": parts},
+                )
+        except BaseException:
+            if upload_id is not None:
+                await client.abort_multipart_upload(Bucket=self.bucket, Key=key, UploadId=upload_id)
+            raise
+        return ObjectStat(key=key, size=size)
+
+    async def get_stream(self, key: str, start: int = 0, end: Optional[int] = None):
+        client = await self._get_client()
+        params = {"Bucket": self.bucket, "Key": key}
+        if start or end is not None:
+            params["Range"] = f"bytes={start}-{'' if end is None else end}"
+        response = await client.get_object(**params)
+        async with response["Body"] as body:
+            while True:
+                chunk = await body.read(self.chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+
+    async def stat(self, key: str) -> Optional[ObjectStat]:
+        client = await self._get_client()
+        try:
+            response = await client.head_object(Bucket=self.bucket, Key=key)
+        except ClientError as exc:
+            if exc.response["Error"]["Code"] in ("404", "NoSuchKey", "NotFound"):
+                return None
+            raise
+        return ObjectStat(key=key, size=response["ContentLength"])
+
+    async def delete(self, key: str):
+        client = await self._get_client()
+        await client.delete_object(Bucket=self.bucket, Key=key)
+
+    async def presigned_url(
+        self, key: str, filename: str, media_type: str, expires_in: int
+    ) -> Optional[str]:
+        client = await self._get_client()
+        return await client.generate_presigned_url(
+            "get_object",
+            Params={
+                "Bucket": self.bucket,
+                "Key": key,
+                "ResponseContentType": media_type,
+                "ResponseContentDisposition": f"attachment; filename*=utf-8''{quote(filename)}",
+            },
+            ExpiresIn=expires_in,
+        )
+
+    async def close(self):
+        await self._exit_stack.aclose()
+        self._client = None
@@ -0,0 +1,180 @@
+import json
+import shutil
+import time
+from collections import defaultdict
+from typing import Optional, Tuple
+
+from starlette.datastructures import Headers
+
+from app.config import settings
+from app.utils.auth import bearer_subject
+
+UPLOAD_METHODS = ("POST", "PUT", "PATCH")
+
+
+class UploadAdmission:
+    # Bookkeeping for uploads admitted by the middleware below. Only touched from the event
+    # loop, so plain counters are enough.
+    def __init__(
+        self,
+        max_concurrent: int,
+        max_per_user: int,
+        max_in_flight_bytes: int,
+        min_free_bytes: int,
+        disk_path: str,
+    ):
+        self.max_concurrent = max_concurrent
+        self.max_per_user = max_per_user
+        self.max_in_flight_bytes = max_in_flight_bytes
+        self.min_free_bytes = min_free_bytes
+        self.disk_path = disk_path
+        self.active = 0
+        self.in_flight_bytes = 0
+        self.per_user = defaultdict(int)
+        self.rejected = defaultdict(int)
+        self._free_bytes = None
+        self._free_checked_at = 0.0
+
+    def free_bytes(self) -> Optional[int]:
+        # statvfs is cheap but not free; one reading a second is plenty for a watermark
+        now = time.monotonic()
+        if self._free_bytes is None or now - self._free_checked_at >= 1.0:
+            try:
+                self._free_bytes = shutil.disk_usage(self.disk_path).free
+            except FileNotFoundError:
+                self._free_bytes = None
+            self._free_checked_at = now
+        return self._free_bytes
+
+    def try_admit(self, user: Optional[str], length: int) -> Optional[Tuple[int, str]]:
+        # Returns (status, reason) when the upload has to be turned away
+        if self.max_per_user > 0 and user is not None and self.per_user[user] >= self.max_per_user:
+            return self._reject(429, "user_limit")
+        if self.max_concurrent > 0 and self.active >= self.max_concurrent:
+            return self._reject(503, "concurrency")
+        if (
+            self.max_in_flight_bytes > 0
+            and self.active > 0
+            and self.in_flight_bytes + length > self.max_in_flight_bytes
+        ):
+            return self._reject(503, "in_flight_bytes")
+        if self.min_free_bytes > 0:
+            free = self.free_bytes()
+            # Bytes already admitted have not all reached the disk yet
+            if free is not None and free - self.in_flight_bytes - length < self.min_free_bytes:
+                return self._reject(503, "disk_space")
+
+        self.active += 1
+        self.in_flight_bytes += length
+        if user is not None:
+            self.per_user[user] += 1
+        return None
+
+    def release(self, user: Optional[str], length: int):
+        self.active -= 1
+        self.in_flight_bytes -= length
+        if user is not None:
+            self.per_user[user] -= 1
+            if not self.per_user[user]:
+                del self.per_user[user]
+
+    def _reject(self, status_code: int, reason: str) -> Tuple[int, str]:
+        self.rejected[reason] += 1
+        return status_code, reason
+
+    def stats(self) -> dict:
+        free = self.free_bytes()
+        return {
+            "active": self.active,
+            "max_concurrent": self.max_concurrent,
+            "in_flight_bytes": self.in_flight_bytes,
+            "max_in_flight_bytes": self.max_in_flight_bytes,
+            "users": len(self.per_user),
+            "disk_free_bytes": free,
+            "min_free_bytes": self.min_free_bytes,
+            "utilization": {
+                "concurrency": self.active / self.max_concurrent if self.max_concurrent > 0 else 0.0,
+                "in_flight_bytes": (
+                    self.in_flight_bytes / self.max_in_flight_bytes if self.max_in_flight_bytes > 0 else 0.0
+                ),
+            },
+            "rejected": dict(self.rejected),
+        }
+
+
+upload_admission = UploadAdmission(
+    max_concurrent=settings.upload_max_concurrent,
+    max_per_user=settings.upload_max_concurrent_per_user,
+    max_in_flight_bytes=settings.upload_max_in_flight_bytes,
+    min_free_bytes=settings.upload_min_free_disk_bytes,
+    disk_path=settings.upload_dir,
+)
+
+REJECTION_MESSAGES = {
+    "user_limit": "Too many concurrent uploads for this account",
+    "concurrency": "Too many uploads in progress, try again shortly",
+    "in_flight_bytes": "Too many uploads in progress, try again shortly",
+    "disk_space": "Upload storage is nearly full, try again later",
+}
+
+
+def _declared_length(headers: Headers) -> int:
+    content_length = headers.get("content-length")
+    try:
+        return max(int(content_length), 0)
+    except (TypeError, ValueError):
+        # Chunked bodies are assumed to be as large as an upload may get
+        return settings.max_upload_size
+
+
+class UploadAdmissionMiddleware:
+    # Decides before a single body byte is read, so rejected uploads cost no memory or disk.
+    # Plain ASGI like MetricsMiddleware; the slot is held until the response has been sent.
+    def __init__(self, app, admission: UploadAdmission = upload_admission):
+        self.app = app
+        self.admission = admission
+
+    def _applies(self, scope) -> bool:
+        return (
+            scope["type"] == "http"
+            and scope["method"] in UPLOAD_METHODS
+            and scope["path"].startswith(tuple(settings.upload_admission_paths))
+        )
+
+    async def __call__(self, scope, receive, send):
+        if not self._applies(scope):
+            await self.app(scope, receive, send)
+            return
+
+        headers = Headers(scope=scope)
+        length = _declared_length(headers)
+        if length == 0:
+            # Session creation, completion and other bodiless calls are not uploads
+            await self.app(scope, receive, send)
+            return
+
+        # Only the token signature is checked here; the route still loads and authorizes the user
+        user = bearer_subject(headers.get("authorization"))
+        rejection = self.admission.try_admit(user, length)
+        if rejection is not None:
+            await self._reject(send, *rejection)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.admission.release(user, length)
+
+    async def _reject(self, send, status_code: int, reason: str):
+        body = json.dumps({"detail": REJECTION_MESSAGES[reason]}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": status_code,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(settings.upload_retry_after_seconds).encode()),
+                # The client may still be sending the body; don't leave the connection half-read
+                (b"connection", b"close"),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -1,12 +1,31 @@
+import asyncio
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
 from passlib.context import CryptContext
-from fastapi import HTTPException, status
+from fastapi import Depends, HTTPException, status
+from fastapi.security import OAuth2PasswordBearer
 from app.config import settings
+from app.db import get_db
 from app.schemas.user import TokenData
+from app.utils.cache import user_cache
+from app.utils.metrics import time_stage
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# min_rounds makes needs_update() flag hashes created with a lower cost factor
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=settings.bcrypt_rounds,
+    bcrypt__min_rounds=settings.bcrypt_rounds,
+)
+oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
+
+MAX_CACHED_TOKENS_PER_USER = 8
+
+_hash_executor: Optional[Executor] = None
+_hash_stats = {"in_flight": 0, "completed": 0, "rejected": 0}
 
 def verify_password(plain_password: str, hashed_password: str):
     return pwd_context.verify(plain_password, hashed_password)
@@ -14,6 +33,65 @@ def verify_password(plain_password: str, hashed_password: str):
 def get_password_hash(password: str):
     return pwd_context.hash(password)
 
+def password_needs_update(hashed_password: str) -> bool:
+    return pwd_context.needs_update(hashed_password)
+
+def _get_hash_executor() -> Executor:
+    global _hash_executor
+    if _hash_executor is None:
+        if settings.password_hash_executor == "process":
+            _hash_executor = ProcessPoolExecutor(max_workers=settings.password_hash_workers)
+        else:
+            # bcrypt releases the GIL while hashing, so threads run in parallel
+            _hash_executor = ThreadPoolExecutor(
+                max_workers=settings.password_hash_workers,
+                thread_name_prefix="password-hash",
+            )
+    return _hash_executor
+
+async def _run_hash_job(stage: str, func, *args):
+    # The executor caps concurrency at password_hash_workers; beyond the queue limit we shed load
+    if _hash_stats["in_flight"] >= settings.password_hash_workers + settings.password_hash_max_queue:
+        _hash_stats["rejected"] += 1
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Server busy, please retry",
+            headers={"Retry-After": "1"},
+        )
+    _hash_stats["in_flight"] += 1
+    try:
+        loop = asyncio.get_running_loop()
+        # Includes time queued behind other jobs, which is what the caller actually waits
+        with time_stage(stage):
+            return await loop.run_in_executor(_get_hash_executor(), func, *args)
+    finally:
+        _hash_stats["in_flight"] -= 1
+        _hash_stats["completed"] += 1
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    return await _run_hash_job("bcrypt_verify", verify_password, plain_password, hashed_password)
+
+async def get_password_hash_async(password: str) -> str:
+    return await _run_hash_job("bcrypt_hash", get_password_hash, password)
+
+def get_password_hash_stats() -> dict:
+    in_flight = _hash_stats["in_flight"]
+    return {
+        "executor": settings.password_hash_executor,
+        "workers": settings.password_hash_workers,
+        "max_queue": settings.password_hash_max_queue,
+        "in_flight": in_flight,
+        "queue_depth": max(0, in_flight - settings.password_hash_workers),
+        "completed": _hash_stats["completed"],
+        "rejected": _hash_stats["rejected"],
+    }
+
+def shutdown_password_hasher():
+    global _hash_executor
+    if _hash_executor is not None:
+        _hash_executor.shutdown(wait=False, cancel_futures=True)
+        _hash_executor = None
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
@@ -24,14 +102,34 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, settings.secret_key, algorithm=settings.algorithm)
     return encoded_jwt
 
-async def get_current_user(token: str, db):
+def bearer_subject(authorization: Optional[str]) -> Optional[str]:
+    # For middleware that only needs to know who is asking; the user is not looked up
+    if not authorization or not authorization.lower().startswith("bearer "):
+        return None
+    try:
+        payload = jwt.decode(authorization[7:], settings.secret_key, algorithms=[settings.algorithm])
+    except JWTError:
+        return None
+    return payload.get("sub")
+
+async def get_current_user(token: str = Depends(oauth2_scheme), db=Depends(get_db)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
     try:
-        payload = jwt.decode(token, settings.secret_key, algorithms=[settings.algorithm])
+        # Tokens this worker already verified for a cached user skip signature checks and the DB
+        claimed_email = jwt.get_unverified_claims(token).get("sub")
+    except JWTError:
+        raise credentials_exception
+    cached = user_cache.get(claimed_email) if claimed_email else None
+    if cached is not None and cached["tokens"].get(token, 0) > time.time():
+        return cached["user"]
+
+    try:
+        with time_stage("jwt_decode"):
+            payload = jwt.decode(token, settings.secret_key, algorithms=[settings.algorithm])
         email: str = payload.get("sub")
         if email is None:
             raise credentials_exception
@@ -39,17 +137,28 @@ async def get_current_user(token: str, db):
     except JWTError:
         raise credentials_exception
     
-    user = await db["users"].find_one({"email": token_data.email})
-    if user is None:
-        raise credentials_exception
+    if cached is not None and email == claimed_email:
+        user = cached["user"]
+    else:
+        with time_stage("user_lookup"):
+            user = await db["users"].find_one({"email": token_data.email})
+        if user is None:
+            raise credentials_exception
+        cached = {"user": user, "tokens": {}}
+        user_cache.set(email, cached)
+
+    if payload.get("exp"):
+        cached["tokens"][token] = payload["exp"]
+    while len(cached["tokens"]) > MAX_CACHED_TOKENS_PER_USER:
+        cached["tokens"].pop(next(iter(cached["tokens"])))
     return user
 
-async def get_current_active_user(current_user: dict):
+async def get_current_active_user(current_user: dict = Depends(get_current_user)):
     if not current_user.get("is_verified"):
         raise HTTPException(status_code=400, detail="User not verified")
     return current_user
 
-async def get_current_ops_user(current_user: dict):
+async def get_current_ops_user(current_user: dict = Depends(get_current_active_user)):
     if not current_user.get("is_ops_user"):
         raise HTTPException(status_code=403, detail="Operation not permitted")
     return current_user
\ No newline at end of file
@@ -0,0 +1,83 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+
+from fastapi import HTTPException, status
+from pymongo.errors import DuplicateKeyError
+
+from app.config import settings
+from app.models.blob import Blob
+from app.storage import get_storage
+from app.utils.uploads import StoredUpload, discard_upload
+
+logger = logging.getLogger(__name__)
+
+ACQUIRE_ATTEMPTS = 10
+
+
+def blob_key(content_hash: str) -> str:
+    # Two levels of fan-out keep every directory small (65,536 leaf directories)
+    return f"blobs/{content_hash[:2]}/{content_hash[2:4]}/{content_hash}"
+
+
+async def _acquire(blobs: Blob, stored: StoredUpload, key: str):
+    for attempt in range(ACQUIRE_ATTEMPTS):
+        try:
+            return await blobs.acquire(stored.sha256, stored.size, key)
+        except DuplicateKeyError:
+            # The collector is removing this blob (or a concurrent upsert won); retry shortly
+            await asyncio.sleep(0.05 * (attempt + 1))
+    raise HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Storage busy, please retry",
+        headers={"Retry-After": "1"},
+    )
+
+
+async def store_blob(blobs: Blob, stored: StoredUpload) -> str:
+    key = blob_key(stored.sha256)
+    try:
+        # Take the reference before touching storage so the collector cannot remove the blob under us
+        previous = await _acquire(blobs, stored, key)
+    except BaseException:
+        await discard_upload(stored)
+        raise
+
+    try:
+        if previous is not None and previous.get("state", "ready") == "ready":
+            await discard_upload(stored)
+        else:
+            # New blob, or another upload of the same content has not finished writing yet
+            await get_storage().put_file(key, stored.temp_path)
+            await blobs.mark_ready(stored.sha256)
+    except BaseException:
+        await discard_upload(stored)
+        await blobs.release(stored.sha256)
+        raise
+    return key
+
+
+async def collect_garbage(blobs: Blob) -> int:
+    released_before = datetime.utcnow() - timedelta(seconds=settings.blob_gc_grace_seconds)
+    storage = get_storage()
+    removed = 0
+    for blob in await blobs.get_unreferenced(released_before):
+        if not await blobs.claim_for_collection(blob["_id"], released_before):
+            continue
+        await storage.delete(blob_key(blob["_id"]))
+        await blobs.delete_collected(blob["_id"])
+        removed += 1
+    return removed
+
+
+async def run_blob_gc(blobs: Blob):
+    while True:
+        try:
+            removed = await collect_garbage(blobs)
+            if removed:
+                logger.info("Blob GC removed %d unreferenced blobs", removed)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Blob GC run failed")
+        await asyncio.sleep(settings.blob_gc_interval_seconds)
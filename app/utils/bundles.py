@@ -0,0 +1,74 @@
+import io
+import os
+import zipfile
+from dataclasses import dataclass
+from datetime import datetime
+from typing import AsyncIterator, Callable, List
+
+from app.utils.file_types import OOXML_MIME_TYPES
+
+
+@dataclass
+class BundleEntry:
+    filename: str
+    size: int
+    modified: datetime
+    read: Callable[[], AsyncIterator[bytes]]
+
+
+class _ChunkSink(io.RawIOBase):
+    # Write-only, non-seekable target: ZipFile then emits data descriptors instead of seeking
+    # back to patch local headers, which is what lets the archive be streamed as it is built
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _unique_names(entries: List[BundleEntry]) -> List[str]:
+    seen = set()
+    names = []
+    for entry in entries:
+        base, extension = os.path.splitext(os.path.basename(entry.filename) or "file")
+        name, counter = f"{base}{extension}", 1
+        while name in seen:
+            name = f"{base} ({counter}){extension}"
+            counter += 1
+        seen.add(name)
+        names.append(name)
+    return names
+
+
+async def stream_zip(entries: List[BundleEntry]) -> AsyncIterator[bytes]:
+    sink = _ChunkSink()
+    with zipfile.ZipFile(sink, "w", allowZip64=True) as archive:
+        for entry, name in zip(entries, _unique_names(entries)):
+            info = zipfile.ZipInfo(name, date_time=entry.modified.timetuple()[:6])
+            info.file_size = entry.size
+            # OOXML documents are already deflated ZIPs; compressing them again only burns CPU
+            extension = os.path.splitext(name)[1].lower()
+            info.compress_type = zipfile.ZIP_STORED if extension in OOXML_MIME_TYPES else zipfile.ZIP_DEFLATED
+            with archive.open(info, "w", force_zip64=entry.size >= zipfile.ZIP64_LIMIT) as member:
+                async for chunk in entry.read():
+                    member.write(chunk)
+                    data = sink.drain()
+                    if data:
+                        yield data
+            yield sink.drain()
+    # Closing the archive writes the central directory
+    yield sink.drain()
@@ -0,0 +1,104 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+from pymongo.errors import PyMongoError
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class TTLCache:
+    # LRU ordering with a per-entry deadline; only touched from the event loop, so no locking
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        value, expires_at = entry
+        if expires_at <= time.monotonic():
+            del self._data[key]
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        if self.maxsize <= 0:
+            return
+        self._data[key] = (value, time.monotonic() + (self.ttl if ttl is None else ttl))
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, key: Hashable):
+        if self._data.pop(key, None) is not None:
+            self.invalidations += 1
+
+    def invalidate_where(self, predicate: Callable[[Any], bool]):
+        for key in [key for key, (value, _) in self._data.items() if predicate(value)]:
+            self.invalidate(key)
+
+    def clear(self):
+        self._data.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+
+# Authenticated users keyed by email (the JWT subject); values are
+# {"user": <users document>, "tokens": {<jwt>: <exp timestamp>}}
+user_cache = TTLCache(
+    maxsize=settings.user_cache_max_size if settings.user_cache_enabled else 0,
+    ttl=settings.user_cache_ttl_seconds,
+)
+
+
+def invalidate_user(user_id: Any = None, email: Optional[str] = None):
+    if email is not None:
+        user_cache.invalidate(email)
+    if user_id is not None:
+        user_cache.invalidate_where(lambda entry: entry["user"]["_id"] == user_id)
+
+
+async def watch_user_changes(collection):
+    # Keeps caches in other workers coherent; requires a replica set or sharded cluster
+    delay = 1
+    while True:
+        try:
+            async with collection.watch() as stream:
+                delay = 1
+                async for change in stream:
+                    invalidate_user(user_id=change["documentKey"]["_id"])
+        except asyncio.CancelledError:
+            raise
+        except PyMongoError as exc:
+            logger.warning("User change stream failed (%s); retrying in %ss", exc, delay)
+            # Anything missed while disconnected may be stale, so start over clean
+            user_cache.clear()
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 60)
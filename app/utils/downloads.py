@@ -0,0 +1,316 @@
+import secrets
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import AsyncIterator, Callable, List, Optional, Tuple
+from urllib.parse import quote
+
+import anyio
+from fastapi import Request, Response, status
+from fastapi.responses import StreamingResponse
+
+# Requests asking for more ranges than this are served whole instead of as multipart
+MAX_RANGES = 16
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+RangeReader = Callable[[int, int], AsyncIterator[bytes]]
+
+
+def parse_range_header(header: Optional[str], size: int) -> Optional[List[Tuple[int, int]]]:
+    # Returns inclusive (start, end) pairs, [] when nothing is satisfiable, or None to ignore the header
+    if not header:
+        return None
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or not spec:
+        return None
+
+    ranges = []
+    for part in spec.split(","):
+        start_text, dash, end_text = part.strip().partition("-")
+        if not dash:
+            return None
+        try:
+            if start_text == "":
+                # Suffix range: the last N bytes
+                length = int(end_text)
+                if length <= 0:
+                    continue
+                start, end = max(size - length, 0), size - 1
+            else:
+                start = int(start_text)
+                end = int(end_text) if end_text else None
+                if end is not None and end < start:
+                    return None
+                if start >= size:
+                    continue
+                end = size - 1 if end is None else min(end, size - 1)
+        except ValueError:
+            return None
+        if start < 0 or size == 0:
+            continue
+        ranges.append((start, end))
+
+    if len(ranges) > MAX_RANGES:
+        return None
+
+    # Coalesce overlapping or adjacent ranges so clients cannot amplify the response
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def _http_date(value: datetime) -> str:
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return format_datetime(value, usegmt=True)
+
+
+def _parse_http_date(value: str) -> Optional[datetime]:
+    try:
+        parsed = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+
+def _etag_matches(header: str, etag: Optional[str], weak: bool) -> bool:
+    if etag is None:
+        return False
+    if header.strip() == "*":
+        return True
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if weak:
+            if candidate.removeprefix("W/") == etag.removeprefix("W/"):
+                return True
+        elif candidate == etag and not etag.startswith("W/"):
+            return True
+    return False
+
+
+def _not_modified(request: Request, etag: Optional[str], last_modified: Optional[datetime]) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        return _etag_matches(if_none_match, etag, weak=True)
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified is not None:
+        since = _parse_http_date(if_modified_since)
+        return since is not None and _truncate(last_modified) <= since
+    return False
+
+
+def _if_range_allows(request: Request, etag: Optional[str], last_modified: Optional[datetime]) -> bool:
+    if_range = request.headers.get("if-range")
+    if if_range is None:
+        return True
+    if_range = if_range.strip()
+    if if_range.startswith('"') or if_range.startswith("W/"):
+        return _etag_matches(if_range, etag, weak=False)
+    since = _parse_http_date(if_range)
+    return since is not None and last_modified is not None and _truncate(last_modified) == since
+
+
+def _truncate(value: datetime) -> datetime:
+    # HTTP dates have one-second resolution
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.replace(microsecond=0)
+
+
+def content_disposition(filename: str) -> str:
+    quoted = quote(filename)
+    if quoted != filename:
+        return f"attachment; filename*=utf-8''{quoted}"
+    return f'attachment; filename="{filename}"'
+
+
+def file_range_reader(path: str, chunk_size: int = DOWNLOAD_CHUNK_SIZE) -> RangeReader:
+    async def read_range(start: int, end: int):
+        async with await anyio.open_file(path, "rb") as f:
+            await f.seek(start)
+            remaining = end - start + 1
+            while remaining > 0:
+                chunk = await f.read(min(chunk_size, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+
+    return read_range
+
+
+class BufferStreamingResponse(StreamingResponse):
+    # Readers may yield memoryview slices of a cached buffer; StreamingResponse would try to
+    # .encode() anything that is not bytes, so bytes-like chunks are passed through as they are
+    async def stream_response(self, send):
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        async for chunk in self.body_iterator:
+            if isinstance(chunk, str):
+                chunk = chunk.encode(self.charset)
+            await send({"type": "http.response.body", "body": chunk, "more_body": True})
+        await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+
+def storage_range_reader(storage, key: str) -> RangeReader:
+    def read_range(start: int, end: int):
+        return storage.get_stream(key, start, end)
+
+    return read_range
+
+
+class SendfileResponse(Response):
+    # Hands the byte range to the server through the ASGI zero-copy send extension, so the
+    # kernel copies file pages straight to the socket. Servers without the extension get the
+    # usual chunked reads from read_range.
+    def __init__(
+        self,
+        path: str,
+        start: int,
+        end: int,
+        read_range: RangeReader,
+        status_code: int,
+        headers: dict,
+        media_type: str,
+    ):
+        super().__init__(status_code=status_code, headers=headers, media_type=media_type)
+        self.path = path
+        self.read_range = read_range
+        self.start = start
+        self.end = end
+
+    async def __call__(self, scope, receive, send):
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if "http.response.zerocopysend" in scope.get("extensions", {}):
+            f = await anyio.to_thread.run_sync(open, self.path, "rb")
+            try:
+                await send({
+                    "type": "http.response.zerocopysend",
+                    "file": f,
+                    "offset": self.start,
+                    "count": self.end - self.start + 1,
+                    "more_body": False,
+                })
+            finally:
+                f.close()
+            return
+        async for chunk in self.read_range(self.start, self.end):
+            await send({"type": "http.response.body", "body": chunk, "more_body": True})
+        await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+
+def _entity_headers(filename: str, etag: Optional[str], last_modified: Optional[datetime]) -> dict:
+    headers = {"Accept-Ranges": "bytes", "Content-Disposition": content_disposition(filename)}
+    if etag is not None:
+        headers["ETag"] = etag
+    if last_modified is not None:
+        headers["Last-Modified"] = _http_date(last_modified)
+    return headers
+
+
+def build_offload_response(
+    request: Request,
+    *,
+    header: str,
+    location: str,
+    media_type: str,
+    filename: str,
+    etag: Optional[str] = None,
+    last_modified: Optional[datetime] = None,
+) -> Response:
+    # X-Accel-Redirect / X-Sendfile: the front proxy streams the file (and handles Range) once
+    # the app has authorized the request; the app only answers conditional requests itself
+    headers = _entity_headers(filename, etag, last_modified)
+    if _not_modified(request, etag, last_modified):
+        headers.pop("Content-Disposition")
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    headers[header] = location
+    return Response(media_type=media_type, headers=headers)
+
+
+def build_download_response(
+    request: Request,
+    *,
+    size: int,
+    media_type: str,
+    filename: str,
+    read_range: RangeReader,
+    etag: Optional[str] = None,
+    last_modified: Optional[datetime] = None,
+    sendfile_path: Optional[str] = None,
+) -> Response:
+    headers = _entity_headers(filename, etag, last_modified)
+
+    if _not_modified(request, etag, last_modified):
+        headers.pop("Content-Disposition")
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    ranges = None
+    if _if_range_allows(request, etag, last_modified):
+        ranges = parse_range_header(request.headers.get("range"), size)
+
+    if ranges is None:
+        headers["Content-Length"] = str(size)
+        if sendfile_path is not None and size > 0:
+            return SendfileResponse(
+                sendfile_path, 0, size - 1, read_range, status.HTTP_200_OK, headers, media_type
+            )
+        return BufferStreamingResponse(read_range(0, size - 1), media_type=media_type, headers=headers)
+
+    if not ranges:
+        return Response(
+            status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+            headers={"Content-Range": f"bytes */{size}", "Accept-Ranges": "bytes"},
+        )
+
+    if len(ranges) == 1:
+        start, end = ranges[0]
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+        headers["Content-Length"] = str(end - start + 1)
+        if sendfile_path is not None:
+            return SendfileResponse(
+                sendfile_path, start, end, read_range, status.HTTP_206_PARTIAL_CONTENT, headers, media_type
+            )
+        return BufferStreamingResponse(
+            read_range(start, end),
+            status_code=status.HTTP_206_PARTIAL_CONTENT,
+            media_type=media_type,
+            headers=headers,
+        )
+
+    boundary = secrets.token_hex(16)
+    part_headers = [
+        (
+            f"--{boundary}\r\n"
+            f"Content-Type: {media_type}\r\n"
+            f"Content-Range: bytes {start}-{end}/{size}\r\n\r\n"
+        ).encode("latin-1")
+        for start, end in ranges
+    ]
+    trailer = f"--{boundary}--\r\n".encode("latin-1")
+    headers["Content-Length"] = str(
+        sum(len(part) + (end - start + 1) + 2 for part, (start, end) in zip(part_headers, ranges)) + len(trailer)
+    )
+
+    async def multipart_body():
+        for part, (start, end) in zip(part_headers, ranges):
+            yield part
+            async for chunk in read_range(start, end):
+                yield chunk
+            yield b"\r\n"
+        yield trailer
+
+    return BufferStreamingResponse(
+        multipart_body(),
+        status_code=status.HTTP_206_PARTIAL_CONTENT,
+        media_type=f"multipart/byteranges; boundary={boundary}",
+        headers=headers,
+    )
+
+
+def content_etag(content_hash: Optional[str]) -> Optional[str]:
+    return f'"{content_hash}"' if content_hash else None
@@ -1,18 +1,192 @@
+import asyncio
+import logging
+import random
 import smtplib
+import time
+from datetime import datetime, timedelta
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
+from typing import Optional
+
+from starlette.concurrency import run_in_threadpool
+
 from app.config import settings
+from app.models.email_outbox import EmailOutbox
+
+logger = logging.getLogger(__name__)
+
+_delivery_stats = {
+    "sent": 0,
+    "retried": 0,
+    "failed": 0,
+    "batches": 0,
+    "connections_opened": 0,
+    "last_error": None,
+    "last_batch_at": None,
+}
+
+def smtp_configured() -> bool:
+    return all([settings.smtp_server, settings.smtp_port, settings.smtp_username, settings.smtp_password])
+
+def build_message(message: dict) -> MIMEMultipart:
+    mime = MIMEMultipart("alternative")
+    mime["Subject"] = message["subject"]
+    mime["From"] = settings.from_email
+    mime["To"] = message["to"]
+    mime.attach(MIMEText(message["text"], "plain"))
+    if message.get("html"):
+        mime.attach(MIMEText(message["html"], "html"))
+    return mime
+
+class SMTPSender:
+    # Keeps one SMTP session open across batches instead of a TCP+TLS+AUTH handshake per email.
+    # Not thread-safe: the outbox worker is the only caller and never sends concurrently.
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        username: Optional[str] = None,
+        password: Optional[str] = None,
+        starttls: bool = True,
+        timeout: float = 30,
+    ):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.starttls = starttls
+        self.timeout = timeout
+        self._server: Optional[smtplib.SMTP] = None
+        self._last_used = 0.0
+
+    def _connect(self) -> smtplib.SMTP:
+        server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            if self.starttls:
+                server.starttls()
+            if self.username:
+                server.login(self.username, self.password)
+        except BaseException:
+            server.close()
+            raise
+        _delivery_stats["connections_opened"] += 1
+        return server
+
+    def _ensure_connected(self) -> smtplib.SMTP:
+        if self._server is not None:
+            try:
+                # Servers drop idle sessions; a NOOP is far cheaper than a failed send
+                if self._server.noop()[0] == 250:
+                    return self._server
+            except smtplib.SMTPException:
+                pass
+            self.close()
+        self._server = self._connect()
+        return self._server
+
+    def send(self, message: MIMEMultipart):
+        server = self._ensure_connected()
+        try:
+            server.send_message(message)
+        except smtplib.SMTPServerDisconnected:
+            # The session died between the NOOP and the send: reconnect once and retry
+            self.close()
+            self._ensure_connected().send_message(message)
+        self._last_used = time.monotonic()
+
+    def close_if_idle(self, idle_seconds: float):
+        if self._server is not None and time.monotonic() - self._last_used > idle_seconds:
+            self.close()
 
-async def send_verification_email(email_to: str, verification_url: str):
-    if not all([settings.smtp_server, settings.smtp_port, settings.smtp_username, settings.smtp_password]):
-        print(f"Email verification would be sent to {email_to} with URL: {verification_url}")
-        return
-    
-    message = MIMEMultipart("alternative")
-    message["Subject"] = "Verify your email"
-    message["From"] = settings.from_email
-    message["To"] = email_to
+    def close(self):
+        if self._server is not None:
+            try:
+                self._server.quit()
+            except smtplib.SMTPException:
+                self._server.close()
+            except OSError:
+                pass
+            self._server = None
 
+class LoggingSender:
+    # Used when SMTP is not configured, so development setups still see the verification links
+    def send(self, message: MIMEMultipart):
+        body = message.get_payload(0).get_payload()
+        print(f"Email to {message['To']} ({message['Subject']}):\n{body}")
+
+    def close_if_idle(self, idle_seconds: float):
+        pass
+
+    def close(self):
+        pass
+
+def create_sender():
+    if not smtp_configured():
+        return LoggingSender()
+    return SMTPSender(
+        settings.smtp_server,
+        settings.smtp_port,
+        settings.smtp_username,
+        settings.smtp_password,
+        starttls=settings.smtp_starttls,
+        timeout=settings.smtp_timeout_seconds,
+    )
+
+def retry_delay(attempts: int) -> float:
+    # Exponential backoff with jitter so a recovering SMTP server is not hit by every message at once
+    delay = min(settings.email_retry_base_seconds * 2 ** (attempts - 1), settings.email_retry_max_seconds)
+    return delay * random.uniform(0.5, 1.0)
+
+def _is_permanent(exc: Exception) -> bool:
+    if isinstance(exc, smtplib.SMTPRecipientsRefused):
+        return True
+    return isinstance(exc, smtplib.SMTPResponseException) and 500 <= exc.smtp_code < 600
+
+async def send_batch(outbox: EmailOutbox, sender, batch: list):
+    sent_ids = []
+    for message in batch:
+        try:
+            await run_in_threadpool(sender.send, build_message(message))
+        except Exception as exc:
+            error = f"{type(exc).__name__}: {exc}"
+            _delivery_stats["last_error"] = error
+            if _is_permanent(exc) or message["attempts"] >= settings.email_max_attempts:
+                _delivery_stats["failed"] += 1
+                logger.warning("Giving up on email %s to %s: %s", message["_id"], message["to"], error)
+                await outbox.mark_failed(message["_id"], error, None)
+            else:
+                _delivery_stats["retried"] += 1
+                retry_at = datetime.utcnow() + timedelta(seconds=retry_delay(message["attempts"]))
+                await outbox.mark_failed(message["_id"], error, retry_at)
+            continue
+        sent_ids.append(message["_id"])
+    await outbox.mark_sent(sent_ids)
+    _delivery_stats["sent"] += len(sent_ids)
+    _delivery_stats["batches"] += 1
+    _delivery_stats["last_batch_at"] = datetime.utcnow()
+
+async def run_email_outbox(outbox: EmailOutbox, sender=None):
+    sender = sender or create_sender()
+    try:
+        while True:
+            try:
+                batch = await outbox.claim_batch(settings.email_batch_size, settings.email_lease_seconds)
+                if batch:
+                    await send_batch(outbox, sender, batch)
+                    continue
+                await run_in_threadpool(sender.close_if_idle, settings.smtp_idle_timeout_seconds)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Email outbox run failed")
+            await asyncio.sleep(settings.email_poll_interval_seconds)
+    finally:
+        sender.close()
+
+def get_email_delivery_stats() -> dict:
+    return dict(_delivery_stats, smtp_configured=smtp_configured())
+
+async def send_verification_email(outbox: EmailOutbox, email_to: str, verification_url: str):
     text = f"""\
     Hi,
     Please verify your email by clicking the link below:
@@ -28,13 +202,5 @@ async def send_verification_email(email_to: str, verification_url: str):
       </body>
     </html>
     """
-
-    part1 = MIMEText(text, "plain")
-    part2 = MIMEText(html, "html")
-    message.attach(part1)
-    message.attach(part2)
-
-    with smtplib.SMTP(settings.smtp_server, settings.smtp_port) as server:
-        server.starttls()
-        server.login(settings.smtp_username, settings.smtp_password)
-        server.send_message(message)
\ No newline at end of file
+    # Only queued here; the outbox worker delivers it so signup never waits on SMTP
+    await outbox.enqueue(email_to, "Verify your email", text, html)
@@ -0,0 +1,86 @@
+import os
+import threading
+import zipfile
+from functools import lru_cache
+from typing import Optional
+from xml.etree import ElementTree
+
+from fastapi import HTTPException, status
+from starlette.concurrency import run_in_threadpool
+
+OOXML_MIME_TYPES = {
+    ".pptx": "application/vnd.openxmlformats-officedocument.presentationml.presentation",
+    ".docx": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+    ".xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+# Content type of the main part declared in [Content_Types].xml for each document type
+_MAIN_PART_TYPES = {f"{mime}.main+xml": mime for mime in OOXML_MIME_TYPES.values()}
+
+ZIP_LOCAL_HEADER = b"PK\x03\x04"
+CONTENT_TYPES_ENTRY = "[Content_Types].xml"
+# Real-world [Content_Types].xml is a few KB; anything far larger is not a document we accept
+MAX_CONTENT_TYPES_SIZE = 1024 * 1024
+
+_magic_lock = threading.Lock()
+
+
+def _invalid_content_type():
+    return HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail="Invalid file content type",
+    )
+
+
+def check_zip_signature(first_chunk: bytes):
+    if not first_chunk.startswith(ZIP_LOCAL_HEADER):
+        raise _invalid_content_type()
+
+
+def detect_ooxml_type(path: str) -> Optional[str]:
+    # ZipFile only reads the end-of-central-directory record and the central directory,
+    # then seeks straight to the one entry we need
+    try:
+        with zipfile.ZipFile(path) as archive:
+            info = archive.getinfo(CONTENT_TYPES_ENTRY)
+            if info.file_size > MAX_CONTENT_TYPES_SIZE:
+                return None
+            content_types = archive.read(info)
+        root = ElementTree.fromstring(content_types)
+    except (zipfile.BadZipFile, KeyError, OSError, ElementTree.ParseError):
+        return None
+
+    for element in root:
+        if element.tag.endswith("Override"):
+            mime = _MAIN_PART_TYPES.get(element.get("ContentType"))
+            if mime:
+                return mime
+    return None
+
+
+@lru_cache(maxsize=1)
+def _get_magic():
+    import magic
+
+    return magic.Magic(mime=True)
+
+
+def detect_with_libmagic(path: str) -> str:
+    # libmagic handles are not thread-safe; the shared one is serialized
+    with _magic_lock:
+        return _get_magic().from_file(path)
+
+
+def detect_mime_type(path: str, filename: str) -> Optional[str]:
+    extension = os.path.splitext(filename)[1].lower()
+    if extension in OOXML_MIME_TYPES:
+        return detect_ooxml_type(path)
+    return detect_with_libmagic(path)
+
+
+async def validate_file_type(path: str, filename: str) -> str:
+    extension = os.path.splitext(filename)[1].lower()
+    detected_type = await run_in_threadpool(detect_mime_type, path, filename)
+    if detected_type is None or detected_type != OOXML_MIME_TYPES.get(extension):
+        raise _invalid_content_type()
+    return detected_type
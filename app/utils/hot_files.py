@@ -0,0 +1,189 @@
+import asyncio
+import logging
+import mmap
+import os
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from starlette.concurrency import run_in_threadpool
+
+from app.config import settings
+from app.storage import get_storage
+from app.storage.local import LocalStorageBackend
+from app.utils.downloads import DOWNLOAD_CHUNK_SIZE, RangeReader
+from app.utils.metrics import HOT_FILE_BYTES, HOT_FILE_BYTES_SAVED, HOT_FILE_LOOKUPS
+
+logger = logging.getLogger(__name__)
+
+Key = Tuple[str, Optional[str]]
+
+
+def _map_file(path: str) -> mmap.mmap:
+    with open(path, "rb") as f:
+        # The mapping stays valid after the descriptor is closed (and after an unlink)
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def _read_file(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+class HotFileCache:
+    # Byte-bounded LRU with frequency-gated admission: a file is only cached once it has been
+    # requested min_hits times among recently seen files, so one-off downloads never push
+    # genuinely hot documents out. Only touched from the event loop, so no locking.
+    def __init__(self, max_bytes: int, max_file_size: int, min_hits: int, backend: str = "memory"):
+        self.max_bytes = max_bytes
+        self.max_file_size = max_file_size
+        self.min_hits = min_hits
+        self.backend = backend
+        self._entries = OrderedDict()
+        self._frequency = OrderedDict()
+        self._loading = {}
+        self._tasks = set()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+        self.evictions = 0
+
+    def _key(self, file: dict) -> Key:
+        return str(file["_id"]), file.get("content_hash")
+
+    def get_reader(self, file: dict) -> Optional[RangeReader]:
+        if self.max_bytes <= 0:
+            return None
+        key = self._key(file)
+        buffer = self._entries.get(key)
+        if buffer is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            HOT_FILE_LOOKUPS.labels(result="hit").inc()
+            return self._buffer_reader(buffer)
+
+        self.misses += 1
+        HOT_FILE_LOOKUPS.labels(result="miss").inc()
+        if file["file_size"] <= self.max_file_size and self._record_access(key) >= self.min_hits:
+            self._schedule_load(key, file)
+        return None
+
+    def _record_access(self, key: Key) -> int:
+        count = self._frequency.pop(key, 0) + 1
+        self._frequency[key] = count
+        # Remember a bounded number of candidates; the least recently requested are forgotten
+        while len(self._frequency) > 10000:
+            self._frequency.popitem(last=False)
+        return count
+
+    def _buffer_reader(self, buffer) -> RangeReader:
+        # Every response slices a view of the same shared buffer; nothing is copied or read from disk
+        view = memoryview(buffer)
+
+        async def read_range(start: int, end: int):
+            position = start
+            while position <= end:
+                chunk = view[position:min(position + DOWNLOAD_CHUNK_SIZE, end + 1)]
+                position += len(chunk)
+                self.bytes_saved += len(chunk)
+                HOT_FILE_BYTES_SAVED.inc(len(chunk))
+                yield chunk
+
+        return read_range
+
+    def _schedule_load(self, key: Key, file: dict):
+        if key in self._loading:
+            return
+        # The token is dropped by invalidate(), so a load that outlives a delete is discarded
+        token = self._loading[key] = object()
+        # Loaded in the background: the request that tipped the file over streams as usual
+        task = asyncio.create_task(self._load(key, file, token))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _load(self, key: Key, file: dict, token: object):
+        try:
+            buffer = await self._read(file)
+            if buffer is not None and len(buffer) == file["file_size"] and self._loading.get(key) is token:
+                self._insert(key, buffer)
+        except Exception:
+            logger.exception("Could not load %s into the hot file cache", key[0])
+        finally:
+            if self._loading.get(key) is token:
+                del self._loading[key]
+
+    async def _read(self, file: dict):
+        path = None
+        if file.get("storage_key"):
+            storage = get_storage()
+            if isinstance(storage, LocalStorageBackend):
+                path = storage.path(file["storage_key"])
+            else:
+                chunks = [chunk async for chunk in storage.get_stream(file["storage_key"])]
+                return b"".join(chunks)
+        elif file.get("file_path") and os.path.exists(file["file_path"]):
+            path = file["file_path"]
+        if path is None:
+            return None
+        if self.backend == "mmap" and file["file_size"] > 0:
+            return await run_in_threadpool(_map_file, path)
+        return await run_in_threadpool(_read_file, path)
+
+    def _insert(self, key: Key, buffer):
+        self.invalidate(key)
+        self._entries[key] = buffer
+        self.size += len(buffer)
+        self._frequency.pop(key, None)
+        while self.size > self.max_bytes and self._entries:
+            # Evicted mmaps are not closed here: responses still streaming from them keep a
+            # reference, and the mapping is released when the last one finishes
+            _, evicted = self._entries.popitem(last=False)
+            self.size -= len(evicted)
+            self.evictions += 1
+        HOT_FILE_BYTES.set(self.size)
+
+    def invalidate(self, key: Key):
+        buffer = self._entries.pop(key, None)
+        if buffer is not None:
+            self.size -= len(buffer)
+            HOT_FILE_BYTES.set(self.size)
+
+    def invalidate_file(self, file_id):
+        file_id = str(file_id)
+        for key in [key for key in self._entries if key[0] == file_id]:
+            self.invalidate(key)
+        for key in [key for key in self._frequency if key[0] == file_id]:
+            del self._frequency[key]
+        for key in [key for key in self._loading if key[0] == file_id]:
+            del self._loading[key]
+
+    def clear(self):
+        self._entries.clear()
+        self._frequency.clear()
+        self._loading.clear()
+        self.size = 0
+        HOT_FILE_BYTES.set(0)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "backend": self.backend,
+            "files": len(self._entries),
+            "bytes": self.size,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "bytes_saved": self.bytes_saved,
+            "evictions": self.evictions,
+        }
+
+
+# Per worker process; entries for deleted files in other workers are never served (downloads
+# look the file up first) and simply age out
+hot_file_cache = HotFileCache(
+    max_bytes=settings.hot_file_cache_max_bytes if settings.hot_file_cache_enabled else 0,
+    max_file_size=settings.hot_file_cache_max_file_size,
+    min_hits=settings.hot_file_cache_min_hits,
+    backend=settings.hot_file_cache_backend,
+)
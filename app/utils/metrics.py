@@ -0,0 +1,154 @@
+import time
+
+from prometheus_client import REGISTRY, Counter, Gauge, Histogram
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from starlette.routing import Match
+
+from app.utils.downloads import RangeReader
+
+# Downloads and uploads stream for a long time, so the buckets reach well past typical API latencies
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "Time from request start until the response body is complete",
+    ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+STAGE_LATENCY = Histogram(
+    "app_stage_duration_seconds",
+    "Time spent in individual stages of the hot paths",
+    ["stage"],
+    buckets=LATENCY_BUCKETS,
+)
+DOWNLOAD_BYTES = Counter("app_download_bytes_total", "File bytes streamed to clients")
+UPLOADS_IN_FLIGHT = Gauge("app_uploads_in_flight", "Uploads currently being received or stored")
+HOT_FILE_LOOKUPS = Counter("hot_file_cache_lookups_total", "Hot file cache lookups on download", ["result"])
+HOT_FILE_BYTES_SAVED = Counter("hot_file_cache_bytes_saved_total", "Download bytes served from the hot file cache")
+HOT_FILE_BYTES = Gauge("hot_file_cache_bytes", "Bytes held in the hot file cache")
+RATE_LIMITED = Counter("rate_limited_requests_total", "Requests rejected by the rate limiter", ["route", "key"])
+EVENT_LOOP_LAG = Histogram(
+    "event_loop_lag_seconds",
+    "How late the event loop ran a timer that was due",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+)
+EVENT_LOOP_STALLS = Counter("event_loop_stalls_total", "Times the event loop was blocked past the threshold")
+
+
+def time_stage(stage: str):
+    # Usable as a context manager or decorator
+    return STAGE_LATENCY.labels(stage=stage).time()
+
+
+def counted_reader(read_range: RangeReader) -> RangeReader:
+    async def read(start: int, end: int):
+        async for chunk in read_range(start, end):
+            DOWNLOAD_BYTES.inc(len(chunk))
+            yield chunk
+
+    return read
+
+
+def route_template(scope) -> str:
+    # Label by path template, not the concrete path, to keep label cardinality bounded
+    app = scope.get("app")
+    for route in getattr(app, "routes", ()):
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return getattr(route, "path", "unmatched")
+    return "unmatched"
+
+
+class MetricsMiddleware:
+    # Plain ASGI rather than BaseHTTPMiddleware, which would buffer streamed responses
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            REQUEST_LATENCY.labels(
+                method=scope["method"],
+                route=route_template(scope),
+                status=str(status_code),
+            ).observe(time.perf_counter() - started)
+
+
+class AppStatsCollector:
+    # Exposes the counters the admin endpoints already keep, read at scrape time
+    def describe(self):
+        # Without describe() the registry calls collect() on registration, while the
+        # modules it reads from may still be importing
+        return []
+
+    def collect(self):
+        from app.db import get_pool_stats
+        from app.utils.admission import upload_admission
+        from app.utils.auth import get_password_hash_stats
+        from app.utils.cache import user_cache
+        from app.utils.email import get_email_delivery_stats
+
+        pool = get_pool_stats()
+        checked_out = GaugeMetricFamily("mongodb_pool_checked_out", "Connections in use", labels=["server"])
+        open_connections = GaugeMetricFamily("mongodb_pool_open", "Open connections", labels=["server"])
+        waiting = GaugeMetricFamily("mongodb_pool_waiting", "Operations waiting for a connection", labels=["server"])
+        for server, stats in pool["servers"].items():
+            checked_out.add_metric([server], stats["checked_out"])
+            open_connections.add_metric([server], stats["open"])
+            waiting.add_metric([server], stats["waiting"])
+        yield checked_out
+        yield open_connections
+        yield waiting
+        yield GaugeMetricFamily("mongodb_pool_max_size", "Configured maxPoolSize", value=pool["max_pool_size"])
+
+        hashing = get_password_hash_stats()
+        yield GaugeMetricFamily("password_hash_in_flight", "bcrypt jobs queued or running", value=hashing["in_flight"])
+        yield CounterMetricFamily("password_hash_rejected", "bcrypt jobs shed with 503", value=hashing["rejected"])
+
+        cache = user_cache.stats()
+        yield GaugeMetricFamily("user_cache_size", "Cached users", value=cache["size"])
+        yield CounterMetricFamily("user_cache_hits", "User cache hits", value=cache["hits"])
+        yield CounterMetricFamily("user_cache_misses", "User cache misses", value=cache["misses"])
+
+        email = get_email_delivery_stats()
+        delivered = CounterMetricFamily("email_delivery", "Outbox delivery outcomes", labels=["outcome"])
+        for outcome in ("sent", "retried", "failed"):
+            delivered.add_metric([outcome], email[outcome])
+        yield delivered
+
+        uploads = upload_admission.stats()
+        yield GaugeMetricFamily("upload_admitted", "Uploads holding an admission slot", value=uploads["active"])
+        yield GaugeMetricFamily(
+            "upload_in_flight_bytes", "Declared bytes of admitted uploads", value=uploads["in_flight_bytes"]
+        )
+        utilization = GaugeMetricFamily(
+            "upload_admission_utilization", "Share of the upload capacity in use", labels=["resource"]
+        )
+        for resource, value in uploads["utilization"].items():
+            utilization.add_metric([resource], value)
+        yield utilization
+        if uploads["disk_free_bytes"] is not None:
+            yield GaugeMetricFamily(
+                "upload_disk_free_bytes", "Free space on the upload volume", value=uploads["disk_free_bytes"]
+            )
+        rejected = CounterMetricFamily("upload_rejected", "Uploads turned away by admission control", labels=["reason"])
+        for reason, count in uploads["rejected"].items():
+            rejected.add_metric([reason], count)
+        yield rejected
+
+
+REGISTRY.register(AppStatsCollector())
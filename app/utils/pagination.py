@@ -0,0 +1,29 @@
+import base64
+import json
+from datetime import datetime, timedelta
+from typing import Tuple
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from fastapi import HTTPException, status
+
+EPOCH = datetime(1970, 1, 1)
+
+
+def encode_cursor(document: dict) -> str:
+    # MongoDB stores datetimes with millisecond precision, so milliseconds round-trip exactly
+    created_at_ms = (document["created_at"] - EPOCH) // timedelta(milliseconds=1)
+    payload = json.dumps([created_at_ms, str(document["_id"])], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).rstrip(b"=").decode("ascii")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, ObjectId]:
+    try:
+        payload = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at_ms, last_id = json.loads(payload)
+        return EPOCH + timedelta(milliseconds=int(created_at_ms)), ObjectId(last_id)
+    except (ValueError, TypeError, InvalidId):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid pagination cursor",
+        )
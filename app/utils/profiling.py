@@ -0,0 +1,95 @@
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import Counter
+
+from app.config import settings
+from app.utils.metrics import EVENT_LOOP_LAG, EVENT_LOOP_STALLS
+
+logger = logging.getLogger(__name__)
+
+_profile_lock = threading.Lock()
+
+
+class ProfilerBusyError(RuntimeError):
+    pass
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}"
+
+
+def _collapse(frame) -> list:
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    labels.reverse()
+    return labels
+
+
+def sample_stacks(duration: float, interval: float) -> str:
+    # Samples every thread's Python stack from a side thread: no tracing hooks, so the
+    # overhead is one sys._current_frames() call per interval. Output is the collapsed
+    # format read by flamegraph.pl and speedscope: "thread;frame;frame count".
+    if not _profile_lock.acquire(blocking=False):
+        raise ProfilerBusyError("A profile is already running")
+    try:
+        own_thread = threading.get_ident()
+        counts = Counter()
+        deadline = time.monotonic() + duration
+        while time.monotonic() < deadline:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_thread:
+                    continue
+                stack = [names.get(thread_id, str(thread_id))] + _collapse(frame)
+                counts[";".join(stack)] += 1
+            time.sleep(interval)
+        return "\n".join(f"{stack} {count}" for stack, count in counts.most_common()) + "\n"
+    finally:
+        _profile_lock.release()
+
+
+async def monitor_event_loop():
+    # A heartbeat coroutine stamps the time every interval; a watchdog thread notices when the
+    # stamp goes stale (something is blocking the loop) and logs what the loop thread is running
+    interval = settings.loop_lag_check_interval_ms / 1000
+    threshold = settings.loop_lag_threshold_ms / 1000
+    loop_thread = threading.get_ident()
+    last_beat = time.monotonic()
+    stopped = threading.Event()
+
+    def watchdog():
+        reported = None
+        while not stopped.wait(interval):
+            beat = last_beat
+            if time.monotonic() - beat < threshold or reported == beat:
+                continue
+            # Report each stall once, while it is still happening
+            reported = beat
+            EVENT_LOOP_STALLS.inc()
+            frame = sys._current_frames().get(loop_thread)
+            stack = "".join(traceback.format_stack(frame)) if frame is not None else "<unavailable>"
+            logger.warning(
+                "Event loop blocked for more than %.0f ms; loop thread stack:\n%s",
+                threshold * 1000,
+                stack,
+            )
+
+    thread = threading.Thread(target=watchdog, name="event-loop-watchdog", daemon=True)
+    thread.start()
+    try:
+        while True:
+            last_beat = time.monotonic()
+            await asyncio.sleep(interval)
+            # How late the loop woke us up is the lag every other coroutine saw too
+            EVENT_LOOP_LAG.observe(max(time.monotonic() - last_beat - interval, 0))
+    finally:
+        stopped.set()
+        thread.join(timeout=1)
@@ -0,0 +1,270 @@
+import ipaddress
+import json
+import logging
+import math
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs
+
+from starlette.datastructures import Headers
+
+from app.config import settings
+from app.db import get_rate_limit_model
+from app.utils.auth import bearer_subject
+from app.utils.metrics import RATE_LIMITED, route_template
+
+logger = logging.getLogger(__name__)
+
+PERIODS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+# Login forms are tiny; anything larger is not read for the account name
+MAX_FORM_BYTES = 16 * 1024
+
+
+def parse_rate(spec: str) -> Tuple[int, float]:
+    # "10/minute" -> a bucket of 10 tokens refilled over 60 seconds
+    count, _, period = spec.partition("/")
+    try:
+        capacity = int(count)
+        seconds = PERIODS[period.strip().lower()]
+    except (KeyError, ValueError):
+        raise ValueError(f"Invalid rate limit {spec!r}, expected e.g. '10/minute'")
+    return capacity, float(seconds)
+
+
+class MemoryBucketStore:
+    # Per worker process, so the effective limit is multiplied by the number of workers
+    def __init__(self, max_keys: int = 100000):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+
+    async def take(self, key: str, capacity: int, period: float) -> float:
+        now = time.monotonic()
+        rate = capacity / period
+        tokens, updated_at = self._buckets.pop(key, (capacity, now))
+        tokens = min(capacity, tokens + (now - updated_at) * rate)
+        retry_after = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            retry_after = (1 - tokens) / rate
+        self._buckets[key] = (tokens, now)
+        # Least recently used buckets go first; a forgotten bucket simply starts full again
+        while len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return retry_after
+
+    async def close(self):
+        self._buckets.clear()
+
+
+class MongoBucketStore:
+    def __init__(self, model=None):
+        self.model = model
+
+    async def take(self, key: str, capacity: int, period: float) -> float:
+        if self.model is None:
+            self.model = await get_rate_limit_model()
+        return await self.model.take(key, capacity, period)
+
+    async def close(self):
+        pass
+
+
+# Same bucket as MemoryBucketStore, evaluated atomically inside Redis with the server's clock
+TAKE_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated_at')
+local tokens = tonumber(state[1]) or capacity
+local updated_at = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated_at) * rate)
+local retry_after = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    retry_after = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated_at', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / rate * 1000))
+return tostring(retry_after)
+"""
+
+
+class RedisBucketStore:
+    # Any client with redis.asyncio's interface works, including fakeredis for local runs
+    def __init__(self, client):
+        self.client = client
+        self._take = client.register_script(TAKE_SCRIPT)
+
+    @classmethod
+    def from_url(cls, url: str) -> "RedisBucketStore":
+        try:
+            import redis.asyncio as redis
+        except ImportError:
+            raise RuntimeError("RATE_LIMIT_BACKEND=redis requires the redis package")
+        return cls(redis.from_url(url))
+
+    async def take(self, key: str, capacity: int, period: float) -> float:
+        retry_after = await self._take(keys=[f"ratelimit:{key}"], args=[capacity, capacity / period])
+        return float(retry_after)
+
+    async def close(self):
+        await self.client.close()
+
+
+_store = None
+
+
+def get_rate_limit_store():
+    global _store
+    if _store is None:
+        if settings.rate_limit_backend == "mongodb":
+            _store = MongoBucketStore()
+        elif settings.rate_limit_backend == "redis":
+            if not settings.rate_limit_redis_url:
+                raise RuntimeError("RATE_LIMIT_BACKEND=redis requires RATE_LIMIT_REDIS_URL")
+            _store = RedisBucketStore.from_url(settings.rate_limit_redis_url)
+        elif settings.rate_limit_backend == "memory":
+            _store = MemoryBucketStore()
+        else:
+            raise RuntimeError(f"Unknown rate limit backend {settings.rate_limit_backend!r}")
+    return _store
+
+
+async def close_rate_limit_store():
+    global _store
+    if _store is not None:
+        await _store.close()
+        _store = None
+
+
+def _parse_networks(proxies: List[str]) -> list:
+    return [ipaddress.ip_network(proxy, strict=False) for proxy in proxies]
+
+
+def _is_trusted(address: str, networks) -> bool:
+    try:
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(ip in network for network in networks)
+
+
+def client_ip(scope, trusted_proxies) -> Optional[str]:
+    # Behind a reverse proxy every request arrives from the proxy's address. Forwarding headers
+    # are only believed when the peer is a configured proxy, and X-Forwarded-For is read from
+    # the right, skipping our own proxies, so a client cannot choose its own bucket.
+    peer = scope["client"][0] if scope.get("client") else None
+    if peer is None or not _is_trusted(peer, trusted_proxies):
+        return peer
+    headers = Headers(scope=scope)
+    forwarded = [hop.strip() for hop in headers.get("x-forwarded-for", "").split(",") if hop.strip()]
+    for hop in reversed(forwarded):
+        if not _is_trusted(hop, trusted_proxies):
+            return hop
+    if forwarded:
+        return forwarded[0]
+    return headers.get("x-real-ip", "").strip() or peer
+
+
+def _parse_limits(limits: Dict[str, str]) -> Dict[str, Tuple[int, float]]:
+    return {route: parse_rate(spec) for route, spec in limits.items()}
+
+
+class RateLimitMiddleware:
+    # Token buckets per client IP and per account, checked before routing so a throttled
+    # request never reaches bcrypt or MongoDB. Routes are keyed "METHOD /path/template".
+    def __init__(
+        self,
+        app,
+        store=None,
+        per_ip: Optional[Dict[str, str]] = None,
+        per_account: Optional[Dict[str, str]] = None,
+        trusted_proxies: Optional[List[str]] = None,
+    ):
+        self.app = app
+        self.store = store
+        self.trusted_proxies = _parse_networks(
+            settings.rate_limit_trusted_proxies if trusted_proxies is None else trusted_proxies
+        )
+        self.per_ip = _parse_limits(settings.rate_limits_per_ip if per_ip is None else per_ip)
+        self.per_account = _parse_limits(settings.rate_limits_per_account if per_account is None else per_account)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not settings.rate_limit_enabled:
+            await self.app(scope, receive, send)
+            return
+
+        route = f"{scope['method']} {route_template(scope)}"
+        ip_limit = self.per_ip.get(route)
+        account_limit = self.per_account.get(route)
+        if ip_limit is None and account_limit is None:
+            await self.app(scope, receive, send)
+            return
+
+        checks = []
+        address = client_ip(scope, self.trusted_proxies) if ip_limit is not None else None
+        if address:
+            checks.append(("ip", address, ip_limit))
+        if account_limit is not None:
+            account, receive = await self._account(scope, receive)
+            if account:
+                checks.append(("account", account, account_limit))
+
+        for kind, identity, (capacity, period) in checks:
+            retry_after = await self._take(f"{kind}:{route}:{identity}", capacity, period)
+            if retry_after > 0:
+                RATE_LIMITED.labels(route=route, key=kind).inc()
+                await self._reject(send, retry_after)
+                return
+        await self.app(scope, receive, send)
+
+    async def _take(self, key: str, capacity: int, period: float) -> float:
+        try:
+            return await (self.store or get_rate_limit_store()).take(key, capacity, period)
+        except Exception:
+            # A shared store being down should not take logins down with it
+            logger.exception("Rate limit check failed; letting the request through")
+            return 0.0
+
+    async def _account(self, scope, receive):
+        headers = Headers(scope=scope)
+        subject = bearer_subject(headers.get("authorization"))
+        if subject:
+            return subject.lower(), receive
+        # The login form names the account in its body, which is read here and replayed
+        if not headers.get("content-type", "").startswith("application/x-www-form-urlencoded"):
+            return None, receive
+        messages, body = [], b""
+        while True:
+            message = await receive()
+            messages.append(message)
+            if message["type"] != "http.request":
+                break
+            body += message.get("body", b"")
+            if not message.get("more_body", False) or len(body) > MAX_FORM_BYTES:
+                break
+
+        async def replay():
+            return messages.pop(0) if messages else await receive()
+
+        if len(body) > MAX_FORM_BYTES:
+            return None, replay
+        username = parse_qs(body.decode("latin-1")).get("username", [""])[0].strip().lower()
+        return username or None, replay
+
+    async def _reject(self, send, retry_after: float):
+        body = json.dumps({"detail": "Too many requests, try again later"}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 429,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(max(1, math.ceil(retry_after))).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
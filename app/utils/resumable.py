@@ -0,0 +1,195 @@
+import asyncio
+import base64
+import binascii
+import hashlib
+import logging
+import glob
+import os
+import secrets
+from typing import AsyncIterator, List, Optional, Tuple
+
+from fastapi import HTTPException, status
+from starlette.concurrency import run_in_threadpool
+
+from app.config import settings
+from app.models.upload_session import UploadSession
+
+logger = logging.getLogger(__name__)
+
+# tus reserves 460 for a chunk whose Upload-Checksum does not match its body
+HTTP_460_CHECKSUM_MISMATCH = 460
+HASH_READ_SIZE = 1024 * 1024
+
+
+def staging_dir() -> str:
+    # Inside upload_dir so the finished file can be renamed into local storage without a copy
+    return os.path.join(settings.upload_dir, ".resumable")
+
+
+def staging_path(session_id) -> str:
+    return os.path.join(staging_dir(), f"{session_id}.part")
+
+
+def _create_sparse_file(path: str, size: int):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        # Sparse on most filesystems: disk is only used as chunks arrive
+        f.truncate(size)
+
+
+async def create_staging_file(path: str, size: int):
+    await run_in_threadpool(_create_sparse_file, path, size)
+
+
+def _remove_quietly(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+async def remove_staging_file(path: str):
+    await run_in_threadpool(_remove_quietly, path)
+
+
+def parse_checksum_header(header: Optional[str]) -> Optional[bytes]:
+    # tus checksum extension: "<algorithm> <base64 digest>"
+    if header is None:
+        return None
+    algorithm, _, encoded = header.strip().partition(" ")
+    if algorithm.lower() != "sha256":
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Only sha256 checksums are supported",
+        )
+    try:
+        return base64.b64decode(encoded, validate=True)
+    except (binascii.Error, ValueError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Malformed Upload-Checksum header",
+        )
+
+
+def scratch_path(session_id) -> str:
+    # One per PATCH request, so parallel chunks of the same upload never share a buffer
+    return os.path.join(staging_dir(), f"{session_id}.{secrets.token_hex(8)}.chunk")
+
+
+def _open_scratch(path: str):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    return open(path, "wb")
+
+
+async def receive_chunk(path: str, body: AsyncIterator[bytes], max_length: int) -> Tuple[int, bytes]:
+    # The chunk is buffered in a scratch file first: only once its checksum has been verified
+    # is it copied into the staging file, so a corrupt retry never overwrites good bytes
+    out = await run_in_threadpool(_open_scratch, path)
+    digest = hashlib.sha256()
+    length = 0
+    try:
+        async for piece in body:
+            if not piece:
+                continue
+            if length + len(piece) > max_length:
+                raise HTTPException(
+                    status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                    detail="Chunk extends past the declared upload length or chunk size limit",
+                )
+            digest.update(piece)
+            await run_in_threadpool(out.write, piece)
+            length += len(piece)
+    finally:
+        await run_in_threadpool(out.close)
+    return length, digest.digest()
+
+
+def _copy_chunk(scratch: str, path: str, offset: int):
+    # pwrite at absolute positions, so chunks copied in parallel never share a file position
+    fd = os.open(path, os.O_WRONLY)
+    try:
+        with open(scratch, "rb") as f:
+            while True:
+                block = f.read(HASH_READ_SIZE)
+                if not block:
+                    break
+                os.pwrite(fd, block, offset)
+                offset += len(block)
+    finally:
+        os.close(fd)
+
+
+async def copy_chunk(scratch: str, path: str, offset: int):
+    await run_in_threadpool(_copy_chunk, scratch, path, offset)
+
+
+def _hash_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while True:
+            block = f.read(HASH_READ_SIZE)
+            if not block:
+                break
+            digest.update(block)
+    return digest.hexdigest()
+
+
+async def hash_file(path: str) -> str:
+    # Streams the assembled file once; memory use stays at one read buffer
+    return await run_in_threadpool(_hash_file, path)
+
+
+def merge_ranges(chunks: List[dict]) -> List[Tuple[int, int]]:
+    # Half-open [start, end) ranges; re-sent or overlapping chunks collapse together
+    merged = []
+    for start, end in sorted((chunk["offset"], chunk["offset"] + chunk["length"]) for chunk in chunks):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def contiguous_offset(ranges: List[Tuple[int, int]]) -> int:
+    return ranges[0][1] if ranges and ranges[0][0] == 0 else 0
+
+
+def missing_ranges(ranges: List[Tuple[int, int]], size: int) -> List[Tuple[int, int]]:
+    missing = []
+    position = 0
+    for start, end in ranges:
+        if start > position:
+            missing.append((position, start))
+        position = max(position, end)
+    if position < size:
+        missing.append((position, size))
+    return missing
+
+
+def format_ranges(ranges: List[Tuple[int, int]]) -> str:
+    # Inclusive byte positions, as in HTTP Range headers
+    return ",".join(f"{start}-{end - 1}" for start, end in ranges)
+
+
+async def sweep_expired_sessions(sessions: UploadSession) -> int:
+    removed = 0
+    for session in await sessions.claim_expired():
+        await remove_staging_file(staging_path(session["_id"]))
+        # Scratch chunks left behind by a worker that died mid-request
+        for scratch in glob.glob(os.path.join(staging_dir(), f"{session['_id']}.*.chunk")):
+            await remove_staging_file(scratch)
+        removed += 1
+    return removed
+
+
+async def run_upload_sweeper(sessions: UploadSession):
+    while True:
+        try:
+            removed = await sweep_expired_sessions(sessions)
+            if removed:
+                logger.info("Removed %d expired upload sessions", removed)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Upload session sweep failed")
+        await asyncio.sleep(settings.resumable_sweep_interval_seconds)
@@ -1,14 +1,73 @@
+import base64
+import hashlib
+import hmac
+import json
 import secrets
-import string
-from datetime import datetime, timedelta
+import time
+from datetime import timedelta
 from typing import Optional
 
-def generate_secure_token(length: int = 32) -> str:
-    alphabet = string.ascii_letters + string.digits
-    return ''.join(secrets.choice(alphabet) for _ in range(length))
+from app.config import settings
+
+class InvalidTokenError(ValueError):
+    pass
 
-def generate_access_token() -> str:
-    return generate_secure_token(64)
+def generate_secure_token(length: int = 32) -> str:
+    # token_urlsafe yields ~1.3 characters per byte, so this is always long enough to slice
+    return secrets.token_urlsafe(length)[:length]
 
 def is_valid_file_type(filename: str, allowed_types: list) -> bool:
-    return any(filename.lower().endswith(ext) for ext in allowed_types)
\ No newline at end of file
+    return any(filename.lower().endswith(ext) for ext in allowed_types)
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+def _signing_key() -> bytes:
+    # Derived so signed links can never be confused with JWTs signed by the raw secret
+    return hmac.new(settings.secret_key.encode(), b"signed-token-v1", hashlib.sha256).digest()
+
+def _sign(body: str) -> str:
+    return _b64encode(hmac.new(_signing_key(), body.encode("ascii"), hashlib.sha256).digest())
+
+def create_signed_token(claims: dict, scope: str, expires_delta: timedelta) -> str:
+    payload = dict(
+        claims,
+        scope=scope,
+        exp=int(time.time() + expires_delta.total_seconds()),
+        jti=secrets.token_urlsafe(12),
+    )
+    body = _b64encode(json.dumps(payload, separators=(",", ":")).encode())
+    return f"{body}.{_sign(body)}"
+
+def verify_signed_token(token: str, scope: str) -> dict:
+    # Tokens arrive from query strings; anything outside ASCII cannot be ours and would make
+    # the encode in _sign and compare_digest raise instead of rejecting the token
+    if not token.isascii():
+        raise InvalidTokenError("Malformed token")
+    try:
+        body, signature = token.split(".")
+    except ValueError:
+        raise InvalidTokenError("Malformed token")
+    if not hmac.compare_digest(signature.encode("ascii"), _sign(body).encode("ascii")):
+        raise InvalidTokenError("Invalid signature")
+    try:
+        claims = json.loads(_b64decode(body))
+    except ValueError:
+        raise InvalidTokenError("Malformed token")
+    if not isinstance(claims, dict):
+        raise InvalidTokenError("Malformed token")
+    if claims.get("scope") != scope:
+        raise InvalidTokenError("Wrong token scope")
+    if claims.get("exp", 0) < time.time():
+        raise InvalidTokenError("Token expired")
+    return claims
+
+def create_download_token(file_id: str, user_id: str, expires_delta: Optional[timedelta] = None) -> str:
+    expires_delta = expires_delta or timedelta(minutes=settings.download_link_expire_minutes)
+    return create_signed_token({"fid": file_id, "uid": user_id}, "download", expires_delta)
+
+def verify_download_token(token: str) -> dict:
+    return verify_signed_token(token, "download")
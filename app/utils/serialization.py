@@ -0,0 +1,56 @@
+from functools import lru_cache
+from typing import Iterable, Optional, Type, Union
+
+import orjson
+from bson import ObjectId
+from fastapi import Response
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+from app.config import settings
+
+
+def _default(value):
+    if isinstance(value, ObjectId):
+        return str(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class MongoJSONResponse(JSONResponse):
+    # orjson serializes datetimes natively and is several times faster than json.dumps;
+    # the default hook covers ObjectIds that reach a response unmapped
+    def render(self, content) -> bytes:
+        return orjson.dumps(content, default=_default)
+
+
+@lru_cache(maxsize=None)
+def _response_fields(model: Type[BaseModel]) -> tuple:
+    return tuple((name, field.default) for name, field in model.__fields__.items())
+
+
+def to_response_dict(document: dict, model: Type[BaseModel]) -> dict:
+    # Keeps only the fields the response model declares (so hashed_password, storage_key and
+    # friends never leak) and maps Mongo's _id to id
+    out = {}
+    for name, default in _response_fields(model):
+        value = document.get("_id") if name == "id" else document.get(name, default)
+        out[name] = str(value) if isinstance(value, ObjectId) else value
+    return out
+
+
+def db_response(
+    documents: Union[dict, Iterable[dict]],
+    model: Type[BaseModel],
+    response: Optional[Response] = None,
+):
+    if isinstance(documents, dict):
+        content = to_response_dict(documents, model)
+    else:
+        content = [to_response_dict(document, model) for document in documents]
+    if not settings.trust_db_responses:
+        # FastAPI validates the dicts against the route's response_model as usual
+        return content
+    # Returning a Response bypasses response_model validation and jsonable_encoder. Headers set
+    # on the injected Response would otherwise be dropped, so they are carried over.
+    headers = dict(response.headers) if response is not None else None
+    return MongoJSONResponse(content, headers=headers)
@@ -0,0 +1,79 @@
+import hashlib
+import os
+import secrets
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+from fastapi import HTTPException, UploadFile, status
+from starlette.concurrency import run_in_threadpool
+
+from app.config import settings
+
+
+@dataclass
+class StoredUpload:
+    temp_path: str
+    size: int
+    sha256: str
+
+
+def _too_large():
+    return HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail=f"File exceeds the maximum size of {settings.max_upload_size} bytes",
+    )
+
+
+def _remove_quietly(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+async def save_upload_to_temp(
+    upload: UploadFile,
+    temp_dir: str,
+    sniff: Optional[Callable[[bytes], None]] = None,
+    max_size: Optional[int] = None,
+    chunk_size: Optional[int] = None,
+) -> StoredUpload:
+    max_size = max_size or settings.max_upload_size
+    chunk_size = chunk_size or settings.upload_chunk_size
+
+    # The multipart parser already knows the part size, so oversized files are rejected before any copy
+    if getattr(upload, "size", None) is not None and upload.size > max_size:
+        raise _too_large()
+
+    temp_path = os.path.join(temp_dir, f".{secrets.token_hex(16)}.part")
+    digest = hashlib.sha256()
+    size = 0
+    out = await run_in_threadpool(open, temp_path, "wb")
+    try:
+        while True:
+            chunk = await upload.read(chunk_size)
+            if not chunk:
+                break
+            if size == 0 and sniff is not None:
+                sniff(chunk)
+            size += len(chunk)
+            if size > max_size:
+                raise _too_large()
+            digest.update(chunk)
+            await run_in_threadpool(out.write, chunk)
+        await run_in_threadpool(out.close)
+    except BaseException:
+        out.close()
+        await run_in_threadpool(_remove_quietly, temp_path)
+        raise
+
+    return StoredUpload(temp_path=temp_path, size=size, sha256=digest.hexdigest())
+
+
+async def commit_upload(stored: StoredUpload, file_path: str):
+    # temp_dir and the destination share a filesystem, so the rename is atomic
+    await run_in_threadpool(os.replace, stored.temp_path, file_path)
+
+
+async def discard_upload(stored: StoredUpload):
+    await run_in_threadpool(_remove_quietly, stored.temp_path)
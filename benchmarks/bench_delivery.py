@@ -0,0 +1,139 @@
+import argparse
+import asyncio
+import os
+import socket
+import tempfile
+import threading
+import time
+
+from starlette.requests import Request
+
+from app.utils.downloads import build_download_response, build_offload_response, file_range_reader
+
+MODES = ("stream", "sendfile", "x-accel-redirect", "x-sendfile")
+MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.presentationml.presentation"
+
+
+class Drain:
+    # Stands in for the client: reads the socket on its own thread, whose CPU is subtracted
+    def __init__(self, sock: socket.socket):
+        self.sock = sock
+        self.received = 0
+        self.cpu = 0.0
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        buffer = bytearray(1024 * 1024)
+        while True:
+            count = self.sock.recv_into(buffer)
+            if not count:
+                break
+            self.received += count
+        self.cpu = time.thread_time()
+
+
+def make_send(sock: socket.socket):
+    # Behaves like an ASGI server writing to a client socket, including the zero-copy extension
+    async def send(message):
+        if message["type"] == "http.response.body":
+            if message["body"]:
+                sock.sendall(message["body"])
+        elif message["type"] == "http.response.zerocopysend":
+            offset, remaining = message["offset"], message["count"]
+            while remaining > 0:
+                sent = os.sendfile(sock.fileno(), message["file"].fileno(), offset, remaining)
+                offset += sent
+                remaining -= sent
+
+    return send
+
+
+def make_receive():
+    requested = False
+
+    async def receive():
+        nonlocal requested
+        if not requested:
+            requested = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        # A client that stays connected: StreamingResponse listens for a disconnect until the
+        # body is sent and then cancels this wait
+        await asyncio.Event().wait()
+
+    return receive
+
+
+async def serve(mode: str, path: str, size: int, send):
+    scope = {
+        "type": "http",
+        "method": "GET",
+        "path": "/files/download",
+        "query_string": b"",
+        "headers": [],
+        "extensions": {"http.response.zerocopysend": {}} if mode == "sendfile" else {},
+    }
+    request = Request(scope)
+    if mode in ("x-accel-redirect", "x-sendfile"):
+        header = "X-Accel-Redirect" if mode == "x-accel-redirect" else "X-Sendfile"
+        response = build_offload_response(
+            request, header=header, location=path, media_type=MEDIA_TYPE, filename="deck.pptx"
+        )
+    else:
+        response = build_download_response(
+            request,
+            size=size,
+            media_type=MEDIA_TYPE,
+            filename="deck.pptx",
+            read_range=file_range_reader(path),
+            sendfile_path=path if mode == "sendfile" else None,
+        )
+    await response(scope, make_receive(), send)
+
+
+def run_mode(mode: str, path: str, size: int, iterations: int) -> dict:
+    server, client = socket.socketpair()
+    drain = Drain(client)
+    send = make_send(server)
+
+    wall_started = time.perf_counter()
+    cpu_started = time.process_time()
+    for _ in range(iterations):
+        asyncio.run(serve(mode, path, size, send))
+    server.close()
+    drain.thread.join()
+    cpu = time.process_time() - cpu_started - drain.cpu
+    wall = time.perf_counter() - wall_started
+    client.close()
+
+    gigabytes = size * iterations / 1e9
+    return {
+        "cpu_s_per_gb": cpu / gigabytes,
+        "wall_s": wall,
+        "streamed_by_app_mb": drain.received / 1e6,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare worker CPU per GB across download delivery modes")
+    parser.add_argument("--size-mb", type=int, default=256)
+    parser.add_argument("--iterations", type=int, default=4)
+    parser.add_argument("--modes", default=",".join(MODES))
+    args = parser.parse_args()
+
+    size = args.size_mb * 1024 * 1024
+    with tempfile.NamedTemporaryFile(suffix=".pptx") as f:
+        for _ in range(args.size_mb):
+            f.write(os.urandom(1024 * 1024))
+        f.flush()
+        print(f"{args.iterations} x {args.size_mb} MB download per mode (worker CPU, client side excluded)")
+        for mode in args.modes.split(","):
+            result = run_mode(mode, f.name, size, args.iterations)
+            print(
+                f"  {mode:<18} {result['cpu_s_per_gb']:>8.3f} CPU s/GB  {result['wall_s']:>7.2f} s wall  "
+                f"{result['streamed_by_app_mb']:>9.1f} MB through the worker"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+import argparse
+import os
+import tempfile
+import timeit
+import zipfile
+
+from app.utils.file_types import OOXML_MIME_TYPES, detect_ooxml_type, detect_with_libmagic
+
+MAIN_PARTS = {
+    ".pptx": "ppt/presentation.xml",
+    ".docx": "word/document.xml",
+    ".xlsx": "xl/workbook.xml",
+}
+
+
+def make_document(directory: str, extension: str, size_mb: int) -> str:
+    path = os.path.join(directory, f"sample{extension}")
+    mime = OOXML_MIME_TYPES[extension]
+    with zipfile.ZipFile(path, "w") as archive:
+        archive.writestr(
+            "[Content_Types].xml",
+            '<?xml version="1.0" encoding="UTF-8"?>'
+            '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            f'<Override PartName="/{MAIN_PARTS[extension]}" ContentType="{mime}.main+xml"/>'
+            '</Types>',
+        )
+        archive.writestr(MAIN_PARTS[extension], "<root/>")
+        # Media parts are stored already compressed in real decks, so random bytes are representative
+        for index in range(size_mb):
+            archive.writestr(f"media/image{index}.png", os.urandom(1024 * 1024), zipfile.ZIP_STORED)
+    return path
+
+
+def per_request_libmagic(path: str) -> str:
+    import magic
+
+    with open(path, "rb") as f:
+        content = f.read()
+    return magic.Magic(mime=True).from_buffer(content)
+
+
+def report(name: str, func, path: str, number: int):
+    seconds = min(timeit.repeat(lambda: func(path), number=number, repeat=3)) / number
+    print(f"  {name:<32} {seconds * 1e6:>12.1f} us/op   -> {func(path)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare OOXML type detection strategies")
+    parser.add_argument("--size-mb", type=int, default=50)
+    parser.add_argument("--number", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        for extension in OOXML_MIME_TYPES:
+            path = make_document(directory, extension, args.size_mb)
+            print(f"{extension} ({os.path.getsize(path) / 1e6:.1f} MB)")
+            report("central directory", detect_ooxml_type, path, args.number)
+            try:
+                report("libmagic (cached, from_file)", detect_with_libmagic, path, args.number)
+                report("libmagic (per request, full read)", per_request_libmagic, path, args.number)
+            except ImportError:
+                print("  python-magic not installed, skipping libmagic comparison")
+
+
+if __name__ == "__main__":
+    main()
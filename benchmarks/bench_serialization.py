@@ -0,0 +1,79 @@
+import argparse
+import asyncio
+import json
+import timeit
+from datetime import datetime, timedelta
+from typing import List
+
+from bson import ObjectId
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+
+from app.schemas.file import FileInDB
+from app.utils.serialization import MongoJSONResponse, to_response_dict
+
+
+def make_documents(count: int) -> List[dict]:
+    now = datetime.utcnow()
+    user_id = str(ObjectId())
+    return [
+        {
+            "_id": ObjectId(),
+            "filename": f"document-{index}.docx",
+            "content_type": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+            "file_size": 1024 * index,
+            "content_hash": f"{index:064x}",
+            "uploaded_by": user_id,
+            "created_at": now - timedelta(seconds=index),
+            "updated_at": now - timedelta(seconds=index),
+        }
+        for index in range(count)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare response serialization paths for a file listing")
+    parser.add_argument("--items", type=int, default=1000)
+    parser.add_argument("--number", type=int, default=50)
+    args = parser.parse_args()
+
+    documents = make_documents(args.items)
+    field = create_response_field(name="Response_list_files", type_=List[FileInDB])
+    loop = asyncio.new_event_loop()
+
+    def validated(response_class):
+        # What FastAPI does for a response_model route: validate, jsonable_encoder, render
+        content = loop.run_until_complete(serialize_response(
+            field=field,
+            response_content=[to_response_dict(document, FileInDB) for document in documents],
+        ))
+        return response_class(content).body
+
+    def stdlib_without_model():
+        return json.dumps(jsonable_encoder(
+            [to_response_dict(document, FileInDB) for document in documents]
+        )).encode()
+
+    def trusted():
+        # trust_db_responses=true: map the documents and hand them straight to orjson
+        return MongoJSONResponse([to_response_dict(document, FileInDB) for document in documents]).body
+
+    cases = [
+        ("response_model + json (before)", lambda: validated(JSONResponse)),
+        ("jsonable_encoder + json", stdlib_without_model),
+        ("response_model + orjson", lambda: validated(MongoJSONResponse)),
+        ("trusted + orjson", trusted),
+    ]
+    print(f"Serializing {args.items} files")
+    baseline = None
+    for name, func in cases:
+        seconds = min(timeit.repeat(func, number=args.number, repeat=3)) / args.number
+        baseline = baseline or seconds
+        print(f"  {name:<32} {seconds * 1e3:>8.2f} ms/response  {baseline / seconds:>5.1f}x  {len(func())} bytes")
+    loop.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,370 @@
+import argparse
+import asyncio
+import io
+import json
+import math
+import os
+import platform
+import resource
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import zipfile
+from datetime import datetime, timedelta
+
+SCENARIOS = ("login", "upload", "link", "download", "list")
+DOCX_MIME = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+PASSWORD = "benchmark-password"
+# Each upload rewrites the archive comment so content-addressed storage cannot deduplicate it
+UNIQUE_SUFFIX_LENGTH = 16
+
+
+def parse_size(text: str) -> int:
+    text = text.strip().lower()
+    for suffix, factor in (("k", 1024), ("m", 1024 ** 2), ("g", 1024 ** 3)):
+        if text.endswith(suffix):
+            return int(float(text[:-1]) * factor)
+    return int(text)
+
+
+def make_docx(size: int) -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        archive.writestr(
+            "[Content_Types].xml",
+            '<?xml version="1.0" encoding="UTF-8"?>'
+            '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            f'<Override PartName="/word/document.xml" ContentType="{DOCX_MIME}.main+xml"/>'
+            '</Types>',
+        )
+        archive.writestr("word/document.xml", "<root/>")
+        # Embedded media is already compressed in real documents, so random bytes are representative
+        archive.writestr("word/media/image1.png", os.urandom(max(size - 1024, 0)), zipfile.ZIP_STORED)
+        archive.comment = b"0" * UNIQUE_SUFFIX_LENGTH
+    return buffer.getvalue()
+
+
+def unique_copy(document: bytes, index: int) -> bytes:
+    return document[:-UNIQUE_SUFFIX_LENGTH] + f"{index:0{UNIQUE_SUFFIX_LENGTH}d}".encode()
+
+
+def percentile(sorted_values: list, p: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = max(math.ceil(p / 100 * len(sorted_values)) - 1, 0)
+    return sorted_values[index]
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is in KiB on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class MongoHarness:
+    def __init__(self, mode: str):
+        self.mode = mode
+        self.process = None
+        self.data_dir = None
+        self.client = None
+
+    async def start(self):
+        if self.mode == "mock":
+            try:
+                from mongomock_motor import AsyncMongoMockClient
+            except ImportError:
+                raise SystemExit("--mongo mock needs the 'mongomock-motor' package")
+            self.client = AsyncMongoMockClient()
+            return self.client
+
+        import motor.motor_asyncio
+        from app.config import settings
+
+        url = settings.mongodb_url
+        if self.mode == "mongod":
+            mongod = shutil.which("mongod")
+            if mongod is None:
+                raise SystemExit("--mongo mongod needs a 'mongod' binary on PATH")
+            port = free_port()
+            self.data_dir = tempfile.mkdtemp(prefix="bench-mongod-")
+            self.process = subprocess.Popen(
+                [mongod, "--dbpath", self.data_dir, "--port", str(port), "--bind_ip", "127.0.0.1", "--quiet"],
+                stdout=subprocess.DEVNULL,
+            )
+            url = f"mongodb://127.0.0.1:{port}"
+
+        self.client = motor.motor_asyncio.AsyncIOMotorClient(url, serverSelectionTimeoutMS=30000)
+        await self.client.admin.command("ping")
+        return self.client
+
+    async def stop(self, database_name: str):
+        if self.client is not None and self.mode == "url":
+            await self.client.drop_database(database_name)
+        if self.process is not None:
+            self.process.terminate()
+            self.process.wait(timeout=30)
+        if self.data_dir is not None:
+            shutil.rmtree(self.data_dir, ignore_errors=True)
+
+
+async def run_scenario(name: str, total: int, concurrency: int, make_request, payload_bytes: int = 0) -> dict:
+    latencies = []
+    errors = 0
+    queue = asyncio.Queue()
+    for index in range(total):
+        queue.put_nowait(index)
+
+    async def worker():
+        nonlocal errors
+        while True:
+            try:
+                index = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            started = time.perf_counter()
+            try:
+                ok = await make_request(index)
+            except Exception:
+                ok = False
+            latencies.append(time.perf_counter() - started)
+            if not ok:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    result = {
+        "requests": total,
+        "errors": errors,
+        "concurrency": concurrency,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(total / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    }
+    if payload_bytes:
+        result["mb_per_s"] = round(payload_bytes * total / elapsed / 1e6, 2) if elapsed else 0.0
+    print(
+        f"{name:<16} {result['throughput_rps']:>9.1f} req/s  p50 {result['p50_ms']:>8.2f} ms  "
+        f"p95 {result['p95_ms']:>8.2f} ms  p99 {result['p99_ms']:>8.2f} ms  "
+        f"errors {errors:<4} rss {result['peak_rss_mb']:.0f} MB"
+    )
+    return result
+
+
+async def seed(db, user_id: str, count: int):
+    from app.models.file import File
+
+    now = datetime.utcnow()
+    await File(db).create_files([
+        {
+            "filename": f"seed-{index}.docx",
+            "content_type": DOCX_MIME,
+            "file_size": 1024,
+            "uploaded_by": user_id,
+            "created_at": now - timedelta(seconds=index),
+        }
+        for index in range(count)
+    ])
+
+
+async def run_benchmarks(args) -> dict:
+    import httpx
+
+    from app.config import settings
+    from app.db import close_mongo_connection, connect_to_mongo, get_database
+    from app.main import app
+    from app.storage import close_storage
+    from app.utils.auth import get_password_hash, shutdown_password_hasher
+
+    harness = MongoHarness(args.mongo)
+    await connect_to_mongo(await harness.start())
+    db = get_database()
+    results = {}
+    try:
+        now = datetime.utcnow()
+        user = {
+            "email": "bench@example.com",
+            "full_name": "Benchmark User",
+            "hashed_password": get_password_hash(PASSWORD),
+            "is_verified": True,
+            "is_ops_user": True,
+            "created_at": now,
+            "updated_at": now,
+        }
+        await db["users"].insert_one(user)
+        await seed(db, str(user["_id"]), args.seed_files)
+
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            response = await client.post("/auth/login", data={"username": user["email"], "password": PASSWORD})
+            response.raise_for_status()
+            headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+            async def login(index):
+                response = await client.post("/auth/login", data={"username": user["email"], "password": PASSWORD})
+                return response.status_code == 200
+
+            async def list_files(index):
+                response = await client.get("/files/list", params={"limit": args.list_limit}, headers=headers)
+                return response.status_code == 200
+
+            file_ids = []
+            links = []
+
+            def upload_for(document):
+                async def upload(index):
+                    response = await client.post(
+                        "/files/upload",
+                        files={"file": ("bench.docx", unique_copy(document, index), DOCX_MIME)},
+                        headers=headers,
+                    )
+                    return response.status_code == 200
+                return upload
+
+            async def link(index):
+                response = await client.get(f"/files/download/{file_ids[index % len(file_ids)]}", headers=headers)
+                if response.status_code == 200:
+                    links.append(response.json()["download_link"].replace(settings.base_url, ""))
+                    return True
+                return False
+
+            async def download(index):
+                received = 0
+                async with client.stream("GET", links[index % len(links)], headers=headers) as response:
+                    async for chunk in response.aiter_raw():
+                        received += len(chunk)
+                return response.status_code == 200 and received > 0
+
+            for scenario in args.scenarios:
+                if scenario == "login":
+                    results["login"] = await run_scenario("login", args.requests, args.concurrency, login)
+                elif scenario == "list":
+                    results["list"] = await run_scenario("list", args.requests, args.concurrency, list_files)
+                elif scenario == "upload":
+                    for size in args.upload_sizes:
+                        document = make_docx(size)
+                        name = f"upload_{size // 1024}k"
+                        results[name] = await run_scenario(
+                            name, args.requests, args.concurrency, upload_for(document), payload_bytes=len(document)
+                        )
+                elif scenario == "link":
+                    # Uploaded (not seeded) files, since only those have bytes to download
+                    file_ids = [
+                        str(doc["_id"])
+                        async for doc in db["files"].find({"content_hash": {"$exists": True}}, {"_id": 1})
+                    ]
+                    if not file_ids:
+                        raise SystemExit("the link scenario needs the upload scenario to run first")
+                    results["link"] = await run_scenario("link", args.requests, args.concurrency, link)
+                elif scenario == "download":
+                    if not links:
+                        raise SystemExit("the download scenario needs the link scenario to run first")
+                    results["download"] = await run_scenario("download", args.requests, args.concurrency, download)
+    finally:
+        shutdown_password_hasher()
+        await close_storage()
+        await close_mongo_connection()
+        await harness.stop(settings.database_name)
+    return results
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    regressions = []
+    for name, current in results.items():
+        # Failed requests are usually the fastest ones, so they would otherwise look like a speedup
+        if current["errors"]:
+            regressions.append(f"{name}: {current['errors']} of {current['requests']} requests failed")
+        previous = baseline.get("scenarios", {}).get(name)
+        if previous is None:
+            continue
+        if previous["p95_ms"] and current["p95_ms"] > previous["p95_ms"] * (1 + threshold):
+            regressions.append(f"{name}: p95 {previous['p95_ms']} ms -> {current['p95_ms']} ms")
+        if current["throughput_rps"] < previous["throughput_rps"] * (1 - threshold):
+            regressions.append(
+                f"{name}: throughput {previous['throughput_rps']} -> {current['throughput_rps']} req/s"
+            )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the API hot paths in-process")
+    parser.add_argument("--mongo", choices=("mock", "mongod", "url"), default="mock",
+                        help="in-memory mongomock, a throwaway mongod, or MONGODB_URL")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS),
+                        help="comma-separated subset of " + ",".join(SCENARIOS))
+    parser.add_argument("--requests", type=int, default=200, help="requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--upload-sizes", default="64k,1m,8m")
+    parser.add_argument("--seed-files", type=int, default=1000, help="files inserted before listing")
+    parser.add_argument("--list-limit", type=int, default=50)
+    parser.add_argument("--bcrypt-rounds", type=int, default=None)
+    parser.add_argument("--output", help="write results as JSON to this path")
+    parser.add_argument("--baseline", help="compare against a previously saved JSON result")
+    parser.add_argument("--max-regression", type=float, default=0.2,
+                        help="fail when p95 or throughput is worse than the baseline by this fraction")
+    args = parser.parse_args()
+    args.scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    args.upload_sizes = [parse_size(size) for size in args.upload_sizes.split(",")]
+
+    # Settings are read at import time, so the environment is prepared before the app is imported
+    upload_dir = tempfile.mkdtemp(prefix="bench-uploads-")
+    os.environ["UPLOAD_DIR"] = upload_dir
+    os.environ["STORAGE_BACKEND"] = "local"
+    os.environ.setdefault("DATABASE_NAME", "secure_file_share_bench")
+    if args.mongo == "mock":
+        os.environ["MONGODB_ENSURE_INDEXES"] = "false"
+    # One benchmark user from one address would otherwise be throttled instead of measured
+    os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+    os.environ.setdefault("UPLOAD_MAX_CONCURRENT_PER_USER", "0")
+    if args.bcrypt_rounds is not None:
+        os.environ["BCRYPT_ROUNDS"] = str(args.bcrypt_rounds)
+
+    try:
+        results = asyncio.run(run_benchmarks(args))
+    finally:
+        shutil.rmtree(upload_dir, ignore_errors=True)
+
+    report = {
+        "meta": {
+            "created_at": datetime.utcnow().isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "mongo": args.mongo,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+        },
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "scenarios": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.max_regression)
+        if regressions:
+            print(f"Regressions beyond {args.max_regression:.0%}:")
+            for line in regressions:
+                print(f"  {line}")
+            raise SystemExit(1)
+        print(f"No regressions beyond {args.max_regression:.0%} against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+import asyncio
+
+import pytest
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+from app.utils.admission import UploadAdmission, UploadAdmissionMiddleware
+from app.utils.auth import create_access_token
+
+
+def make_admission(**limits) -> UploadAdmission:
+    options = {
+        "max_concurrent": 2,
+        "max_per_user": 1,
+        "max_in_flight_bytes": 1000,
+        "min_free_bytes": 0,
+        "disk_path": ".",
+    }
+    options.update(limits)
+    return UploadAdmission(**options)
+
+
+def test_admission_limits():
+    admission = make_admission()
+    assert admission.try_admit("a@example.com", 400) is None
+    assert admission.try_admit("a@example.com", 10) == (429, "user_limit")
+    assert admission.try_admit("b@example.com", 700) == (503, "in_flight_bytes")
+    assert admission.try_admit("b@example.com", 400) is None
+    assert admission.try_admit(None, 10) == (503, "concurrency")
+
+    admission.release("a@example.com", 400)
+    admission.release("b@example.com", 400)
+    assert admission.stats()["active"] == 0
+    assert admission.stats()["in_flight_bytes"] == 0
+    assert admission.stats()["rejected"] == {"user_limit": 1, "in_flight_bytes": 1, "concurrency": 1}
+
+    # A single upload larger than the byte cap is still let through when nothing else runs
+    assert admission.try_admit(None, 5000) is None
+
+
+def test_disk_watermark():
+    admission = make_admission(min_free_bytes=1 << 62)
+    assert admission.try_admit(None, 10) == (503, "disk_space")
+
+
+@pytest.mark.asyncio
+async def test_middleware_rejects_before_reading_the_body():
+    admission = make_admission(max_per_user=0, max_concurrent=1)
+    release = asyncio.Event()
+    bodies_read = 0
+
+    async def upload(request):
+        nonlocal bodies_read
+        await request.body()
+        bodies_read += 1
+        await release.wait()
+        return PlainTextResponse("ok")
+
+    app = UploadAdmissionMiddleware(
+        Starlette(routes=[Route("/files/upload", upload, methods=["POST"])]), admission
+    )
+    messages = []
+
+    async def call(sent):
+        scope = {
+            "type": "http",
+            "method": "POST",
+            "path": "/files/upload",
+            "query_string": b"",
+            "headers": [(b"content-length", b"3")],
+        }
+
+        async def receive():
+            return {"type": "http.request", "body": b"abc", "more_body": False}
+
+        async def send(message):
+            sent.append(message)
+
+        await app(scope, receive, send)
+
+    first = asyncio.create_task(call([]))
+    while admission.active == 0:
+        await asyncio.sleep(0)
+    await call(messages)
+    assert messages[0]["status"] == 503
+    assert (b"retry-after", b"5") in messages[0]["headers"]
+    assert bodies_read == 1
+
+    release.set()
+    await first
+    assert admission.active == 0
+
+
+def test_per_user_slots_follow_the_token():
+    admission = make_admission(max_per_user=0)
+    app = UploadAdmissionMiddleware(
+        Starlette(routes=[Route("/files/upload", lambda request: PlainTextResponse("ok"), methods=["POST"])]),
+        admission,
+    )
+    client = TestClient(app)
+    token = create_access_token({"sub": "a@example.com"})
+    response = client.post("/files/upload", content=b"abc", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 200
+    assert admission.stats()["users"] == 0
+
+    # Bodiless calls on upload paths are never counted
+    response = client.post("/files/upload")
+    assert response.status_code == 200
+    assert admission.stats()["rejected"] == {}
@@ -0,0 +1,40 @@
+from unittest.mock import patch
+
+from app.utils.cache import TTLCache
+
+
+def test_ttl_cache_hit_and_miss():
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+def test_ttl_cache_evicts_least_recently_used():
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.stats()["evictions"] == 1
+
+
+def test_ttl_cache_expires_entries():
+    cache = TTLCache(maxsize=2, ttl=10)
+    with patch("app.utils.cache.time.monotonic", return_value=100.0):
+        cache.set("a", 1)
+    with patch("app.utils.cache.time.monotonic", return_value=111.0):
+        assert cache.get("a") is None
+
+
+def test_ttl_cache_invalidate_where():
+    cache = TTLCache(maxsize=10, ttl=60)
+    cache.set("a@example.com", {"user": {"_id": 1}})
+    cache.set("b@example.com", {"user": {"_id": 2}})
+    cache.invalidate_where(lambda entry: entry["user"]["_id"] == 1)
+    assert cache.get("a@example.com") is None
+    assert cache.get("b@example.com") == {"user": {"_id": 2}}
@@ -0,0 +1,133 @@
+from contextlib import contextmanager
+from datetime import datetime
+
+import motor.motor_asyncio
+import pytest
+import pytest_asyncio
+from fastapi.testclient import TestClient
+from pymongo import monitoring
+
+from app.config import settings
+from app.db import close_mongo_connection
+from app.main import app
+from app.utils.auth import create_access_token, get_password_hash
+from app.utils.cache import user_cache
+
+client = TestClient(app)
+
+CRUD_COMMANDS = {"find", "insert", "update", "delete", "findAndModify", "aggregate", "count", "getMore"}
+
+
+class CommandRecorder(monitoring.CommandListener):
+    def __init__(self):
+        self.recording = False
+        self.commands = []
+
+    def started(self, event):
+        if self.recording and event.command_name in CRUD_COMMANDS:
+            self.commands.append((event.command_name, event.command.get(event.command_name)))
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+# Registered globally, so every client created from here on reports its commands
+recorder = CommandRecorder()
+monitoring.register(recorder)
+
+
+@contextmanager
+def recorded_commands():
+    recorder.commands = []
+    recorder.recording = True
+    try:
+        yield recorder.commands
+    finally:
+        recorder.recording = False
+
+
+@pytest_asyncio.fixture
+async def db():
+    # Drop the shared client so the app lazily reconnects with the recorder attached
+    await close_mongo_connection()
+    user_cache.clear()
+    mongo = motor.motor_asyncio.AsyncIOMotorClient(settings.mongodb_url)
+    db = mongo[settings.database_name]
+    yield db
+    for collection in ("users", "files", "email_outbox"):
+        await db.drop_collection(collection)
+    mongo.close()
+
+
+@pytest_asyncio.fixture
+async def verified_user(db):
+    user = {
+        "email": "calls@example.com",
+        "full_name": "Calls User",
+        "hashed_password": get_password_hash("securepassword123"),
+        "is_verified": True,
+        "is_ops_user": False,
+        "created_at": datetime.utcnow(),
+        "updated_at": datetime.utcnow(),
+    }
+    await db["users"].insert_one(user)
+    return user
+
+
+@pytest.mark.asyncio
+async def test_signup_writes_user_and_outbox_only(db):
+    payload = {"email": "new@example.com", "full_name": "New User", "password": "securepassword123"}
+    with recorded_commands() as commands:
+        response = client.post("/auth/signup", json=payload)
+    assert response.status_code == 200
+    assert commands == [("insert", "users"), ("insert", "email_outbox")]
+
+    with recorded_commands() as commands:
+        response = client.post("/auth/signup", json=payload)
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Email already registered"
+    assert commands == [("insert", "users")]
+
+
+@pytest.mark.asyncio
+async def test_verify_email_is_one_round_trip(db):
+    await db["users"].insert_one({"email": "verify@example.com", "verification_token": "tok", "is_verified": False})
+    with recorded_commands() as commands:
+        response = client.get("/auth/verify-email?token=tok")
+    assert response.status_code == 200
+    assert commands == [("findAndModify", "users")]
+
+
+@pytest.mark.asyncio
+async def test_login_is_one_round_trip(verified_user):
+    with recorded_commands() as commands:
+        response = client.post(
+            "/auth/login",
+            data={"username": verified_user["email"], "password": "securepassword123"},
+        )
+    assert response.status_code == 200
+    assert commands == [("find", "users")]
+
+
+@pytest.mark.asyncio
+async def test_download_link_reads_user_once(db, verified_user):
+    result = await db["files"].insert_one({
+        "filename": "report.docx",
+        "uploaded_by": str(verified_user["_id"]),
+        "created_at": datetime.utcnow(),
+    })
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': verified_user['email']})}"}
+
+    with recorded_commands() as commands:
+        response = client.get(f"/files/download/{result.inserted_id}", headers=headers)
+    assert response.status_code == 200
+    assert commands == [("find", "users"), ("find", "files")]
+
+    # The user is cached now; only the file lookup remains
+    with recorded_commands() as commands:
+        response = client.get(f"/files/download/{result.inserted_id}", headers=headers)
+    assert response.status_code == 200
+    assert commands == [("find", "files")]
@@ -0,0 +1,108 @@
+import pytest
+from starlette.requests import Request
+
+from app.utils.downloads import (
+    build_download_response,
+    build_offload_response,
+    file_range_reader,
+    parse_range_header,
+)
+
+
+def test_parse_range_header_forms():
+    assert parse_range_header("bytes=0-3", 50) == [(0, 3)]
+    assert parse_range_header("bytes=5-", 50) == [(5, 49)]
+    assert parse_range_header("bytes=-5", 50) == [(45, 49)]
+    assert parse_range_header("bytes=40-100", 50) == [(40, 49)]
+
+
+def test_parse_range_header_coalesces_overlaps():
+    assert parse_range_header("bytes=20-30,0-3,2-8", 50) == [(0, 8), (20, 30)]
+
+
+def test_parse_range_header_unsatisfiable():
+    assert parse_range_header("bytes=100-", 50) == []
+    assert parse_range_header("bytes=0-1", 0) == []
+
+
+def test_parse_range_header_ignores_invalid():
+    assert parse_range_header(None, 50) is None
+    assert parse_range_header("items=0-1", 50) is None
+    assert parse_range_header("bytes=3-1", 50) is None
+    assert parse_range_header("bytes=0-3,abc", 50) is None
+
+
+def make_request(headers=None, zero_copy=False):
+    return Request({
+        "type": "http",
+        "method": "GET",
+        "path": "/files/download",
+        "query_string": b"",
+        "headers": [(k.lower().encode(), v.encode()) for k, v in (headers or {}).items()],
+        "extensions": {"http.response.zerocopysend": {}} if zero_copy else {},
+    })
+
+
+async def collect(response, scope):
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    await response(scope, receive, send)
+    return messages
+
+
+def test_offload_response_sets_proxy_header():
+    response = build_offload_response(
+        make_request(),
+        header="X-Accel-Redirect",
+        location="/protected-files/ab/abcdef",
+        media_type="application/pdf",
+        filename="report.pdf",
+        etag='"abc"',
+    )
+    assert response.status_code == 200
+    assert response.headers["X-Accel-Redirect"] == "/protected-files/ab/abcdef"
+    assert response.body == b""
+
+    response = build_offload_response(
+        make_request({"If-None-Match": '"abc"'}),
+        header="X-Accel-Redirect",
+        location="/protected-files/ab/abcdef",
+        media_type="application/pdf",
+        filename="report.pdf",
+        etag='"abc"',
+    )
+    assert response.status_code == 304
+    assert "X-Accel-Redirect" not in response.headers
+
+
+@pytest.mark.asyncio
+async def test_sendfile_response_uses_zero_copy_extension(tmp_path):
+    path = tmp_path / "report.pdf"
+    path.write_bytes(b"0123456789")
+
+    def respond(request):
+        return build_download_response(
+            request,
+            size=10,
+            media_type="application/pdf",
+            filename="report.pdf",
+            read_range=file_range_reader(str(path)),
+            sendfile_path=str(path),
+        )
+
+    request = make_request({"Range": "bytes=2-5"}, zero_copy=True)
+    messages = await collect(respond(request), request.scope)
+    assert messages[0]["status"] == 206
+    assert messages[1]["type"] == "http.response.zerocopysend"
+    assert (messages[1]["offset"], messages[1]["count"]) == (2, 4)
+
+    # Without the extension the same response falls back to reading the file
+    request = make_request({"Range": "bytes=2-5"})
+    messages = await collect(respond(request), request.scope)
+    assert b"".join(m["body"] for m in messages[1:]) == b"2345"
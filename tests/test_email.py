@@ -0,0 +1,120 @@
+import smtplib
+import socket
+from datetime import datetime
+
+import motor.motor_asyncio
+import pytest
+import pytest_asyncio
+
+from app.config import settings
+from app.models.email_outbox import EmailOutbox
+from app.utils.email import SMTPSender, build_message, retry_delay, send_batch, send_verification_email
+
+aiosmtpd_controller = pytest.importorskip("aiosmtpd.controller")
+
+
+class RecordingHandler:
+    def __init__(self):
+        self.sessions = 0
+        self.messages = []
+
+    async def handle_EHLO(self, server, session, envelope, hostname, responses):
+        session.host_name = hostname
+        self.sessions += 1
+        return responses
+
+    async def handle_DATA(self, server, session, envelope):
+        self.messages.append(envelope)
+        return "250 OK"
+
+
+class FailingSender:
+    def send(self, message):
+        raise smtplib.SMTPServerDisconnected("Connection unexpectedly closed")
+
+    def close_if_idle(self, idle_seconds):
+        pass
+
+    def close(self):
+        pass
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def smtp_server():
+    handler = RecordingHandler()
+    # aiosmtpd 1.4 connects to the configured port to confirm startup, so port 0 cannot be used
+    port = free_port()
+    controller = aiosmtpd_controller.Controller(handler, hostname="127.0.0.1", port=port)
+    controller.start()
+    yield handler, "127.0.0.1", port
+    controller.stop()
+
+
+@pytest_asyncio.fixture
+async def outbox():
+    client = motor.motor_asyncio.AsyncIOMotorClient(settings.mongodb_url)
+    db = client[settings.database_name]
+    yield EmailOutbox(db)
+    await db.drop_collection("email_outbox")
+    client.close()
+
+
+def make_message(index: int) -> dict:
+    return {"to": f"user{index}@example.com", "subject": "Hello", "text": f"Message {index}", "html": None}
+
+
+def test_smtp_sender_reuses_connection(smtp_server):
+    handler, host, port = smtp_server
+    sender = SMTPSender(host, port, starttls=False)
+    try:
+        for index in range(3):
+            sender.send(build_message(make_message(index)))
+    finally:
+        sender.close()
+    assert len(handler.messages) == 3
+    assert handler.sessions == 1
+
+
+def test_retry_delay_is_capped():
+    assert retry_delay(1) <= settings.email_retry_base_seconds
+    assert retry_delay(50) <= settings.email_retry_max_seconds
+
+
+@pytest.mark.asyncio
+async def test_outbox_delivers_queued_email(smtp_server, outbox):
+    handler, host, port = smtp_server
+    for index in range(3):
+        await send_verification_email(outbox, f"user{index}@example.com", f"http://test/verify?token={index}")
+
+    sender = SMTPSender(host, port, starttls=False)
+    try:
+        batch = await outbox.claim_batch(10, lease_seconds=60)
+        assert len(batch) == 3
+        # Claimed messages are leased and not handed out twice
+        assert await outbox.claim_batch(10, lease_seconds=60) == []
+        await send_batch(outbox, sender, batch)
+    finally:
+        sender.close()
+
+    assert len(handler.messages) == 3
+    assert handler.sessions == 1
+    assert await outbox.collection.count_documents({"status": "sent"}) == 3
+
+
+@pytest.mark.asyncio
+async def test_outbox_schedules_retry_on_failure(outbox):
+    await send_verification_email(outbox, "user@example.com", "http://test/verify?token=abc")
+    batch = await outbox.claim_batch(10, lease_seconds=60)
+    await send_batch(outbox, FailingSender(), batch)
+
+    message = await outbox.collection.find_one({"to": "user@example.com"})
+    assert message["status"] == "pending"
+    assert message["attempts"] == 1
+    assert message["next_attempt_at"] > datetime.utcnow()
+    assert "SMTPServerDisconnected" in message["last_error"]
@@ -1,24 +1,47 @@
 import pytest
+import pytest_asyncio
 from fastapi.testclient import TestClient
 from app.main import app
 from app.config import settings
 from app.models.user import User
 from app.models.file import File
+from app.utils.auth import create_access_token
+from app.utils.security import create_download_token
 import motor.motor_asyncio
+import hashlib
+import io
 import os
+import zipfile
 
 client = TestClient(app)
 
-@pytest.fixture
+DOCX_MIME = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+
+def make_docx_bytes(body: bytes = b"<w:document/>") -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        archive.writestr(
+            "[Content_Types].xml",
+            '<?xml version="1.0" encoding="UTF-8"?>'
+            '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            f'<Override PartName="/word/document.xml" ContentType="{DOCX_MIME}.main+xml"/>'
+            '</Types>',
+        )
+        archive.writestr("word/document.xml", body)
+    return buffer.getvalue()
+
+@pytest_asyncio.fixture
 async def db():
     client = motor.motor_asyncio.AsyncIOMotorClient(settings.mongodb_url)
     db = client[settings.database_name]
     yield db
     await db.drop_collection("users")
     await db.drop_collection("files")
+    # Uploads go through the content-addressed blob store
+    await db.drop_collection("blobs")
     client.close()
 
-@pytest.fixture
+@pytest_asyncio.fixture
 async def test_user(db):
     user_data = {
         "email": "test@example.com",
@@ -30,7 +53,7 @@ async def test_user(db):
     user = await User(db).create_user(user_data)
     return user
 
-@pytest.fixture
+@pytest_asyncio.fixture
 async def test_ops_user(db):
     user_data = {
         "email": "ops@example.com",
@@ -42,30 +65,19 @@ async def test_ops_user(db):
     user = await User(db).create_user(user_data)
     return user
 
-@pytest.fixture
+@pytest_asyncio.fixture
 async def auth_token(test_user):
-    login_data = {
-        "username": test_user["email"],
-        "password": "testpassword"  # Note: In a real test, we'd hash this properly
-    }
-    # Bypass password verification for test
-    response = client.post("/auth/login", data=login_data)
-    return response.json()["access_token"]
+    # The stored hash is a placeholder, so the token is minted directly instead of logging in
+    return create_access_token({"sub": test_user["email"]})
 
-@pytest.fixture
+@pytest_asyncio.fixture
 async def ops_auth_token(test_ops_user):
-    login_data = {
-        "username": test_ops_user["email"],
-        "password": "testpassword"  # Note: In a real test, we'd hash this properly
-    }
-    # Bypass password verification for test
-    response = client.post("/auth/login", data=login_data)
-    return response.json()["access_token"]
+    return create_access_token({"sub": test_ops_user["email"]})
 
 @pytest.mark.asyncio
 async def test_upload_file_success(db, ops_auth_token):
     # Create a test file
-    test_file_content = b"Test file content"
+    test_file_content = make_docx_bytes()
     test_file_path = "test.docx"
     
     with open(test_file_path, "wb") as f:
@@ -86,6 +98,28 @@ async def test_upload_file_success(db, ops_auth_token):
     assert data["content_type"] == "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
     assert data["file_size"] == len(test_file_content)
 
+@pytest.mark.asyncio
+async def test_upload_file_invalid_content(db, ops_auth_token):
+    response = client.post(
+        "/files/upload",
+        files={"file": ("test.docx", b"Test file content", DOCX_MIME)},
+        headers={"Authorization": f"Bearer {ops_auth_token}"}
+    )
+
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Invalid file content type"
+
+@pytest.mark.asyncio
+async def test_upload_file_mismatched_extension(db, ops_auth_token):
+    # A valid .docx renamed to .pptx must not pass as a presentation
+    response = client.post(
+        "/files/upload",
+        files={"file": ("test.pptx", make_docx_bytes(), DOCX_MIME)},
+        headers={"Authorization": f"Bearer {ops_auth_token}"}
+    )
+
+    assert response.status_code == 400
+
 @pytest.mark.asyncio
 async def test_upload_file_unauthorized(db, auth_token):
     # Regular user should not be able to upload
@@ -160,4 +194,260 @@ async def test_list_files(db, test_user, auth_token):
     data = response.json()
     assert len(data) == 2
     assert data[0]["filename"] in ["test1.docx", "test2.xlsx"]
-    assert data[1]["filename"] in ["test1.docx", "test2.xlsx"]
\ No newline at end of file
+    assert data[1]["filename"] in ["test1.docx", "test2.xlsx"]
+@pytest_asyncio.fixture
+async def stored_file(db, test_user):
+    content = make_docx_bytes(b"<w:document>" + b"x" * 4096 + b"</w:document>")
+    os.makedirs(settings.upload_dir, exist_ok=True)
+    file_path = os.path.join(settings.upload_dir, "range-test.docx")
+    with open(file_path, "wb") as f:
+        f.write(content)
+    file_data = {
+        "filename": "range-test.docx",
+        "content_type": DOCX_MIME,
+        "file_size": len(content),
+        "content_hash": hashlib.sha256(content).hexdigest(),
+        "file_path": file_path,
+        "uploaded_by": str(test_user["_id"]),
+    }
+    file = await File(db).create_file(file_data)
+    yield file, content
+    os.remove(file_path)
+
+def download(stored_file, test_user, headers=None):
+    file, _ = stored_file
+    token = create_download_token(str(file["_id"]), str(test_user["_id"]))
+    access_token = create_access_token({"sub": test_user["email"]})
+    return client.get(
+        f"/files/download?token={token}",
+        headers={"Authorization": f"Bearer {access_token}", **(headers or {})},
+    )
+
+@pytest.mark.asyncio
+async def test_download_full_file_has_validators(stored_file, test_user):
+    file, content = stored_file
+    response = download(stored_file, test_user)
+
+    assert response.status_code == 200
+    assert response.content == content
+    assert response.headers["accept-ranges"] == "bytes"
+    assert response.headers["etag"] == f'"{file["content_hash"]}"'
+    assert "last-modified" in response.headers
+
+@pytest.mark.asyncio
+async def test_download_single_range(stored_file, test_user):
+    _, content = stored_file
+    response = download(stored_file, test_user, {"Range": "bytes=10-19"})
+
+    assert response.status_code == 206
+    assert response.content == content[10:20]
+    assert response.headers["content-range"] == f"bytes 10-19/{len(content)}"
+
+@pytest.mark.asyncio
+async def test_download_suffix_range(stored_file, test_user):
+    _, content = stored_file
+    response = download(stored_file, test_user, {"Range": "bytes=-100"})
+
+    assert response.status_code == 206
+    assert response.content == content[-100:]
+
+@pytest.mark.asyncio
+async def test_download_multiple_ranges(stored_file, test_user):
+    _, content = stored_file
+    response = download(stored_file, test_user, {"Range": "bytes=0-4,100-109"})
+
+    assert response.status_code == 206
+    assert response.headers["content-type"].startswith("multipart/byteranges; boundary=")
+    assert int(response.headers["content-length"]) == len(response.content)
+    assert f"Content-Range: bytes 0-4/{len(content)}".encode() in response.content
+    assert f"Content-Range: bytes 100-109/{len(content)}".encode() in response.content
+    assert content[100:110] in response.content
+
+@pytest.mark.asyncio
+async def test_download_unsatisfiable_range(stored_file, test_user):
+    _, content = stored_file
+    response = download(stored_file, test_user, {"Range": f"bytes={len(content) + 10}-"})
+
+    assert response.status_code == 416
+    assert response.headers["content-range"] == f"bytes */{len(content)}"
+
+@pytest.mark.asyncio
+async def test_download_if_none_match(stored_file, test_user):
+    file, _ = stored_file
+    response = download(stored_file, test_user, {"If-None-Match": f'"{file["content_hash"]}"'})
+
+    assert response.status_code == 304
+    assert response.content == b""
+
+@pytest.mark.asyncio
+async def test_download_if_modified_since(stored_file, test_user):
+    first = download(stored_file, test_user)
+    response = download(stored_file, test_user, {"If-Modified-Since": first.headers["last-modified"]})
+
+    assert response.status_code == 304
+
+@pytest.mark.asyncio
+async def test_download_if_range_mismatch_sends_whole_file(stored_file, test_user):
+    _, content = stored_file
+    response = download(stored_file, test_user, {"Range": "bytes=0-9", "If-Range": '"stale-etag"'})
+
+    assert response.status_code == 200
+    assert response.content == content
+
+@pytest.mark.asyncio
+async def test_list_files_keyset_pagination(db, test_user):
+    for index in range(5):
+        await File(db).create_file({
+            "filename": f"page{index}.docx",
+            "content_type": DOCX_MIME,
+            "file_size": index,
+            "storage_key": f"blobs/00/00/{index}",
+            "uploaded_by": str(test_user["_id"]),
+        })
+    access_token = create_access_token({"sub": test_user["email"]})
+    headers = {"Authorization": f"Bearer {access_token}"}
+
+    seen = []
+    url = "/files/list?limit=2"
+    while url:
+        response = client.get(url, headers=headers)
+        assert response.status_code == 200
+        page = response.json()
+        assert len(page) <= 2
+        assert all("storage_key" not in item for item in page)
+        seen.extend(item["filename"] for item in page)
+        cursor = response.headers.get("x-next-cursor")
+        url = f"/files/list?limit=2&cursor={cursor}" if cursor else None
+
+    assert seen == [f"page{index}.docx" for index in reversed(range(5))]
+
+@pytest.mark.asyncio
+async def test_list_files_rejects_bad_cursor(db, test_user):
+    access_token = create_access_token({"sub": test_user["email"]})
+    response = client.get(
+        "/files/list?cursor=not-a-cursor",
+        headers={"Authorization": f"Bearer {access_token}"}
+    )
+    assert response.status_code == 400
+
+XLSX_MIME = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+@pytest_asyncio.fixture
+async def filterable_files(db, test_user):
+    for filename, content_type, size in [
+        ("q3-report.docx", DOCX_MIME, 100),
+        ("q3-budget.xlsx", XLSX_MIME, 2000),
+        ("onboarding.docx", DOCX_MIME, 5000),
+    ]:
+        await File(db).create_file({
+            "filename": filename,
+            "content_type": content_type,
+            "file_size": size,
+            "storage_key": f"blobs/00/00/{filename}",
+            "uploaded_by": str(test_user["_id"]),
+        })
+    return {"Authorization": f"Bearer {create_access_token({'sub': test_user['email']})}"}
+
+@pytest.mark.asyncio
+async def test_list_files_filters(filterable_files):
+    def names(query):
+        response = client.get(f"/files/list?{query}", headers=filterable_files)
+        assert response.status_code == 200
+        return sorted(item["filename"] for item in response.json())
+
+    assert names("filename_prefix=q3-") == ["q3-budget.xlsx", "q3-report.docx"]
+    assert names("file_type=docx") == ["onboarding.docx", "q3-report.docx"]
+    assert names("min_size=1000&max_size=3000") == ["q3-budget.xlsx"]
+    assert names("file_type=docx&min_size=1000") == ["onboarding.docx"]
+
+@pytest.mark.asyncio
+async def test_file_stats(filterable_files):
+    response = client.get("/files/stats", headers=filterable_files)
+
+    assert response.status_code == 200
+    data = response.json()
+    assert data["total_count"] == 3
+    assert data["total_bytes"] == 7100
+    by_type = {row["content_type"]: row for row in data["by_type"]}
+    assert by_type[DOCX_MIME]["count"] == 2
+    assert by_type[DOCX_MIME]["total_bytes"] == 5100
+    assert sum(row["count"] for row in data["by_month"]) == 3
+
+@pytest.mark.asyncio
+async def test_batch_upload_reports_per_file_results(db, test_ops_user):
+    access_token = create_access_token({"sub": test_ops_user["email"]})
+    response = client.post(
+        "/files/upload/batch",
+        files=[
+            ("files", ("a.docx", make_docx_bytes(b"<a/>"), DOCX_MIME)),
+            ("files", ("b.docx", make_docx_bytes(b"<b/>"), DOCX_MIME)),
+            ("files", ("notes.txt", b"plain text", "text/plain")),
+        ],
+        headers={"Authorization": f"Bearer {access_token}"}
+    )
+
+    assert response.status_code == 200
+    data = response.json()
+    assert data["uploaded"] == 2
+    assert data["failed"] == 1
+    assert [result["success"] for result in data["results"]] == [True, True, False]
+    assert data["results"][2]["error"].startswith("Only")
+    assert await db["files"].count_documents({"uploaded_by": str(test_ops_user["_id"])}) == 2
+
+@pytest.mark.asyncio
+async def test_download_bundle_streams_zip(db, stored_file, test_user, tmp_path):
+    file, content = stored_file
+    other_content = make_docx_bytes(b"<w:document>other</w:document>")
+    other_path = tmp_path / "other.docx"
+    other_path.write_bytes(other_content)
+    other = await File(db).create_file({
+        "filename": "other.docx",
+        "content_type": DOCX_MIME,
+        "file_size": len(other_content),
+        "file_path": str(other_path),
+        "uploaded_by": str(test_user["_id"]),
+    })
+    access_token = create_access_token({"sub": test_user["email"]})
+    headers = {"Authorization": f"Bearer {access_token}"}
+
+    response = client.post(
+        "/files/bundle",
+        json={"file_ids": [str(other["_id"]), str(file["_id"])]},
+        headers=headers,
+    )
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/zip"
+    with zipfile.ZipFile(io.BytesIO(response.content)) as archive:
+        # Entries follow the requested order
+        assert archive.namelist() == ["other.docx", "range-test.docx"]
+        assert archive.testzip() is None
+        info = archive.getinfo("range-test.docx")
+        assert info.compress_type == zipfile.ZIP_STORED
+        assert archive.read(info) == content
+        assert archive.read("other.docx") == other_content
+
+@pytest.mark.asyncio
+async def test_download_bundle_by_signed_link(stored_file, test_user):
+    file, content = stored_file
+    access_token = create_access_token({"sub": test_user["email"]})
+    headers = {"Authorization": f"Bearer {access_token}"}
+
+    link = client.post("/files/bundle/link", json={"file_ids": [str(file["_id"])]}, headers=headers)
+    assert link.status_code == 200
+    token = link.json()["download_link"].split("token=")[1]
+
+    response = client.get(f"/files/bundle?token={token}", headers=headers)
+    assert response.status_code == 200
+    with zipfile.ZipFile(io.BytesIO(response.content)) as archive:
+        assert archive.read("range-test.docx") == content
+
+@pytest.mark.asyncio
+async def test_download_bundle_unknown_file(db, test_user):
+    access_token = create_access_token({"sub": test_user["email"]})
+    response = client.post(
+        "/files/bundle",
+        json={"file_ids": ["000000000000000000000000"]},
+        headers={"Authorization": f"Bearer {access_token}"}
+    )
+    assert response.status_code == 404
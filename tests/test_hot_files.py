@@ -0,0 +1,99 @@
+import asyncio
+
+import pytest
+from bson import ObjectId
+
+from app.utils.hot_files import HotFileCache
+
+
+def make_file(tmp_path, content: bytes) -> dict:
+    path = tmp_path / f"{ObjectId()}.docx"
+    path.write_bytes(content)
+    return {"_id": ObjectId(), "content_hash": None, "file_path": str(path), "file_size": len(content)}
+
+
+async def read_all(reader, start: int, end: int) -> bytes:
+    return b"".join([chunk async for chunk in reader(start, end)])
+
+
+async def warm(cache: HotFileCache, file: dict):
+    for _ in range(cache.min_hits):
+        assert cache.get_reader(file) is None
+    await asyncio.gather(*cache._tasks)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("backend", ["memory", "mmap"])
+async def test_hot_file_is_cached_after_repeated_requests(tmp_path, backend):
+    cache = HotFileCache(max_bytes=1024 * 1024, max_file_size=1024 * 1024, min_hits=2, backend=backend)
+    content = bytes(range(256)) * 512
+    file = make_file(tmp_path, content)
+
+    await warm(cache, file)
+    reader = cache.get_reader(file)
+    assert reader is not None
+    assert await read_all(reader, 0, len(content) - 1) == content
+    assert await read_all(reader, 10, 19) == content[10:20]
+
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 2
+    assert stats["bytes_saved"] == len(content) + 10
+
+
+@pytest.mark.asyncio
+async def test_hot_file_cache_evicts_least_recently_used(tmp_path):
+    cache = HotFileCache(max_bytes=250, max_file_size=200, min_hits=1)
+    first, second = make_file(tmp_path, b"a" * 100), make_file(tmp_path, b"b" * 100)
+    await warm(cache, first)
+    await warm(cache, second)
+    cache.get_reader(first)
+    third = make_file(tmp_path, b"c" * 100)
+    await warm(cache, third)
+
+    assert cache.get_reader(first) is not None
+    assert cache.stats()["evictions"] == 1
+    assert cache.stats()["bytes"] == 200
+    assert cache.get_reader(second) is None
+    await asyncio.gather(*cache._tasks)
+
+
+@pytest.mark.asyncio
+async def test_hot_file_invalidated_and_keyed_by_content(tmp_path):
+    cache = HotFileCache(max_bytes=1024, max_file_size=1024, min_hits=1)
+    file = make_file(tmp_path, b"x" * 100)
+    await warm(cache, file)
+
+    # Same id with new content is a different entry
+    assert cache.get_reader(dict(file, content_hash="other")) is None
+    await asyncio.gather(*cache._tasks)
+    assert cache.get_reader(file) is not None
+    assert cache.stats()["files"] == 2
+
+    # Deleting the file drops every version of it
+    cache.invalidate_file(file["_id"])
+    assert cache.stats()["bytes"] == 0
+    assert cache.get_reader(file) is None
+    await asyncio.gather(*cache._tasks)
+
+
+@pytest.mark.asyncio
+async def test_load_finishing_after_invalidation_is_discarded(tmp_path):
+    cache = HotFileCache(max_bytes=1024, max_file_size=1024, min_hits=1)
+    file = make_file(tmp_path, b"x" * 100)
+    assert cache.get_reader(file) is None
+    # The file is deleted while its background load is still running
+    cache.invalidate_file(file["_id"])
+    await asyncio.gather(*cache._tasks)
+
+    assert cache.stats()["files"] == 0
+    assert cache.stats()["bytes"] == 0
+
+
+@pytest.mark.asyncio
+async def test_cached_chunks_are_views_of_the_shared_buffer(tmp_path):
+    cache = HotFileCache(max_bytes=1024, max_file_size=1024, min_hits=1)
+    file = make_file(tmp_path, b"x" * 100)
+    await warm(cache, file)
+    chunks = [chunk async for chunk in cache.get_reader(file)(0, 99)]
+    assert all(isinstance(chunk, memoryview) for chunk in chunks)
@@ -0,0 +1,42 @@
+import pytest
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+
+from app.main import app
+from app.utils.metrics import counted_reader
+
+client = TestClient(app)
+
+
+def sample(name: str, **labels) -> float:
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+def test_requests_are_labelled_by_route_template():
+    before = sample("http_request_duration_seconds_count", method="GET", route="/files/download/{file_id}", status="401")
+    response = client.get("/files/download/64b000000000000000000000")
+    assert response.status_code == 401
+    after = sample("http_request_duration_seconds_count", method="GET", route="/files/download/{file_id}", status="401")
+    assert after == before + 1
+
+
+def test_metrics_endpoint_exposes_stage_and_app_metrics():
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    body = response.text
+    assert "http_request_duration_seconds_bucket" in body
+    assert "app_uploads_in_flight" in body
+    assert "password_hash_in_flight" in body
+    assert "user_cache_hits_total" in body
+
+
+@pytest.mark.asyncio
+async def test_counted_reader_counts_streamed_bytes():
+    async def read_range(start, end):
+        yield b"a" * 10
+        yield b"b" * 5
+
+    before = sample("app_download_bytes_total")
+    chunks = [chunk async for chunk in counted_reader(read_range)(0, 14)]
+    assert b"".join(chunks) == b"a" * 10 + b"b" * 5
+    assert sample("app_download_bytes_total") == before + 15
@@ -0,0 +1,55 @@
+import asyncio
+import threading
+import time
+
+import pytest
+from prometheus_client import REGISTRY
+
+from app.config import settings
+from app.utils.profiling import ProfilerBusyError, _profile_lock, monitor_event_loop, sample_stacks
+
+
+def busy_wait(stop: threading.Event):
+    while not stop.is_set():
+        sum(range(1000))
+
+
+def test_sample_stacks_returns_collapsed_stacks():
+    stop = threading.Event()
+    worker = threading.Thread(target=busy_wait, args=(stop,), name="busy-worker")
+    worker.start()
+    try:
+        output = sample_stacks(0.2, 0.01)
+    finally:
+        stop.set()
+        worker.join()
+
+    lines = [line for line in output.splitlines() if line.startswith("busy-worker;")]
+    assert lines
+    stack, count = lines[0].rsplit(" ", 1)
+    assert "busy_wait" in stack
+    assert int(count) > 0
+
+
+def test_sample_stacks_allows_one_profile_at_a_time():
+    with _profile_lock:
+        with pytest.raises(ProfilerBusyError):
+            sample_stacks(0.01, 0.01)
+
+
+@pytest.mark.asyncio
+async def test_event_loop_monitor_reports_blocking_call(monkeypatch, caplog):
+    monkeypatch.setattr(settings, "loop_lag_check_interval_ms", 10)
+    monkeypatch.setattr(settings, "loop_lag_threshold_ms", 50)
+    before = REGISTRY.get_sample_value("event_loop_stalls_total") or 0
+
+    task = asyncio.create_task(monitor_event_loop())
+    await asyncio.sleep(0.05)
+    time.sleep(0.3)  # deliberately block the loop
+    await asyncio.sleep(0.05)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+    assert REGISTRY.get_sample_value("event_loop_stalls_total") == before + 1
+    assert "test_event_loop_monitor_reports_blocking_call" in caplog.text
@@ -0,0 +1,181 @@
+import base64
+import hashlib
+import io
+import os
+import zipfile
+from datetime import datetime
+
+import motor.motor_asyncio
+import pytest
+import pytest_asyncio
+from fastapi.testclient import TestClient
+
+from app.config import settings
+from app.main import app
+from app.models.upload_session import UploadSession
+from app.utils.auth import create_access_token
+from app.utils.resumable import merge_ranges, missing_ranges, staging_path, sweep_expired_sessions
+
+client = TestClient(app)
+
+DOCX_MIME = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+
+
+def make_docx_bytes(size: int = 256 * 1024) -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        archive.writestr(
+            "[Content_Types].xml",
+            '<?xml version="1.0" encoding="UTF-8"?>'
+            '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            f'<Override PartName="/word/document.xml" ContentType="{DOCX_MIME}.main+xml"/>'
+            '</Types>',
+        )
+        archive.writestr("word/document.xml", "<w:document/>")
+        archive.writestr("word/media/image1.png", bytes(range(256)) * (size // 256), zipfile.ZIP_STORED)
+    return buffer.getvalue()
+
+
+def checksum(data: bytes) -> str:
+    return "sha256 " + base64.b64encode(hashlib.sha256(data).digest()).decode()
+
+
+@pytest_asyncio.fixture
+async def db():
+    mongo = motor.motor_asyncio.AsyncIOMotorClient(settings.mongodb_url)
+    db = mongo[settings.database_name]
+    yield db
+    for collection in ("users", "files", "blobs", "upload_sessions"):
+        await db.drop_collection(collection)
+    mongo.close()
+
+
+@pytest_asyncio.fixture
+async def ops_headers(db):
+    await db["users"].insert_one({
+        "email": "ops@example.com",
+        "hashed_password": "unused",
+        "is_verified": True,
+        "is_ops_user": True,
+    })
+    return {"Authorization": f"Bearer {create_access_token({'sub': 'ops@example.com'})}"}
+
+
+def test_range_bookkeeping():
+    chunks = [{"offset": 100, "length": 50}, {"offset": 0, "length": 60}, {"offset": 50, "length": 20}]
+    ranges = merge_ranges(chunks)
+    assert ranges == [(0, 70), (100, 150)]
+    assert missing_ranges(ranges, 200) == [(70, 100), (150, 200)]
+    assert missing_ranges(merge_ranges([{"offset": 0, "length": 200}]), 200) == []
+
+
+@pytest.mark.asyncio
+async def test_resumable_upload_out_of_order(db, ops_headers):
+    document = make_docx_bytes()
+    middle = len(document) // 2
+    response = client.post(
+        "/files/uploads",
+        json={"filename": "big.docx", "size": len(document), "sha256": hashlib.sha256(document).hexdigest()},
+        headers=ops_headers,
+    )
+    assert response.status_code == 201
+    session_id = response.json()["id"]
+    url = f"/files/uploads/{session_id}"
+
+    # Second half first, as a parallel client might
+    second = document[middle:]
+    response = client.patch(
+        url,
+        content=second,
+        headers={**ops_headers, "Upload-Offset": str(middle), "Upload-Checksum": checksum(second)},
+    )
+    assert response.status_code == 204
+    assert response.headers["Upload-Offset"] == "0"
+
+    # Completing early reports what is still missing
+    response = client.post(f"{url}/complete", headers=ops_headers)
+    assert response.status_code == 409
+    assert f"0-{middle - 1}" in response.json()["detail"]
+
+    # A corrupted chunk is rejected and not recorded
+    first = document[:middle]
+    response = client.patch(
+        url,
+        content=b"x" + first[1:],
+        headers={**ops_headers, "Upload-Offset": "0", "Upload-Checksum": checksum(first)},
+    )
+    assert response.status_code == 460
+
+    response = client.patch(
+        url,
+        content=first,
+        headers={**ops_headers, "Upload-Offset": "0", "Upload-Checksum": checksum(first)},
+    )
+    assert response.status_code == 204
+
+    response = client.head(url, headers=ops_headers)
+    assert response.headers["Upload-Offset"] == str(len(document))
+
+    response = client.post(f"{url}/complete", headers=ops_headers)
+    assert response.status_code == 200
+    assert response.json()["content_hash"] == hashlib.sha256(document).hexdigest()
+    assert response.json()["file_size"] == len(document)
+    assert await db["upload_sessions"].count_documents({}) == 0
+    assert await db["files"].count_documents({"filename": "big.docx"}) == 1
+
+
+@pytest.mark.asyncio
+async def test_corrupt_retry_keeps_recorded_bytes_and_writes_block_completion(db, ops_headers):
+    document = make_docx_bytes(4096)
+    response = client.post("/files/uploads", json={"filename": "doc.docx", "size": len(document)}, headers=ops_headers)
+    session_id = response.json()["id"]
+    url = f"/files/uploads/{session_id}"
+    headers = {**ops_headers, "Upload-Offset": "0", "Upload-Checksum": checksum(document)}
+    assert client.patch(url, content=document, headers=headers).status_code == 204
+
+    # A corrupted re-send of the recorded range is rejected before it reaches the staging file
+    response = client.patch(url, content=b"x" * len(document), headers=headers)
+    assert response.status_code == 460
+    with open(staging_path(session_id), "rb") as f:
+        assert f.read() == document
+
+    # Completion waits for chunks that are still being copied into the staging file
+    sessions = UploadSession(db)
+    session = await sessions.get_session(session_id, str((await db["users"].find_one())["_id"]))
+    write_id = await sessions.begin_write(session["_id"], 60)
+    response = client.post(f"{url}/complete", headers=ops_headers)
+    assert response.status_code == 409
+    await sessions.end_write(session["_id"], write_id)
+
+    response = client.post(f"{url}/complete", headers=ops_headers)
+    assert response.status_code == 200
+    assert response.json()["content_hash"] == hashlib.sha256(document).hexdigest()
+
+
+@pytest.mark.asyncio
+async def test_whole_file_checksum_mismatch_discards_session(db, ops_headers):
+    document = make_docx_bytes(1024)
+    response = client.post(
+        "/files/uploads",
+        json={"filename": "doc.docx", "size": len(document), "sha256": "0" * 64},
+        headers=ops_headers,
+    )
+    url = f"/files/uploads/{response.json()['id']}"
+    client.patch(url, content=document, headers={**ops_headers, "Upload-Offset": "0"})
+
+    response = client.post(f"{url}/complete", headers=ops_headers)
+    assert response.status_code == 422
+    assert await db["files"].count_documents({}) == 0
+    assert await db["upload_sessions"].count_documents({}) == 0
+
+
+@pytest.mark.asyncio
+async def test_sweeper_removes_expired_sessions(db, ops_headers):
+    response = client.post("/files/uploads", json={"filename": "doc.docx", "size": 1024}, headers=ops_headers)
+    session_id = response.json()["id"]
+    await db["upload_sessions"].update_many({}, {"$set": {"expires_at": datetime(2000, 1, 1)}})
+
+    removed = await sweep_expired_sessions(UploadSession(db))
+    assert removed == 1
+    assert await db["upload_sessions"].count_documents({}) == 0
+    assert not os.path.exists(staging_path(session_id))
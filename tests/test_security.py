@@ -0,0 +1,60 @@
+from datetime import timedelta
+
+import pytest
+
+from app.utils.security import (
+    InvalidTokenError,
+    create_download_token,
+    create_signed_token,
+    generate_secure_token,
+    verify_download_token,
+    verify_signed_token,
+)
+
+
+def test_download_token_round_trip():
+    token = create_download_token("file-id", "user-id")
+    claims = verify_download_token(token)
+    assert claims["fid"] == "file-id"
+    assert claims["uid"] == "user-id"
+    assert claims["scope"] == "download"
+
+
+def test_download_tokens_are_unique():
+    assert create_download_token("file-id", "user-id") != create_download_token("file-id", "user-id")
+
+
+def test_tampered_token_is_rejected():
+    body, signature = create_download_token("file-id", "user-id").split(".")
+    other_body = create_download_token("other-file", "user-id").split(".")[0]
+    with pytest.raises(InvalidTokenError):
+        verify_download_token(f"{other_body}.{signature}")
+    with pytest.raises(InvalidTokenError):
+        verify_download_token(body)
+
+
+
+def test_non_ascii_token_is_rejected():
+    body, signature = create_download_token("file-id", "user-id").split(".")
+    with pytest.raises(InvalidTokenError):
+        verify_download_token(f"{body}.{signature[:-1]}é")
+    with pytest.raises(InvalidTokenError):
+        verify_download_token(f"{body}é.{signature}")
+
+
+def test_expired_token_is_rejected():
+    token = create_download_token("file-id", "user-id", expires_delta=timedelta(seconds=-1))
+    with pytest.raises(InvalidTokenError):
+        verify_download_token(token)
+
+
+def test_token_scope_is_enforced():
+    token = create_signed_token({"fid": "file-id"}, "bundle", timedelta(minutes=5))
+    with pytest.raises(InvalidTokenError):
+        verify_download_token(token)
+    assert verify_signed_token(token, "bundle")["fid"] == "file-id"
+
+
+def test_generate_secure_token_length():
+    assert len(generate_secure_token()) == 32
+    assert len(generate_secure_token(64)) == 64
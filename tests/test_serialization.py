@@ -0,0 +1,52 @@
+from datetime import datetime
+
+import orjson
+from bson import ObjectId
+from fastapi import Response
+
+from app.config import settings
+from app.schemas.file import FileInDB
+from app.utils.serialization import MongoJSONResponse, db_response, to_response_dict
+
+
+def make_document() -> dict:
+    return {
+        "_id": ObjectId(),
+        "filename": "report.docx",
+        "content_type": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+        "file_size": 1234,
+        "content_hash": "ab" * 32,
+        "storage_key": "blobs/ab/ab/" + "ab" * 32,
+        "uploaded_by": str(ObjectId()),
+        "created_at": datetime(2024, 1, 2, 3, 4, 5),
+        "updated_at": datetime(2024, 1, 2, 3, 4, 5),
+    }
+
+
+def test_to_response_dict_maps_id_and_drops_internal_fields():
+    document = make_document()
+    mapped = to_response_dict(document, FileInDB)
+    assert mapped["id"] == str(document["_id"])
+    assert "_id" not in mapped
+    assert "storage_key" not in mapped
+    # The mapped dict passes the response model unchanged
+    assert FileInDB(**mapped).dict() == mapped
+
+
+def test_mongo_json_response_renders_object_ids_and_datetimes():
+    object_id = ObjectId()
+    body = MongoJSONResponse({"id": object_id, "at": datetime(2024, 1, 2, 3, 4, 5)}).body
+    assert orjson.loads(body) == {"id": str(object_id), "at": "2024-01-02T03:04:05"}
+
+
+def test_db_response_skips_validation_only_when_trusted(monkeypatch):
+    documents = [make_document(), make_document()]
+    assert isinstance(db_response(documents, FileInDB), list)
+
+    monkeypatch.setattr(settings, "trust_db_responses", True)
+    sub_response = Response()
+    sub_response.headers["X-Next-Cursor"] = "abc"
+    response = db_response(documents, FileInDB, sub_response)
+    assert isinstance(response, MongoJSONResponse)
+    assert response.headers["x-next-cursor"] == "abc"
+    assert [item["id"] for item in orjson.loads(response.body)] == [str(doc["_id"]) for doc in documents]
@@ -0,0 +1,98 @@
+import os
+import socket
+
+import pytest
+
+from app.storage.local import LocalStorageBackend
+
+
+async def chunks(*parts):
+    for part in parts:
+        yield part
+
+
+async def read_all(stream):
+    return b"".join([chunk async for chunk in stream])
+
+
+@pytest.fixture
+def local_storage(tmp_path):
+    return LocalStorageBackend(str(tmp_path))
+
+
+@pytest.mark.asyncio
+async def test_local_put_stream_and_read(local_storage):
+    stat = await local_storage.put_stream("blobs/ab/cd/abcd", chunks(b"hello ", b"world"))
+    assert stat.size == 11
+    assert await read_all(local_storage.get_stream("blobs/ab/cd/abcd")) == b"hello world"
+    assert await read_all(local_storage.get_stream("blobs/ab/cd/abcd", 6, 10)) == b"world"
+
+
+@pytest.mark.asyncio
+async def test_local_put_file_moves_into_place(local_storage, tmp_path):
+    source = tmp_path / "upload.part"
+    source.write_bytes(b"content")
+    await local_storage.put_file("blobs/aa/bb/aabb", str(source))
+    assert not source.exists()
+    assert (await local_storage.stat("blobs/aa/bb/aabb")).size == 7
+
+
+@pytest.mark.asyncio
+async def test_local_delete_and_missing_stat(local_storage):
+    await local_storage.put_stream("blobs/aa/bb/aabb", chunks(b"x"))
+    await local_storage.delete("blobs/aa/bb/aabb")
+    await local_storage.delete("blobs/aa/bb/aabb")
+    assert await local_storage.stat("blobs/aa/bb/aabb") is None
+
+
+def test_local_rejects_keys_outside_root(local_storage):
+    with pytest.raises(ValueError):
+        local_storage.path("../outside")
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def s3_storage():
+    pytest.importorskip("aiobotocore")
+    moto_server = pytest.importorskip("moto.server")
+    import boto3
+
+    # moto 4.1 cannot report the port it bound, so pick a free one up front
+    port = free_port()
+    server = moto_server.ThreadedMotoServer(ip_address="127.0.0.1", port=port)
+    server.start()
+    endpoint_url = f"http://127.0.0.1:{port}"
+    boto3.client(
+        "s3", endpoint_url=endpoint_url, region_name="us-east-1",
+        aws_access_key_id="test", aws_secret_access_key="test",
+    ).create_bucket(Bucket="test-bucket")
+
+    from app.storage.s3 import S3StorageBackend
+
+    yield S3StorageBackend(
+        bucket="test-bucket", endpoint_url=endpoint_url, region_name="us-east-1",
+        access_key_id="test", secret_access_key="test", part_size=5 * 1024 * 1024,
+    )
+    server.stop()
+
+
+@pytest.mark.asyncio
+async def test_s3_multipart_round_trip(s3_storage):
+    part = os.urandom(1024 * 1024)
+    # 12 MiB forces a multipart upload with a short final part
+    stat = await s3_storage.put_stream("blobs/aa/bb/big", chunks(*([part] * 12)))
+    assert stat.size == 12 * len(part)
+    assert (await s3_storage.stat("blobs/aa/bb/big")).size == stat.size
+    assert await read_all(s3_storage.get_stream("blobs/aa/bb/big", 10, 19)) == part[10:20]
+
+    url = await s3_storage.presigned_url("blobs/aa/bb/big", "deck.pptx", "application/octet-stream", 60)
+    assert "X-Amz-Signature" in url or "Signature" in url
+
+    await s3_storage.delete("blobs/aa/bb/big")
+    assert await s3_storage.stat("blobs/aa/bb/big") is None
+    await s3_storage.close()